@@ -4,6 +4,7 @@ from __future__ import annotations
 from pathlib import Path
 import json
 import subprocess
+import sys
 import uuid
 
 from airflow.operators.bash import BashOperator
@@ -18,15 +19,17 @@ from airflow.operators.python import BranchPythonOperator
 from airflow.utils.trigger_rule import TriggerRule
 from pendulum import datetime
 
-import pandas as pd
-from evidently.report import Report
-from evidently.metric_preset import DataDriftPreset
-from evidently.metrics import DataDriftTable, DatasetDriftMetric
 import logging
 import time
 
 from prometheus_client import CollectorRegistry, Gauge, push_to_gateway
-import pandas as pd
+
+# shared pipeline helpers live next to the BashOperator scripts; the ones
+# pulling in pandas/pyarrow/scipy are imported inside the tasks, so parsing
+# this file stays cheap
+SCRIPTS = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS))
+from stage_metrics import StageMetrics, collect
 
 
 # Configure module‐level logger
@@ -36,7 +39,32 @@ logger.setLevel(logging.INFO)
 RAW_BASE = Path("/opt/airflow/data/raw")          # v1/ v2/ vN/
 PROCESSED = Path("/opt/airflow/data/processed")   # output parquet
 MERGED    = Path("/opt/airflow/data/merged")
+MLFLOW_DIR = Path("/opt/mlflow")
 SEED = 42
+VERSION = "{{ ti.xcom_pull(task_ids='detect_new_version') | last }}"
+
+
+def _raw_rows(csv: Path) -> int:
+    """Row count from the columnar manifest – no data read."""
+    from raw_io import manifest_path
+    return json.loads(manifest_path(csv).read_text())["rows"]
+
+
+def _cached(stage: str, command: str, inputs=(), outputs=(), code=(),
+            params=(), packages=(), version: str = VERSION) -> str:
+    """Wrap a bash command in stage_cache.py: skipped while up to date.
+
+    A skip still pushes the stage's metrics for ``version`` (cached = 1).
+    """
+    opts = [f"--{flag} '{value}'"
+            for flag, values in (("in", inputs), ("out", outputs),
+                                 ("code", code), ("package", packages))
+            for value in values]
+    opts += [f"--param {p}" for p in params]      # may hold Jinja: unquoted
+    opts.append(f"--version {version}")
+    return " ".join([f"python {SCRIPTS}/stage_cache.py", stage, *opts,
+                     "--", command])
+
 
 @dag(
     schedule="@daily",          # or "@daily" – adjust to your cadence
@@ -52,68 +80,93 @@ def retrain_on_drift():
     # Drift check                                                        #
     # ------------------------------------------------------------------ #
     @task(task_id="detect_new_version")
-    def _detect_version() -> str:
-        """Return newest version folder name (e.g. 'v3') if unseen."""
-        seen: set[str] = Variable.get("seen_versions", default_var="").split(",")
-        versions = sorted(p.name for p in RAW_BASE.iterdir() if p.is_dir())
-        unseen = [v for v in versions if v and v not in seen]
+    def _detect_version() -> list[str]:
+        """Return every unseen version folder (e.g. ['v3', …, 'v10'])."""
+        seen: list[str] = Variable.get("seen_versions", default_var="").split(",")
+        from merged_store import list_versions
+        unseen = [v for v in list_versions(RAW_BASE) if v not in seen]
         if not unseen:
             raise ValueError("no-op – nothing new")
-        new_v = unseen[-1]
-        Variable.set("seen_versions", ",".join(seen + [new_v]))
-        return new_v
+        Variable.set("seen_versions", ",".join(seen + unseen))
+        logger.info(f"Catching up on {len(unseen)} version(s): {unseen}")
+        return unseen
 
-    @task.branch(task_id="branch_drift")
-    def _branch(version: str) -> str:
-        """Return task-id to follow, with detailed logging."""
+    @task(task_id="prepare_baseline")
+    def _prepare_baseline() -> None:
+        """Columnar copy + drift reference of v1, once, before fanning out."""
+        from drift import DRIFT_ENGINE, prepare_reference
+        from raw_io import columnarize
+        base_path = RAW_BASE / "v1" / "baseline.csv"
+        t0 = time.time()
+        columnarize(base_path)
+        prepare_reference(base_path, DRIFT_ENGINE)
+        logger.info(f"Baseline ready in {time.time() - t0:.2f}s")
+
+    @task(task_id="columnarize")
+    def _columnarize(version: str) -> str:
+        """Cache one new version as a memory-mappable Arrow file."""
+        from raw_io import columnarize
+        with StageMetrics("columnarize", version) as stage:
+            for csv in sorted((RAW_BASE / version).glob("*.csv")):
+                t0 = time.time()
+                arrow = columnarize(csv)
+                logger.info(f"Columnar copy {arrow} ready in {time.time() - t0:.2f}s")
+                stage.read(csv)
+                stage.wrote(arrow)
+                stage.rows_in += _raw_rows(csv)
+            stage.rows_out = stage.rows_in
+        return version
+
+    @task(task_id="drift_check")
+    def _drift_check(version: str) -> dict:
+        """Drift verdict for one version (mapped, runs in parallel)."""
+        from drift import DRIFT_ENGINE, DRIFT_RESULT, drift_check
         logger.info(f"Starting drift check for version: {version}")
 
         base_path = RAW_BASE / "v1" / "baseline.csv"
         if version == "v1":
-            logger.info("No new version detected; skipping drift check")
-            return "no_drift"
+            logger.info("Baseline version; skipping drift check")
+            return {"version": version, "drift": False}
         new_path  = RAW_BASE / version / "latest.csv"
         logger.info(f"Baseline file: {base_path}")
         logger.info(f"New file:      {new_path}")
 
-        # 1) Read in CSVs
+        # Evidently on reservoir samples, or the native engine on full files
+        logger.info(f"Running {DRIFT_ENGINE} drift check…")
         t0 = time.time()
-        base_df = pd.read_csv(base_path)
-        logger.info(f"Loaded baseline.csv: {base_df.shape} in {time.time() - t0:.2f}s")
-        t1 = time.time()
-        new_df = pd.read_csv(new_path)
-        logger.info(f"Loaded latest.csv:   {new_df.shape} in {time.time() - t1:.2f}s")
-        base_df = base_df.sample(n=1000, random_state=SEED)
-        new_df  = new_df.sample(n=1000, random_state=SEED)
-        # 2) Build and run drift report
-        report = Report(metrics=[DatasetDriftMetric()])
-    
-        logger.info("Running DataDriftTable report…")
-        t2 = time.time()
-        report.run(reference_data=base_df, current_data=new_df)
-        t3 = time.time()
-        logger.info(f"DataDriftTable computation took {t3 - t2:.2f}s")       
-        result = report.as_dict()["metrics"][0]["result"]
-        drift_detected = result["dataset_drift"]
-
-        if drift_detected:
-            logger.info(f"Drift detected; branching to merge_datasets")
+        with StageMetrics("drift", version) as stage:
+            result = drift_check(base_path, new_path, DRIFT_ENGINE)
+            stage.read(new_path)
+            stage.rows_in = _raw_rows(new_path)
+            stage.wrote(new_path.with_name(DRIFT_RESULT))
+        logger.info(
+            f"Drift check took {time.time() - t0:.2f}s – "
+            f"{result['number_of_drifted_columns']}/{result['number_of_columns']} "
+            "columns drifted"
+        )
+        return {"version": version, "drift": bool(result["dataset_drift"])}
+
+    @task.branch(task_id="branch_drift")
+    def _branch(checks: list[dict]) -> str:
+        """One merge + retrain if any caught-up version drifted."""
+        drifted = [c["version"] for c in checks if c["drift"]]
+        if drifted:
+            logger.info(f"Drift detected in {drifted}; branching to merge_datasets")
             return "merge_datasets"
-        else:
-            logger.info(f"No Drift detected; branching to no_drift")
-            return "no_drift"
-        
+        logger.info("No Drift detected; branching to no_drift")
+        return "no_drift"
+
     def _push_pipeline_metrics(**context):
-        # 1) grab DAG run timestamps
+        """DAG-level totals from the stages' own pushed metrics."""
+        # 1) DAG run duration and every stage's gauges for the newest version
         dr = context["dag_run"]
-        start_ts = dr.start_date.timestamp()
-        end_ts   = time.time()
-        duration = end_ts - start_ts
-
-        # 2) compute rows processed (read the parquet you just wrote)
-        #    adjust path if you have multiple outputs or different filenames
-        df = pd.read_parquet(PROCESSED / "train.parquet")
-        rows = len(df)
+        duration = time.time() - dr.start_date.timestamp()
+        version = context["ti"].xcom_pull(task_ids="detect_new_version")[-1]
+        stages = collect(version)
+        logger.info(f"Stage metrics for {version}: {stages}")
+
+        # 2) rows = what featurize wrote, i.e. the training parquet's rows
+        rows = stages.get("featurize", {}).get("rows_out", 0)
         throughput = rows / duration if duration > 0 else 0
 
         # 3) push to Pushgateway
@@ -127,6 +180,14 @@ def retrain_on_drift():
         Gauge("pipeline_throughput_rows_per_second",
             "Rows processed per second",
             registry=registry).set(throughput)
+        Gauge("pipeline_stages_duration_seconds",
+            "Sum of the instrumented stages' durations",
+            registry=registry).set(sum(s.get("duration_seconds", 0)
+                                       for s in stages.values()))
+        Gauge("pipeline_peak_rss_bytes",
+            "Largest peak RSS over the instrumented stages",
+            registry=registry).set(max((s.get("peak_rss_bytes", 0)
+                                        for s in stages.values()), default=0))
 
         push_to_gateway(
             "pushgateway:9091",
@@ -139,30 +200,55 @@ def retrain_on_drift():
     # ------------------------------------------------------------------ #
     #  Retrain path                                                      #
     # ------------------------------------------------------------------ #
+    # Each step below is wrapped in stage_cache.py: a re-run or retry whose
+    # inputs, code and params match the last successful run is a no-op and
+    # never imports pandas/mlflow.
+    pipeline_code = [f"{SCRIPTS}/{name}" for name in
+                     ("merged_store.py", "raw_io.py", "featurize.py",
+                      "drift.py", "sampling.py", "stage_metrics.py",
+                      "velocity.py")]
+
     merge = BashMerge = BashOperator(
         task_id="merge_datasets",
-        bash_command=(
-            "python /opt/airflow/scripts/merge_versions.py "
-            "{{ ti.xcom_pull(task_ids='detect_new_version') }}"
-        )
-        # → writes /data/merged/current.csv
+        bash_command=_cached(
+            "merge",
+            f"python {SCRIPTS}/merge_versions.py {VERSION}",
+            inputs=[f"{RAW_BASE}/v*/*.csv"],
+            outputs=[MERGED],
+            code=[f"{SCRIPTS}/merge_versions.py", *pipeline_code],
+            params=[f"upto={VERSION}"],
+            packages=["pandas", "pyarrow"],
+        ),
+        # → appends /data/merged/vN.arrow for every unmerged version ≤ newest
     )
 
     featurize = BashOperator(
         task_id="featurize",
-        bash_command=(
-            "python /opt/airflow/scripts/featurize.py "
-            f"{MERGED}/current.csv {PROCESSED}/train.parquet"
+        bash_command=_cached(
+            "featurize",
+            f"python {SCRIPTS}/featurize.py "
+            f"{MERGED} {PROCESSED}/train.parquet --version {VERSION}",
+            inputs=[MERGED],
+            outputs=[PROCESSED / "train.parquet", PROCESSED / "train.vocab.json"],
+            code=pipeline_code,                 # TOP_MERCHANTS lives in featurize.py
+            packages=["pandas", "pyarrow"],
         ),
     )
 
     train = BashOperator(
         task_id="train_log_mlflow",
+        # DRIFT_ENGINE is inherited from the worker, as branch_drift sees it,
+        # so train.py reuses its saved drift.json
         env={"MLFLOW_TRACKING_URI": "http://mlflow:5000"},
-        bash_command=(
-            "python /opt/mlflow/train.py "
-            f"{PROCESSED}/train.parquet "
-            "{{ ti.xcom_pull(task_ids='detect_new_version') }}"
+        append_env=True,
+        bash_command=_cached(
+            "train",
+            f"python {MLFLOW_DIR}/train.py {PROCESSED}/train.parquet {VERSION}",
+            inputs=[PROCESSED / "train.parquet", PROCESSED / "train.vocab.json"],
+            code=[f"{MLFLOW_DIR}/*.py", f"{MLFLOW_DIR}/*.json", *pipeline_code],
+            params=[f"version={VERSION}", "drift_engine=${DRIFT_ENGINE:-}",
+                    "mode=${TRAIN_MODE:-auto}", "neg_rate=${NEG_RATE:-1.0}"],
+            packages=["lightgbm", "scikit-learn", "mlflow"],
         ),
     )
 
@@ -176,9 +262,13 @@ def retrain_on_drift():
     #  Wiring                                                             #
     # ------------------------------------------------------------------ #
     detect_version = _detect_version()      # task object
-    branch = _branch(detect_version)        # pass XCom to the branch fn
+    baseline = _prepare_baseline()
+    # one mapped task instance per unseen version, all in parallel
+    columnar = _columnarize.expand(version=detect_version)
+    checks = _drift_check.expand(version=columnar)
+    branch = _branch(checks)                # single fan-in decision
 
-    wait_for_new_data >> detect_version >> branch
+    wait_for_new_data >> detect_version >> baseline >> columnar
     branch >> no_drift                     # skip path
     branch >> merge >> featurize >> train >>push_metrics   # drift-positive path
 
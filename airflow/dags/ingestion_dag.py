@@ -1,18 +1,26 @@
 from airflow.decorators import dag, task
+from airflow.exceptions import AirflowSkipException
 from pendulum import datetime
-import pandas as pd, requests, os
+from pathlib import Path
+import os, sys
+
+# shared pipeline helpers live next to the BashOperator scripts
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+from ingest import ingest
 
 RAW = "/opt/airflow/data/raw"          # mounted volume
-URL = 'os.environ["DATA_URL"]'
 
-@dag(schedule="0 */6 * * *", start_date=datetime(2025,4,20), catchup=False, tags=["ingest"])
+@dag(schedule="0 */6 * * *", start_date=datetime(2025,4,20), catchup=False,
+     max_active_runs=1, tags=["ingest"])
 def ingestion():
-    @task
+    @task(retries=3)
     def download():
-        df = pd.read_csv(URL)
-        path = f"{RAW}/transactions_{pd.Timestamp.now().date()}.csv"
-        df.to_csv(path, index=False)
-        return path
+        # streams into raw/.incoming and resumes there on retry; a drop
+        # identical to an earlier one is discarded, not re-versioned
+        entry = ingest(os.environ["DATA_URL"], RAW, name="data_url")
+        if entry["version"] is None:
+            raise AirflowSkipException(f"duplicate of {entry['duplicate_of']}")
+        return entry["version"]
     download()
 
 dag = ingestion()
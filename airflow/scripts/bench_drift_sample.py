@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+bench_drift_sample.py – drift-task wall time and peak RSS, full load vs
+streaming reservoir sample.
+
+Each mode runs in a fresh interpreter so ``ru_maxrss`` is that mode's own
+peak.  Both modes finish with the same Evidently report as the DAG.
+
+Modes are compared per source so the sampling gain is not mixed with the
+caching gain: ``csv`` parses the CSV in both modes (the bulk parser for the
+full load, the chunked C parser for the reservoir), ``arrow`` reads the
+columnar copy in both, building it first if needed.
+
+Usage
+-----
+python bench_drift_sample.py data/raw/v1/baseline.csv data/raw/v2/latest.csv \
+    [--n 1000] [--stratify] [--sources csv,arrow]
+"""
+import argparse, json, resource, subprocess, sys, time
+
+from raw_io import CSV_ENGINE, DRIFT_COLUMNS, columnarize, read_raw
+from sampling import SEED, sample_raw
+
+MODES = ("full", "reservoir")
+SOURCES = ("csv", "arrow")
+
+
+def run_mode(mode: str, source: str, ref: str, cur: str, n: int,
+             stratify: bool) -> dict:
+    from evidently.metrics import DatasetDriftMetric
+    from evidently.report import Report
+
+    t0 = time.perf_counter()
+    if mode == "full":
+        engine = CSV_ENGINE if source == "csv" else None
+        ref_df = read_raw(ref, DRIFT_COLUMNS, engine=engine).sample(n=n, random_state=SEED)
+        cur_df = read_raw(cur, DRIFT_COLUMNS, engine=engine).sample(n=n, random_state=SEED)
+    else:
+        engine = "c" if source == "csv" else None
+        label = "is_fraud" if stratify else None
+        ref_df = sample_raw(ref, n, DRIFT_COLUMNS, SEED, label, engine=engine)
+        cur_df = sample_raw(cur, n, DRIFT_COLUMNS, SEED, label, engine=engine)
+    t1 = time.perf_counter()
+
+    report = Report(metrics=[DatasetDriftMetric()])
+    report.run(reference_data=ref_df, current_data=cur_df)
+    result = report.as_dict()["metrics"][0]["result"]
+    return {
+        "mode": mode,
+        "source": source,
+        "sample_s": round(t1 - t0, 3),
+        "total_s": round(time.perf_counter() - t0, 3),
+        "peak_rss_mib": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "dataset_drift": bool(result["dataset_drift"]),
+        "share_of_drifted_columns": result["share_of_drifted_columns"],
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark drift-check sampling")
+    ap.add_argument("reference", help="Baseline raw CSV")
+    ap.add_argument("current", help="New version raw CSV")
+    ap.add_argument("--n", type=int, default=1000)
+    ap.add_argument("--stratify", action="store_true",
+                    help="Stratify the reservoir on is_fraud")
+    ap.add_argument("--sources", default=",".join(SOURCES),
+                    help="Comma-separated sources to compare modes on")
+    ap.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    ap.add_argument("--source", choices=SOURCES, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.mode:                      # child process: one measurement
+        print(json.dumps(run_mode(args.mode, args.source, args.reference,
+                                  args.current, args.n, args.stratify)))
+        sys.exit(0)
+
+    for source in args.sources.split(","):
+        if source == "arrow":          # build outside the timed runs
+            columnarize(args.reference)
+            columnarize(args.current)
+        for mode in MODES:
+            cmd = [sys.executable, __file__, args.reference, args.current,
+                   "--n", str(args.n), "--mode", mode, "--source", source]
+            if args.stratify:
+                cmd.append("--stratify")
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True)
+            print(out.stdout.strip().splitlines()[-1])
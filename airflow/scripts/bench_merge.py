@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+bench_merge.py – merge time and bytes written as version history grows.
+
+Splits one raw CSV into N fake version drops (each re-sending 1% of the
+previous drop, so dedup has work to do), then merges them one by one with
+
+* rewrite – the old approach: concat ``current.csv`` + new drop,
+  ``drop_duplicates()``, rewrite ``current.csv``;
+* append  – ``merged_store.append_version`` (new partition only).
+
+Usage
+-----
+python bench_merge.py data/raw/v1/baseline.csv [--versions 20] [--out bench.csv]
+"""
+import argparse, tempfile, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from merged_store import append_version, version_csv
+from raw_io import read_raw
+
+RESEND = 0.01
+
+
+def make_versions(src: Path, raw_dir: Path, n: int):
+    df = read_raw(src, parse_dates=False)
+    parts = np.array_split(np.arange(len(df)), n)
+    prev = None
+    for i, idx in enumerate(parts, start=1):
+        part = df.iloc[idx]
+        if prev is not None:
+            part = pd.concat([part, prev.sample(frac=RESEND, random_state=i)])
+        out = version_csv(raw_dir, f"v{i}")
+        out.parent.mkdir(parents=True)
+        part.to_csv(out, index=False)
+        prev = df.iloc[idx]
+
+
+def bench(src: Path, n: int) -> pd.DataFrame:
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_dir, store = Path(tmp) / "raw", Path(tmp) / "merged"
+        current = Path(tmp) / "current.csv"
+        make_versions(src, raw_dir, n)
+
+        for i in range(1, n + 1):
+            v, csv = f"v{i}", version_csv(raw_dir, f"v{i}")
+
+            t0 = time.perf_counter()
+            new = read_raw(csv, parse_dates=False)
+            df = new if i == 1 else pd.concat(
+                [read_raw(current, parse_dates=False), new]
+            ).drop_duplicates()
+            df.to_csv(current, index=False)
+            rewrite_s = time.perf_counter() - t0
+
+            part = append_version(store, raw_dir, v)
+            rows.append({
+                "version": v,
+                "history_rows": len(df),
+                "rewrite_s": round(rewrite_s, 3),
+                "rewrite_mib": round(current.stat().st_size / 2**20, 2),
+                "append_s": part["seconds"],
+                "append_mib": round(part["bytes_written"] / 2**20, 2),
+            })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark merged dataset growth")
+    ap.add_argument("csv", type=Path, help="Raw transactions CSV to split")
+    ap.add_argument("--versions", type=int, default=20)
+    ap.add_argument("--out", type=Path, help="Optional CSV report path")
+    args = ap.parse_args()
+    report = bench(args.csv, args.versions)
+    print(report.to_string(index=False))
+    if args.out:
+        report.to_csv(args.out, index=False)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+bench_pipeline.py – wall time, peak RSS and rows/s of every pipeline stage
+on synthetic data, outside Airflow.
+
+For each size, ``synth_data.generate`` writes ``--versions`` drops of that
+many rows under ``<work>/<size>/raw`` (reused while the spec is unchanged).
+Every derived file is then removed and the stages run in DAG order, each in
+a fresh interpreter so its peak RSS is its own (``os.wait4``):
+
+* merge      – ``merged_store.append_versions`` over all drops
+* drift      – ``drift_check`` baseline vs the last drop (caches cleared)
+* featurize  – ``featurize`` on the merged store
+* train      – train.py's full-retrain path: ``load_training_data``,
+  binning, ``lgb.train`` with params.json, ``evaluate`` – no MLflow run,
+  registry or Pushgateway
+
+``seconds`` is the stage itself; ``wall_seconds`` adds interpreter start
+and imports.  The JSON report carries the git commit; ``compare`` prints
+new/old ratios and exits 1 when a stage got slower or bigger than
+``--tolerance``.
+
+Usage
+-----
+python bench_pipeline.py run data/bench --sizes 100k,1M,10M [--drift 0.1] \
+    [--out bench_pipeline.json]
+python bench_pipeline.py compare before.json after.json [--tolerance 1.25]
+"""
+from __future__ import annotations
+
+import argparse, json, os, shutil, subprocess, sys, time
+from pathlib import Path
+
+from synth_data import SPEC, generate, parse_rows
+
+HERE = Path(__file__).resolve().parent
+# /opt/airflow/scripts → /opt/mlflow (same layout in the repo)
+MLFLOW_DIR = HERE.parents[1] / "mlflow"
+STAGES = ("merge", "drift", "featurize", "train")
+RESULT = ".stage.json"
+PARQUET = "train.parquet"
+
+
+# ---------------------------------------------------------------------------
+# 1. • stages (run in a child process) •
+# ---------------------------------------------------------------------------
+def _raw_rows(work: Path) -> tuple[int, int]:
+    spec = json.loads((work / "raw" / SPEC).read_text())
+    return spec["rows"], spec["versions"]
+
+
+def stage_merge(work: Path, engine: str) -> dict:
+    from merged_store import append_versions
+    parts = append_versions(work / "merged", work / "raw")
+    return {"rows": sum(p["rows"] + p["duplicates"] for p in parts)}
+
+
+def stage_drift(work: Path, engine: str) -> dict:
+    from drift import drift_check
+    from merged_store import list_versions, version_csv
+    versions = list_versions(work / "raw")
+    result = drift_check(version_csv(work / "raw", versions[0]),
+                         version_csv(work / "raw", versions[-1]), engine)
+    rows, _ = _raw_rows(work)
+    return {"rows": 2 * rows, "share_of_drifted_columns":
+            result["share_of_drifted_columns"]}
+
+
+def stage_featurize(work: Path, engine: str) -> dict:
+    from featurize import TOP_MERCHANTS, featurize
+    featurize(work / "merged", work / PARQUET, TOP_MERCHANTS)
+    rows, versions = _raw_rows(work)
+    return {"rows": rows * versions}
+
+
+def stage_train(work: Path, engine: str) -> dict:
+    sys.path.insert(0, str(MLFLOW_DIR))
+    import lightgbm as lgb
+    import train
+
+    data = str(work / PARQUET)
+    (X_train, X_val, X_test), (y_train, y_val, y_test), _, _ = \
+        train.load_training_data(data)
+    params = train.load_params()
+    train_set, val_set, _ = train.cached_datasets(
+        data, "bench", params, X_train, y_train, X_val, y_val)
+    booster = lgb.train(
+        {k: v for k, v in params.items() if k != "n_estimators"},
+        train_set,
+        num_boost_round=params.get("n_estimators", 100),
+        valid_sets=[val_set],
+    )
+    model = train.BoosterModel(booster)
+    return {"rows": len(X_train) + len(X_val) + len(X_test),
+            "auc": train.evaluate(model, X_test, y_test)["auc"]}
+
+
+def run_stage(name: str, work: Path, engine: str) -> None:
+    t0 = time.perf_counter()
+    out = globals()[f"stage_{name}"](work, engine)
+    out["seconds"] = time.perf_counter() - t0
+    (work / RESULT).write_text(json.dumps(out))
+
+
+# ---------------------------------------------------------------------------
+# 2. • driver •
+# ---------------------------------------------------------------------------
+def reset(work: Path) -> None:
+    """Drop every derived file so each run starts from the raw CSVs only."""
+    for path in (work / "merged", work / "lgb_cache"):
+        shutil.rmtree(path, ignore_errors=True)
+    for path in (work / PARQUET, work / RESULT):
+        path.unlink(missing_ok=True)
+    keep = {SPEC, "baseline.csv", "latest.csv"}
+    for path in (work / "raw").rglob("*"):
+        if path.is_file() and path.name not in keep:
+            path.unlink()
+
+
+def measure(name: str, work: Path, engine: str) -> dict:
+    """Run one stage in a child; return its timings and peak RSS."""
+    env = {**os.environ, "LGB_CACHE_DIR": str(work / "lgb_cache")}
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, __file__, "stage", name, str(work), "--engine", engine],
+        cwd=HERE, env=env)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    row = {"stage": name, "wall_seconds": time.perf_counter() - t0,
+           "peak_rss_mib": usage.ru_maxrss / 1024,          # KiB on Linux
+           "status": "ok" if proc.returncode == 0 else f"exit {proc.returncode}"}
+    if proc.returncode == 0:
+        row.update(json.loads((work / RESULT).read_text()))
+        row["rows_per_s"] = row["rows"] / row["seconds"]
+    return row
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench(work_dir: Path, sizes: list[str], versions: int, drift: float,
+          engine: str, seed: int) -> dict:
+    results = []
+    for size in sizes:
+        work = work_dir / size
+        t0 = time.perf_counter()
+        generate(work / "raw", parse_rows(size), versions, drift, seed=seed)
+        print(f"[{size}] data ready in {time.perf_counter() - t0:.1f}s")
+        reset(work)
+        for name in STAGES:
+            row = {"size": size, **measure(name, work, engine)}
+            results.append(row)
+            print(f"[{size}] {name:<9} {row['status']:<6} "
+                  f"{row.get('seconds', float('nan')):>8.2f}s "
+                  f"{row['peak_rss_mib']:>9,.0f} MiB "
+                  f"{row.get('rows_per_s', float('nan')):>12,.0f} rows/s")
+    return {
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {"sizes": sizes, "versions": versions, "drift": drift,
+                   "engine": engine, "seed": seed},
+        "results": results,
+    }
+
+
+def compare(before: dict, after: dict, tolerance: float) -> bool:
+    """Print new/old ratios; return True if nothing regressed."""
+    old = {(r["size"], r["stage"]): r for r in before["results"]}
+    ok = True
+    print(f"{before['commit']} → {after['commit']}")
+    print(f"{'size':<6} {'stage':<10} {'seconds':>9} {'peak RSS':>9}")
+    for r in after["results"]:
+        prev = old.get((r["size"], r["stage"]))
+        if prev is None or "seconds" not in prev or "seconds" not in r:
+            continue
+        t, m = r["seconds"] / prev["seconds"], r["peak_rss_mib"] / prev["peak_rss_mib"]
+        flag = "  ← regression" if max(t, m) > tolerance else ""
+        ok &= not flag
+        print(f"{r['size']:<6} {r['stage']:<10} {t:>8.2f}× {m:>8.2f}×{flag}")
+    return ok
+
+
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Pipeline stage benchmark")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="Generate data and time every stage")
+    r.add_argument("work_dir", type=Path, help="Scratch folder, one subfolder per size")
+    r.add_argument("--sizes", default="100k,1M",
+                   help="Comma-separated rows per version (100k,1M,10M)")
+    r.add_argument("--versions", type=int, default=2)
+    r.add_argument("--drift", type=float, default=0.1)
+    r.add_argument("--engine", choices=["native", "evidently"], default="native")
+    r.add_argument("--seed", type=int, default=0)
+    r.add_argument("--out", type=Path, help="JSON report path")
+
+    s = sub.add_parser("stage", help="(internal) run one stage in this process")
+    s.add_argument("name", choices=STAGES)
+    s.add_argument("work", type=Path)
+    s.add_argument("--engine", default="native")
+
+    c = sub.add_parser("compare", help="Compare two JSON reports")
+    c.add_argument("before", type=Path)
+    c.add_argument("after", type=Path)
+    c.add_argument("--tolerance", type=float, default=1.25,
+                   help="Largest accepted new/old ratio")
+
+    args = ap.parse_args()
+    if args.cmd == "stage":
+        run_stage(args.name, args.work, args.engine)
+    elif args.cmd == "compare":
+        ok = compare(json.loads(args.before.read_text()),
+                     json.loads(args.after.read_text()), args.tolerance)
+        sys.exit(0 if ok else 1)
+    else:
+        report = bench(args.work_dir, args.sizes.split(","), args.versions,
+                       args.drift, args.engine, args.seed)
+        if args.out:
+            args.out.write_text(json.dumps(report, indent=2))
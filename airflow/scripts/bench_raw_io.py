@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+bench_raw_io.py – compare plain ``pd.read_csv`` with the typed raw loader
+and its Arrow cache.
+
+Usage
+-----
+python bench_raw_io.py data/raw/v1/baseline.csv [--repeat 3]
+"""
+import argparse, time
+from pathlib import Path
+
+import pandas as pd
+
+from raw_io import DRIFT_COLUMNS, FEATURE_COLUMNS, columnarize, read_raw
+
+CASES = {
+    "pd.read_csv (baseline)":  lambda p: pd.read_csv(p),
+    "read_raw all columns":    lambda p: read_raw(p, engine="pyarrow"),
+    "read_raw FEATURE_COLUMNS": lambda p: read_raw(p, columns=FEATURE_COLUMNS,
+                                                   engine="pyarrow"),
+    "read_raw DRIFT_COLUMNS":  lambda p: read_raw(p, columns=DRIFT_COLUMNS,
+                                                  engine="pyarrow"),
+    "read_raw c-engine":       lambda p: read_raw(p, engine="c"),
+    "arrow cache all columns": lambda p: read_raw(p),
+    "arrow cache DRIFT_COLUMNS": lambda p: read_raw(p, columns=DRIFT_COLUMNS),
+}
+
+
+def bench(path: Path, repeat: int):
+    t0 = time.perf_counter()
+    columnarize(path, force=True)
+    print(f"one-off columnar conversion: {time.perf_counter() - t0:.2f}s\n")
+    print(f"{'case':<28}{'best s':>9}{'MiB':>10}{'cols':>6}")
+    for name, load in CASES.items():
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            df = load(path)
+            best = min(best, time.perf_counter() - t0)
+        mib = df.memory_usage(deep=True).sum() / 2**20
+        print(f"{name:<28}{best:>9.2f}{mib:>10.1f}{df.shape[1]:>6}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark raw CSV loading")
+    ap.add_argument("csv", type=Path, help="Raw transactions CSV")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    bench(args.csv, args.repeat)
@@ -1,29 +1,33 @@
 import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-import pandas as pd
-from evidently.report import Report
-from evidently.metrics import DatasetDriftMetric
 import logging
 import sys
+
+from drift import DRIFT_ENGINE, drift_check, prepare_reference
+from merged_store import append_versions, list_versions
+from raw_io import columnarize
 SEED = 42
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-def _detect_version(seen_path, raw_dir) -> str:
-    """Return newest version folder name (e.g. 'v3') if unseen."""
+def _detect_versions(seen_path, raw_dir) -> list[str]:
+    """Return every unseen version folder, naturally sorted (v2 < v10)."""
     with open(seen_path, "r") as f:
         seen = f.read().split(",")
-    if not seen:
-        seen = []
-    versions = sorted(p.name for p in raw_dir.iterdir() if p.is_dir())
-    unseen = [v for v in versions if v and v not in seen]
+    unseen = [v for v in list_versions(raw_dir) if v not in seen]
     if not unseen:
         raise ValueError("no-op – nothing new")
-    new_v = unseen[-1]
-    seen = ",".join(seen + [new_v])
     with open(seen_path, "w") as f:
-        f.write(seen)
-    return new_v
+        f.write(",".join(seen + unseen))
+    return unseen
+
+def _prepare_and_check(raw_dir, version) -> str:
+    """Columnar conversion + drift check for one version (pool worker)."""
+    for csv in (raw_dir / version).glob("*.csv"):
+        columnarize(csv)
+    return _branch(raw_dir, version)
 
 def _branch(raw_dir, version) -> str:
     """Return task-id to follow, with detailed logging."""
@@ -36,24 +40,15 @@ def _branch(raw_dir, version) -> str:
     logger.info(f"Baseline file: {base_path}")
     logger.info(f"New file:      {new_path}")
 
-    # 1) Read in CSVs
+    # Evidently on reservoir samples, or the native engine on full files
+    logger.info(f"Running {DRIFT_ENGINE} drift check…")
     t0 = time.time()
-    base_df = pd.read_csv(base_path)
-    logger.info(f"Loaded baseline.csv: {base_df.shape} in {time.time() - t0:.2f}s")
-    t1 = time.time()
-    new_df = pd.read_csv(new_path)
-    logger.info(f"Loaded latest.csv:   {new_df.shape} in {time.time() - t1:.2f}s")
-    base_df = base_df.sample(n=1000, random_state=SEED)
-    new_df  = new_df.sample(n=1000, random_state=SEED)
-    # 2) Build and run drift report
-    report = Report(metrics=[DatasetDriftMetric()])
-
-    logger.info("Running DataDriftTable report…")
-    t2 = time.time()
-    report.run(reference_data=base_df, current_data=new_df)
-    t3 = time.time()
-    logger.info(f"DataDriftTable computation took {t3 - t2:.2f}s")       
-    result = report.as_dict()["metrics"][0]["result"]
+    result = drift_check(base_path, new_path, DRIFT_ENGINE)
+    logger.info(
+        f"Drift check took {time.time() - t0:.2f}s – "
+        f"{result['number_of_drifted_columns']}/{result['number_of_columns']} "
+        "columns drifted"
+    )
     drift_detected = result["dataset_drift"]
 
     if drift_detected:
@@ -63,20 +58,23 @@ def _branch(raw_dir, version) -> str:
         logger.info(f"No Drift detected; branching to no_drift")
         return "no_drift"
     
-def merge_datasets(raw_dir: str, new_version: str):
-    baseline  = raw_dir / "v1" / "baseline.csv"
-    new_csv   = raw_dir / new_version / "latest.csv"     # argv[1] = v2, v3 …
-    df = pd.concat([pd.read_csv(baseline), pd.read_csv(new_csv)]).drop_duplicates()
-    out = Path("/opt/airflow/data/merged/current.csv")
-    out.parent.mkdir(exist_ok=True, parents=True)
-    df.to_csv(out, index=False)
+def merge_datasets(raw_dir: Path, new_version: str):
+    store = Path("/opt/airflow/data/merged")
+    for part in append_versions(store, raw_dir, upto=new_version):
+        logger.info(f"Merged {part['version']}: +{part['rows']:,} rows "
+                    f"({part['duplicates']:,} dupes) in {part['seconds']:.2f}s")
 
 if __name__ == '__main__':
     seen_path = sys.argv[1]  # Path to seen.txt
-    raw_dir = sys.argv[2]  # Path to raw data directory
-    version = _detect_version(seen_path, raw_dir)
-    res = _branch(raw_dir, version)
-    if res == "merge_datasets":
-        merge_datasets(raw_dir, version)
+    raw_dir = Path(sys.argv[2])  # Path to raw data directory
+    versions = _detect_versions(seen_path, raw_dir)
+    # build the baseline's cached copy/reference once before fanning out
+    base_path = raw_dir / "v1" / "baseline.csv"
+    columnarize(base_path)
+    prepare_reference(base_path, DRIFT_ENGINE)
+    with ProcessPoolExecutor() as pool:
+        res = list(pool.map(_prepare_and_check, repeat(raw_dir), versions))
+    if "merge_datasets" in res:
+        merge_datasets(raw_dir, versions[-1])
     else:
-        logger.info("No drift detected; no action taken.")
\ No newline at end of file
+        logger.info("No drift detected; no action taken.")
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+drift.py – NumPy drift engine, a drop-in alternative to Evidently's
+``DatasetDriftMetric``.
+
+The reference side is reduced once to a *profile*: per numeric column the
+counts over 100 reference-quantile bins (plus min, max and std), per
+categorical column the value counts.  The current side is only binned onto
+those edges, so a comparison costs one ``searchsorted`` / ``value_counts``
+per column and runs on full versions instead of 1000-row samples.
+
+Per-column tests – ``stattest="auto"`` makes Evidently's default choice,
+by reference row count and by distinct values in both sides together:
+
+* ≤ 1000 reference rows: numeric → two-sample KS; categorical → chi-square,
+  or a two-proportion Z-test when binary; drift if p < 0.05
+* > 1000 reference rows: numeric → Wasserstein distance over the reference
+  std; categorical → Jensen-Shannon distance; drift if ≥ 0.1
+
+Numeric columns with ≤ 5 distinct values are categorical, as in Evidently.
+KS and Wasserstein run on the 100-bin histograms, not on the raw values,
+so they are exact to the resolution of the reference percentiles
+(Wasserstein takes the CDF gap as linear inside each bin).  ``"psi"`` (over 10 reference-
+mass bins, drift if ≥ 0.1) is available as an explicit ``stattest``.  The
+dataset verdict is Evidently's: drifted if the share of drifted columns is
+≥ ``drift_share`` (0.5).  Result keys match ``DatasetDriftMetric``.
+
+The baseline reference is built once and stored next to it in ``raw/v1/``:
+``baseline.profile.json`` for the native engine, ``baseline.sample<n>.arrow``
+(reservoir sample) for Evidently, both stamped with the CSV's checksum.
+``drift_check`` saves its verdict as ``raw/vN/drift.json`` (+ the Evidently
+HTML), so train.py logs the branch task's result instead of recomputing it.
+
+Usage
+-----
+python drift.py data/raw/v1/baseline.csv data/raw/v2/latest.csv [--compare]
+"""
+from __future__ import annotations
+
+import argparse, json, os, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from scipy import stats
+from scipy.spatial import distance
+
+from raw_io import DRIFT_COLUMNS, fingerprint, read_raw, unchanged
+from sampling import SAMPLE_SIZE, SEED, sample_raw
+
+DRIFT_ENGINE = os.getenv("DRIFT_ENGINE", "evidently")    # or "native"
+DRIFT_SHARE = 0.5
+P_VALUE = 0.05
+DISTANCE_THRESHOLD = 0.1      # Wasserstein (in reference stds), Jensen-Shannon
+PSI_THRESHOLD = 0.1
+SMALL_SAMPLE = 1000
+CAT_MAX_UNIQUE = 5
+NUM_BINS = 100
+PSI_BINS = 10
+EPS = 1e-4
+
+PROFILE_SUFFIX = ".profile.json"
+PROFILE_VERSION = 2           # 2: numeric min / max / std for Wasserstein
+P_TESTS = {"ks": "ks_p_value", "chisquare": "chi2_p_value", "z": "z_p_value"}
+DISTANCES = {"wasserstein": "wasserstein_norm", "jensenshannon": "jensenshannon"}
+DRIFT_RESULT = "drift.json"
+DRIFT_HTML = "drift_report.html"
+
+
+# ---------------------------------------------------------------------------
+# 1. • reference profile •
+# ---------------------------------------------------------------------------
+def _is_numeric(s: pd.Series) -> bool:
+    return (pd.api.types.is_numeric_dtype(s)
+            and not pd.api.types.is_bool_dtype(s)
+            and s.nunique() > CAT_MAX_UNIQUE)
+
+
+def column_profile(s: pd.Series) -> dict:
+    if _is_numeric(s):
+        v = s.dropna().to_numpy(dtype=float)
+        q = np.quantile(v, np.linspace(0, 1, NUM_BINS + 1)[1:-1])
+        edges = np.unique(q)
+        counts = np.bincount(np.searchsorted(edges, v, side="right"),
+                             minlength=len(edges) + 1)
+        return {"kind": "num", "n": len(v),
+                "min": float(v.min()), "max": float(v.max()), "std": float(v.std()),
+                "edges": edges.tolist(), "counts": counts.tolist()}
+    vc = s.dropna().astype(str).value_counts()
+    return {"kind": "cat", "n": int(vc.sum()),
+            "counts": {k: int(c) for k, c in vc.items()}}
+
+
+def profile(df: pd.DataFrame, columns: list[str] | None = None) -> dict:
+    """Reduce a reference frame to per-column histograms / value counts."""
+    cols = [c for c in (columns or df.columns) if c in df.columns]
+    return {"version": PROFILE_VERSION, "rows": len(df),
+            "columns": {c: column_profile(df[c]) for c in cols}}
+
+
+# ---------------------------------------------------------------------------
+# 2. • per-column tests •
+# ---------------------------------------------------------------------------
+def _psi(ref: np.ndarray, cur: np.ndarray) -> float:
+    p = np.clip(ref / max(ref.sum(), 1), EPS, None)
+    q = np.clip(cur / max(cur.sum(), 1), EPS, None)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def _coarse(counts: np.ndarray) -> np.ndarray:
+    """Merge fine quantile bins into PSI_BINS groups of ~equal ref mass."""
+    idx = np.unique(np.linspace(0, len(counts), PSI_BINS + 1)[:-1].astype(int))
+    return np.add.reduceat(counts, idx)
+
+
+def _wasserstein(ref: dict, ref_c: np.ndarray, cur_c: np.ndarray,
+                 lo: float, hi: float) -> float:
+    """W1 between two histograms on the reference edges, in reference stds.
+
+    The CDF gap is known at every edge and is zero below ``lo`` and above
+    ``hi`` (both sides' extremes); in between it is taken as linear.
+    """
+    grid = np.concatenate([[lo], ref["edges"], [hi]])
+    gap = np.abs(np.concatenate([[0.0], np.cumsum(ref_c)[:-1] / max(ref_c.sum(), 1)
+                                 - np.cumsum(cur_c)[:-1] / max(cur_c.sum(), 1), [0.0]]))
+    w = float(np.sum(np.diff(grid) * (gap[:-1] + gap[1:]) / 2))
+    return w / ref["std"] if ref["std"] > 0 else float(w > 0)
+
+
+def _z_test(ref_c: np.ndarray, cur_c: np.ndarray) -> float:
+    """Two-sided p-value that both sides share the first category's rate."""
+    n1, n2 = ref_c.sum(), cur_c.sum()
+    pooled = (ref_c[0] + cur_c[0]) / (n1 + n2)
+    se = np.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+    if not se:
+        return 1.0
+    return float(2 * stats.norm.sf(abs(ref_c[0] / n1 - cur_c[0] / n2) / se))
+
+
+def compare_column(ref: dict, cur: pd.Series, stattest: str = "auto") -> dict:
+    n_ref = ref["n"]
+    if ref["kind"] == "num":
+        v = cur.dropna().to_numpy(dtype=float)
+        ref_c = np.asarray(ref["counts"])
+        cur_c = np.bincount(np.searchsorted(ref["edges"], v, side="right"),
+                            minlength=len(ref_c))
+        n_cur = len(v)
+        d = float(np.abs(np.cumsum(ref_c) / max(n_ref, 1)
+                         - np.cumsum(cur_c) / max(n_cur, 1)).max())
+        ne = n_ref * n_cur / max(n_ref + n_cur, 1)
+        lo = min(ref["min"], v.min()) if n_cur else ref["min"]
+        hi = max(ref["max"], v.max()) if n_cur else ref["max"]
+        out = {"ks_stat": d,
+               "ks_p_value": float(stats.kstwobign.sf(np.sqrt(ne) * d)),
+               "wasserstein_norm": _wasserstein(ref, ref_c, cur_c, lo, hi),
+               "psi": _psi(_coarse(ref_c), _coarse(cur_c))}
+        small_test, large_test = "ks", "wasserstein"
+    else:
+        vc = cur.dropna().astype(str).value_counts()
+        cats = sorted(set(ref["counts"]) | set(vc.index))
+        ref_c = np.array([ref["counts"].get(c, 0) for c in cats])
+        cur_c = vc.reindex(cats, fill_value=0).to_numpy()
+        n_cur = int(cur_c.sum())
+        if len(cats) > 1 and n_cur:
+            chi2, p = stats.chi2_contingency(np.vstack([ref_c, cur_c]))[:2]
+        else:
+            chi2, p = 0.0, 1.0
+        p_ref = np.clip(ref_c / max(ref_c.sum(), 1), EPS, None)
+        p_cur = np.clip(cur_c / max(n_cur, 1), EPS, None)
+        out = {"chi2_stat": float(chi2), "chi2_p_value": float(p),
+               "jensenshannon": float(distance.jensenshannon(p_ref, p_cur)),
+               "psi": _psi(ref_c, cur_c)}
+        if len(cats) == 2 and n_cur:
+            out["z_p_value"] = _z_test(ref_c, cur_c)
+        small_test = "z" if "z_p_value" in out else "chisquare"
+        large_test = "jensenshannon"
+
+    if stattest == "auto":
+        stattest = small_test if n_ref <= SMALL_SAMPLE else large_test
+    if stattest in P_TESTS:
+        drifted = out[P_TESTS[stattest]] < P_VALUE
+    elif stattest == "psi":
+        drifted = out["psi"] >= PSI_THRESHOLD
+    else:
+        drifted = out[DISTANCES[stattest]] >= DISTANCE_THRESHOLD
+    return {**out, "kind": ref["kind"], "stattest": stattest,
+            "drift_detected": bool(drifted)}
+
+
+# ---------------------------------------------------------------------------
+# 3. • dataset verdict •
+# ---------------------------------------------------------------------------
+def compare(
+    ref_profile: dict,
+    cur: pd.DataFrame,
+    drift_share: float = DRIFT_SHARE,
+    stattest: str = "auto",
+) -> dict:
+    """Same keys / decision rule as Evidently's ``DatasetDriftMetric``."""
+    cols = [c for c in ref_profile["columns"] if c in cur.columns]
+    by_col = {c: compare_column(ref_profile["columns"][c], cur[c], stattest)
+              for c in cols}
+    drifted = sum(r["drift_detected"] for r in by_col.values())
+    share = drifted / len(cols) if cols else 0.0
+    return {
+        "drift_share": drift_share,
+        "number_of_columns": len(cols),
+        "number_of_drifted_columns": drifted,
+        "share_of_drifted_columns": share,
+        "dataset_drift": share >= drift_share,
+        "drift_by_columns": by_col,
+    }
+
+
+def evidently_drift(ref: pd.DataFrame, cur: pd.DataFrame):
+    """Run the Evidently report the pipeline used so far → (result, report)."""
+    from evidently.metrics import DatasetDriftMetric
+    from evidently.report import Report
+
+    report = Report(metrics=[DatasetDriftMetric()])
+    report.run(reference_data=ref, current_data=cur)
+    return report.as_dict()["metrics"][0]["result"], report
+
+
+# ---------------------------------------------------------------------------
+# 4. • stored reference + result •
+# ---------------------------------------------------------------------------
+def _json_default(o):
+    return o.item() if isinstance(o, np.generic) else str(o)
+
+
+def _write_json(path: Path, obj: dict) -> None:
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(obj, indent=2, default=_json_default))
+    os.replace(tmp, path)
+
+
+def reference_profile(csv: Path) -> dict:
+    """Histogram profile of ``csv``, rebuilt only when its checksum changes."""
+    csv = Path(csv)
+    path = csv.with_suffix(PROFILE_SUFFIX)
+    if path.exists():
+        prof = json.loads(path.read_text())
+        if (prof.get("version") == PROFILE_VERSION and unchanged(csv, prof["source"])
+                and set(prof["columns"]) == set(DRIFT_COLUMNS)):
+            return prof
+    prof = profile(read_raw(csv, columns=DRIFT_COLUMNS))
+    prof["source"] = fingerprint(csv)
+    _write_json(path, prof)
+    return prof
+
+
+def reference_sample(csv: Path, n: int = SAMPLE_SIZE) -> pd.DataFrame:
+    """Reservoir sample of ``csv`` for Evidently, stored as Arrow once."""
+    csv = Path(csv)
+    path = csv.with_suffix(f".sample{n}.arrow")
+    if path.exists():
+        table = feather.read_table(path)
+        source = json.loads(table.schema.metadata[b"source"])
+        if unchanged(csv, source) and set(table.column_names) == set(DRIFT_COLUMNS):
+            return table.to_pandas()
+    df = sample_raw(csv, n, DRIFT_COLUMNS, SEED)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **table.schema.metadata, b"source": json.dumps(fingerprint(csv)),
+    })
+    feather.write_feather(table, path)
+    return df
+
+
+def prepare_reference(ref_csv: Path, engine: str = DRIFT_ENGINE) -> None:
+    """Build the stored reference for ``engine`` ahead of parallel checks."""
+    if engine == "native":
+        reference_profile(ref_csv)
+    else:
+        reference_sample(ref_csv)
+
+
+def drift_check(ref_csv: Path, cur_csv: Path, engine: str = DRIFT_ENGINE) -> dict:
+    """Drift of ``cur_csv`` against ``ref_csv``, computed once per version.
+
+    The verdict is saved as ``drift.json`` next to ``cur_csv`` (Evidently
+    also writes its HTML report) and reused while the engine, the column set
+    and both input checksums are unchanged.  ``evidently`` compares reservoir samples;
+    ``native`` compares the full current file against the stored profile.
+    """
+    ref_csv, cur_csv = Path(ref_csv), Path(cur_csv)
+    out = cur_csv.with_name(DRIFT_RESULT)
+    if out.exists():
+        saved = json.loads(out.read_text())
+        if (saved["engine"] == engine
+                and saved.get("columns") == DRIFT_COLUMNS
+                and unchanged(ref_csv, saved["reference"])
+                and unchanged(cur_csv, saved["current"])):
+            return saved["result"]
+
+    html = cur_csv.with_name(DRIFT_HTML)
+    if engine == "native":
+        result = compare(reference_profile(ref_csv),
+                         read_raw(cur_csv, columns=DRIFT_COLUMNS))
+        html.unlink(missing_ok=True)
+    else:
+        cur = sample_raw(cur_csv, SAMPLE_SIZE, DRIFT_COLUMNS, SEED)
+        result, report = evidently_drift(reference_sample(ref_csv), cur)
+        report.save_html(str(html))
+    _write_json(out, {
+        "engine": engine,
+        "columns": DRIFT_COLUMNS,
+        "reference": fingerprint(ref_csv),
+        "current": fingerprint(cur_csv),
+        "result": result,
+    })
+    return result
+
+
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Dataset drift between two raw files")
+    ap.add_argument("reference", type=Path)
+    ap.add_argument("current", type=Path)
+    ap.add_argument("--engine", choices=["native", "evidently"], default="native")
+    ap.add_argument("--compare", action="store_true",
+                    help="Benchmark native vs Evidently on the same samples "
+                         "and native on the full files")
+    args = ap.parse_args()
+
+    if not args.compare:
+        print(json.dumps(drift_check(args.reference, args.current, args.engine),
+                         indent=2, default=_json_default))
+    else:
+        ref = sample_raw(args.reference, SAMPLE_SIZE, DRIFT_COLUMNS, SEED)
+        cur = sample_raw(args.current, SAMPLE_SIZE, DRIFT_COLUMNS, SEED)
+        full_ref = read_raw(args.reference, columns=DRIFT_COLUMNS)
+        full_cur = read_raw(args.current, columns=DRIFT_COLUMNS)
+
+        t0 = time.perf_counter()
+        ev = evidently_drift(ref, cur)[0]
+        t1 = time.perf_counter()
+        nat = compare(profile(ref), cur)
+        t2 = time.perf_counter()
+        prof = profile(full_ref)
+        t3 = time.perf_counter()
+        full = compare(prof, full_cur)
+        t4 = time.perf_counter()
+
+        print(f"{'run':<34}{'seconds':>9}{'share':>8}{'drift':>7}")
+        for name, res, secs in [
+            (f"evidently  samples n={len(ref):,}", ev, t1 - t0),
+            (f"native     samples n={len(ref):,}", nat, t2 - t1),
+            (f"native     full    n={len(full_cur):,}", full, t4 - t3),
+        ]:
+            print(f"{name:<34}{secs:>9.2f}"
+                  f"{res['share_of_drifted_columns']:>8.2f}"
+                  f"{str(res['dataset_drift']):>7}")
+        print(f"(one-off reference profile of {len(full_ref):,} rows: "
+              f"{t3 - t2:.2f}s)")
@@ -3,15 +3,30 @@
 featurize.py – shrink high-cardinality ‘merchant’ & ‘job’, map state→region,
 and save a training-ready Parquet file.
 
+The only statistic learned from the data is the top-merchant vocabulary; it
+is written next to the Parquet (``<out>.vocab.json``) so ``transform`` can
+rebuild exactly the same features for any later chunk of raw rows.
+
+Per-card velocity features (``velocity.py``) need each card's earlier rows,
+so they are added over the whole input before the row-wise ``transform``.
+
 Usage
 -----
 python featurize.py raw.csv processed.parquet \
     [--top-merchants 50]
+python featurize.py data/merged processed.parquet     # merged store dir
+python featurize.py data/merged processed.parquet --version v3   # metrics label
 """
-import argparse, re
+import argparse, json, re
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from merged_store import read_merged
+from raw_io import FEATURE_COLUMNS, read_raw
+from stage_metrics import StageMetrics
+from velocity import INPUT_COLS, VELOCITY_COLS, velocity_features
+
 TOP_MERCHANTS = 5
 # ---------------------------------------------------------------------------
 # 1. • low-cardinality region • (unchanged)
@@ -73,6 +88,14 @@ JOB_KEYWORD_MAP = {
 
 JOB_DEFAULT = "Other"
 MERCHANT_PREFIX = "fraud_"
+VOCAB_SUFFIX = ".vocab.json"
+SPLIT_COL = "split_bucket"     # 0–99 from trans_num: a split stable across versions
+CAT_COLS = ["merchant_grouped", "category", "gender", "job_grouped", "region"]
+DROP_COLS = [
+    "Unnamed: 0","trans_date_trans_time","dob","first","last","street",
+    "city","state","zip","trans_num","unix_time","cc_num","city_pop",
+    "is_fraud","merchant","job"
+]
 
 # ---------------------------------------------------------------------------
 def collapse_job(title: str) -> str:
@@ -84,22 +107,33 @@ def collapse_job(title: str) -> str:
     return JOB_DEFAULT
 
 
-def build_merchant_map(series: pd.Series, top_n: int):
-    """Return a dict: raw → cleaned/Other, keeping only top-n merchants."""
+def top_merchants_of(series: pd.Series, top_n: int) -> list[str]:
+    """The ``top_n`` most frequent merchants, prefix stripped."""
     cleaned = series.str.replace(f"^{MERCHANT_PREFIX}", "", regex=True)
-    top_merchants = set(cleaned.value_counts().nlargest(top_n).index)
-    return {raw: (name if (name := raw[len(MERCHANT_PREFIX):]) in top_merchants
+    return sorted(cleaned.value_counts().nlargest(top_n).index)
+
+
+def build_merchant_map(series: pd.Series, top: list[str]):
+    """Return a dict: raw → cleaned/Other, keeping only the ``top`` merchants."""
+    top = set(top)
+    return {raw: (name if (name := raw[len(MERCHANT_PREFIX):]) in top
                   else "Other")
             for raw in series.unique()}
 
 
-def featurize(raw_csv: Path, out_parquet: Path, top_merchants: int = 50):
-    df = pd.read_csv(
-        raw_csv,
-        parse_dates=["trans_date_trans_time", "dob"],
-        dayfirst=False,
-    )
+def split_bucket(trans_num: pd.Series) -> np.ndarray:
+    """Stable 0–99 bucket per transaction: the same row lands in the same
+    train/val/test split in every data version."""
+    hashed = pd.util.hash_pandas_object(trans_num.astype(str), index=False)
+    return (hashed.to_numpy() % 100).astype(np.uint8)
+
+
+def vocab_path(out_parquet: Path) -> Path:
+    return Path(out_parquet).with_suffix(VOCAB_SUFFIX)
+
 
+def transform(df: pd.DataFrame, vocab: dict) -> pd.DataFrame:
+    """Row-wise features before one-hot encoding – safe on any chunk."""
     # ── Temporal & age features ───────────────────────────────────────────
     df["tx_hour"]       = df["trans_date_trans_time"].dt.hour
     df["tx_dayofweek"]  = df["trans_date_trans_time"].dt.dayofweek
@@ -108,41 +142,56 @@ def featurize(raw_csv: Path, out_parquet: Path, top_merchants: int = 50):
 
     # ── Region (state → US Census region) ────────────────────────────────
     if "state" in df.columns:
-        df["region"] = df["state"].map(REGION_MAP).fillna("Other")
+        df["region"] = (df["state"].map(REGION_MAP)
+                        .astype("object").fillna("Other"))
 
     # ── Merchant collapse ────────────────────────────────────────────────
     if "merchant" in df.columns:
-        m_map = build_merchant_map(df["merchant"], top_merchants)
+        m_map = build_merchant_map(df["merchant"], vocab["top_merchants"])
         df["merchant_grouped"] = df["merchant"].map(m_map)
 
     # ── Job collapse ─────────────────────────────────────────────────────
     if "job" in df.columns:
-        df["job_grouped"] = df["job"].apply(collapse_job)
+        # categorical .map() runs once per distinct title, not per row
+        df["job_grouped"] = df["job"].map(collapse_job).astype("object")
 
     # ── Raw/PII drops ────────────────────────────────────────────────────
-    drop_cols = [
-        "Unnamed: 0","trans_date_trans_time","dob","first","last","street",
-        "city","state","zip","trans_num","unix_time","cc_num","city_pop",
-        "is_fraud","merchant","job"
-    ]
-    df["label"] = df["is_fraud"]
-    df = df.drop(columns=[c for c in drop_cols if c in df.columns])
+    if "is_fraud" in df.columns:               # unlabelled rows: bulk scoring
+        df["label"] = df["is_fraud"]
+    return df.drop(columns=[c for c in DROP_COLS if c in df.columns])
+
+
+def featurize(raw_csv: Path, out_parquet: Path, top_merchants: int = 50) -> int:
+    """Write the training Parquet and its vocabulary; return the row count."""
+    if raw_csv.is_dir():
+        # data_version passes through untouched; train.py uses it to find
+        # the rows that are new since the Production model
+        df = read_merged(raw_csv, columns=FEATURE_COLUMNS, with_version=True)
+    else:
+        df = read_raw(raw_csv, columns=FEATURE_COLUMNS)
+
+    vocab = {"top_merchants": top_merchants_of(df["merchant"], top_merchants)
+             if "merchant" in df.columns else []}
+    if set(INPUT_COLS) <= set(df.columns):
+        df[VELOCITY_COLS] = velocity_features(df)
+    if "trans_num" in df.columns:
+        df[SPLIT_COL] = split_bucket(df["trans_num"])
+    df = transform(df, vocab)
 
     # ── One-hot encode remaining categoricals ────────────────────────────
-    cat_cols = [c for c in
-                ["merchant_grouped","category","gender","job_grouped",
-                 "region"]
-                if c in df.columns]
+    cat_cols = [c for c in CAT_COLS if c in df.columns]
     if cat_cols:
         df = pd.get_dummies(df, columns=cat_cols, drop_first=True)
 
     # ── Save ──────────────────────────────────────────────────────────────
     out_parquet.parent.mkdir(exist_ok=True, parents=True)
     df.to_parquet(out_parquet, index=False)
+    vocab_path(out_parquet).write_text(json.dumps(vocab, indent=2))
     print(
         f"Featurization complete: {df.shape[0]:,} rows, "
         f"{len(df.columns):,} columns – saved → {out_parquet}"
     )
+    return len(df)
 
 
 # ---------------------------------------------------------------------------
@@ -151,8 +200,15 @@ if __name__ == "__main__":
         description="Clean & encode raw transactions for fraud-model training"
     )
     ap.add_argument("input_csv",  type=Path,
-                    help="Raw CSV path (e.g. data/raw/latest.csv)")
+                    help="Raw CSV path or merged store directory "
+                         "(e.g. data/raw/latest.csv, data/merged)")
     ap.add_argument("output_parquet", type=Path,
                     help="Destination Parquet path")
+    ap.add_argument("--version", default="latest",
+                    help="Data version label for the stage metrics")
     args = ap.parse_args()
-    featurize(args.input_csv, args.output_parquet, TOP_MERCHANTS)
+    with StageMetrics("featurize", args.version) as stage:
+        stage.read(args.input_csv)
+        stage.rows_in = stage.rows_out = featurize(
+            args.input_csv, args.output_parquet, TOP_MERCHANTS)
+        stage.wrote(args.output_parquet, vocab_path(args.output_parquet))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+ingest.py – stream a transactions drop into the next ``raw/vN/`` folder.
+
+The source (an http(s) URL, a ``file://`` URL or a plain path) is copied to
+``raw/.incoming/<name>.part`` in fixed-size chunks, hashing as it goes, so
+memory stays at one chunk whatever the file size.  An interrupted download
+resumes from the partial file: HTTP sources get a ``Range`` request guarded
+by ``If-Range`` (a changed remote file restarts from zero), local sources
+are simply seeked.  A partial file that already holds the whole remote file
+gets a 416 for its ``Range``; with an unchanged validator (or a
+``Content-Range`` total equal to its size) it is complete and goes straight
+to hashing and dedup, otherwise it is fetched again from zero.
+
+A completed drop whose SHA-256 matches an earlier one is discarded.
+Otherwise it is moved into a staging ``vN`` folder together with an
+``ingest.json`` manifest, and the folder is renamed into ``raw/`` in one
+step, so the drift DAG never sees a half-written version.  Every accepted
+drop is also appended to ``raw/ingest_manifest.json``.
+
+Usage
+-----
+python ingest.py "$DATA_URL" data/raw
+python ingest.py /tmp/drop.csv data/raw          # local file
+python -m http.server -d /tmp 8000 &             # local HTTP stand-in
+python ingest.py http://localhost:8000/drop.csv data/raw
+"""
+from __future__ import annotations
+
+import argparse, hashlib, json, os, shutil, time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+
+from merged_store import list_versions, version_csv, version_key
+from raw_io import HASH_CHUNK, manifest_path
+
+INCOMING = ".incoming"
+MANIFEST = "ingest_manifest.json"
+VERSION_MANIFEST = "ingest.json"
+TIMEOUT = 60
+
+
+# ---------------------------------------------------------------------------
+def _local(source: str) -> Path | None:
+    parsed = urlparse(source)
+    if parsed.scheme in ("", "file"):
+        return Path(parsed.path if parsed.scheme else source)
+    return None
+
+
+def _hash_existing(part: Path, h) -> int:
+    """Feed a partial download into ``h``; return its line count."""
+    lines = 0
+    with open(part, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            h.update(chunk)
+            lines += chunk.count(b"\n")
+    return lines
+
+
+def _complete(resp: requests.Response, offset: int, validator: str) -> bool:
+    """Whether a 416 to ``Range: bytes=<offset>-`` means we already have it all."""
+    if (resp.headers.get("ETag") or resp.headers.get("Last-Modified")) == validator:
+        return True
+    total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+    return total.isdigit() and int(total) == offset
+
+
+def _stream(source: str, part: Path, state: dict) -> dict:
+    """Append ``source`` to ``part`` from its current size; return stats."""
+    h = hashlib.sha256()
+    offset = part.stat().st_size if part.exists() else 0
+    lines = _hash_existing(part, h) if offset else 0
+
+    if (path := _local(source)) is not None:
+        src = open(path, "rb")
+        src.seek(offset)
+        chunks = iter(lambda: src.read(HASH_CHUNK), b"")
+        validator = f"{path.stat().st_size}-{path.stat().st_mtime_ns}"
+        if offset and state.get("validator") != validator:
+            src.seek(0)
+            offset, lines, h = 0, 0, hashlib.sha256()
+    else:
+        headers = {}
+        if offset and state.get("validator"):
+            headers = {"Range": f"bytes={offset}-", "If-Range": state["validator"]}
+        resp = requests.get(source, stream=True, timeout=TIMEOUT, headers=headers)
+        if resp.status_code == 416 and headers:
+            resp.close()
+            if _complete(resp, offset, state["validator"]):
+                return {"sha256": h.hexdigest(), "bytes": offset,
+                        "resumed_from": offset, "lines": lines}
+            resp = requests.get(source, stream=True, timeout=TIMEOUT)
+        resp.raise_for_status()
+        if resp.status_code != 206:        # no resume: server sent it all
+            offset, lines, h = 0, 0, hashlib.sha256()
+        validator = resp.headers.get("ETag") or resp.headers.get("Last-Modified")
+        chunks = resp.iter_content(HASH_CHUNK)
+        src = resp
+
+    state["validator"] = validator
+    part.with_suffix(".json").write_text(json.dumps(state))
+    try:
+        with open(part, "r+b" if offset else "wb") as out:
+            out.seek(offset)
+            out.truncate()
+            for chunk in chunks:
+                out.write(chunk)
+                h.update(chunk)
+                lines += chunk.count(b"\n")
+    finally:
+        src.close()
+    return {"sha256": h.hexdigest(), "bytes": part.stat().st_size,
+            "resumed_from": offset, "lines": lines}
+
+
+def known_checksums(raw_dir: Path) -> dict[str, str]:
+    """sha256 → version for every drop already in ``raw_dir``."""
+    known = {}
+    if (path := raw_dir / MANIFEST).exists():
+        known.update({d["sha256"]: d["version"] for d in json.loads(path.read_text())})
+    for v in list_versions(raw_dir):
+        # hand-placed versions have no ingest.json, but may have a columnar
+        # manifest holding the same CSV checksum
+        for meta in (raw_dir / v / VERSION_MANIFEST,
+                     manifest_path(version_csv(raw_dir, v))):
+            if meta.exists():
+                known[json.loads(meta.read_text())["sha256"]] = v
+    return known
+
+
+def _record(raw_dir: Path, entry: dict) -> None:
+    path = raw_dir / MANIFEST
+    drops = json.loads(path.read_text()) if path.exists() else []
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(drops + [entry], indent=2))
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------------------------
+def ingest(source: str, raw_dir: str | Path, name: str | None = None) -> dict:
+    """Fetch ``source`` into the next version folder unless already seen.
+
+    Returns the manifest entry; ``entry["version"]`` is None for a
+    duplicate drop.
+    """
+    raw_dir = Path(raw_dir)
+    incoming = raw_dir / INCOMING
+    incoming.mkdir(parents=True, exist_ok=True)
+    name = name or hashlib.sha1(source.encode()).hexdigest()[:12]
+    part = incoming / f"{name}.part"
+    state_path = part.with_suffix(".json")
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+    state["source"] = source
+
+    t0 = time.perf_counter()
+    stats = _stream(source, part, state)
+    entry = {"source": source, **stats, "seconds": round(time.perf_counter() - t0, 3),
+             "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+
+    if (seen := known_checksums(raw_dir).get(stats["sha256"])) is not None:
+        part.unlink()
+        state_path.unlink(missing_ok=True)
+        return {**entry, "version": None, "duplicate_of": seen}
+
+    versions = list_versions(raw_dir)
+    version = f"v{version_key(versions[-1]) + 1}" if versions else "v1"
+    staging = incoming / version
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir()
+    os.replace(part, staging / version_csv(raw_dir, version).name)
+    entry = {**entry, "version": version}
+    (staging / VERSION_MANIFEST).write_text(json.dumps(entry, indent=2))
+    os.replace(staging, raw_dir / version)      # the version appears atomically
+    state_path.unlink(missing_ok=True)
+    _record(raw_dir, entry)
+    return entry
+
+
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        description="Stream a raw drop into the next version folder"
+    )
+    ap.add_argument("source", help="http(s) URL, file:// URL or local path")
+    ap.add_argument("raw_dir", type=Path, help="Raw folder holding v1/ … vN/")
+    ap.add_argument("--name", help="Partial-download name (default: from source)")
+    args = ap.parse_args()
+    entry = ingest(args.source, args.raw_dir, args.name)
+    if entry["version"] is None:
+        print(f"Duplicate of {entry['duplicate_of']} – skipped "
+              f"({entry['bytes'] / 2**20:.1f} MiB, sha256 {entry['sha256'][:12]})")
+    else:
+        print(f"{entry['version']}: {entry['bytes'] / 2**20:.1f} MiB, "
+              f"~{max(entry['lines'] - 1, 0):,} rows in {entry['seconds']:.2f}s "
+              f"(resumed from byte {entry['resumed_from']:,})")
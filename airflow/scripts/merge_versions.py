@@ -1,11 +1,21 @@
-import pandas as pd, sys, glob, pathlib
+import sys, pathlib
+
+from merged_store import append_versions, version_csv
+from stage_metrics import StageMetrics
 
 
 if __name__ == "__main__":
     raw_dir   = pathlib.Path("/opt/airflow/data/raw")
-    baseline  = raw_dir / "v1" / "baseline.csv"
-    new_csv   = raw_dir / sys.argv[1] / "latest.csv"     # argv[1] = v2, v3 …
-    df = pd.concat([pd.read_csv(baseline), pd.read_csv(new_csv)]).drop_duplicates()
-    out = pathlib.Path("/opt/airflow/data/merged/current.csv")
-    out.parent.mkdir(exist_ok=True, parents=True)
-    df.to_csv(out, index=False)
+    store     = pathlib.Path("/opt/airflow/data/merged")
+    # argv[1] = v2, v3 … – every unmerged version up to it is appended
+    with StageMetrics("merge", sys.argv[1]) as stage:
+        for part in append_versions(store, raw_dir, upto=sys.argv[1]):
+            stage.read(version_csv(raw_dir, part["version"]))
+            stage.rows_in += part["rows"] + part["duplicates"]
+            stage.rows_out += part["rows"]
+            stage.bytes_written += part["bytes_written"]
+            print(
+                f"{part['version']}: +{part['rows']:,} rows "
+                f"({part['duplicates']:,} dupes) in {part['seconds']:.2f}s, "
+                f"{part['bytes_written'] / 2**20:.1f} MiB written"
+            )
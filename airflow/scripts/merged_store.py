@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+merged_store.py – append-only, version-partitioned merged dataset.
+
+Instead of concatenating baseline + newest drop and rewriting one big
+``current.csv``, every raw version becomes its own Arrow partition.  Rows
+are deduplicated on ``trans_num`` against a persistent index: one sorted
+array of 64-bit key hashes per partition, memory-mapped and binary-searched
+on merge.  Appending a version therefore reads only the new CSV and writes
+only the new partition, its key file and the manifest.
+
+Layout
+------
+merged/
+├─ manifest.json      partitions in merge order (rows, dupes, bytes written)
+├─ v1.arrow           one Arrow IPC partition per raw version
+├─ v1.keys.npy        sorted uint64 hashes of that partition's trans_num
+└─ …
+
+Usage
+-----
+python merged_store.py data/merged data/raw [--upto v5]
+"""
+from __future__ import annotations
+
+import argparse, json, os, re, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from raw_io import read_raw
+
+KEY = "trans_num"
+MANIFEST = "manifest.json"
+VERSION_COL = "data_version"
+
+
+# ---------------------------------------------------------------------------
+def version_key(version: str) -> int:
+    """Natural order for version folders: 'v10' sorts after 'v2'."""
+    return int(version.lstrip("v"))
+
+
+def list_versions(raw_dir: Path) -> list[str]:
+    """Version folders under ``raw_dir`` (``v1`` … ``vN``), naturally sorted."""
+    return sorted(
+        (p.name for p in Path(raw_dir).iterdir()
+         if p.is_dir() and re.fullmatch(r"v\d+", p.name)),
+        key=version_key,
+    )
+
+
+def version_csv(raw_dir: Path, version: str) -> Path:
+    """v1 ships ``baseline.csv``; every later drop ships ``latest.csv``."""
+    name = "baseline.csv" if version == "v1" else "latest.csv"
+    return Path(raw_dir) / version / name
+
+
+def hash_keys(keys: pd.Series) -> np.ndarray:
+    return pd.util.hash_pandas_object(
+        keys.astype("string"), index=False
+    ).to_numpy()
+
+
+def load_manifest(store: Path) -> dict:
+    path = Path(store) / MANIFEST
+    if path.exists():
+        return json.loads(path.read_text())
+    return {"key": KEY, "partitions": []}
+
+
+def _write_manifest(store: Path, manifest: dict) -> None:
+    tmp = Path(store) / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, Path(store) / MANIFEST)
+
+
+def _int32_indices(table: pa.Table) -> pa.Table:
+    """Dictionary columns re-indexed as int32, so partitions concatenate.
+
+    pandas gives each file the narrowest index type for its own levels
+    (int8 up to 127 categories, int16 beyond), and ``concat_tables`` refuses
+    to mix them.
+    """
+    for i, field in enumerate(table.schema):
+        t = field.type
+        if not pa.types.is_dictionary(t) or t.index_type == pa.int32():
+            continue
+        wide = pa.dictionary(pa.int32(), t.value_type, t.ordered)
+        column = pa.chunked_array(
+            [pa.DictionaryArray.from_arrays(c.indices.cast(pa.int32()), c.dictionary,
+                                            ordered=t.ordered)
+             for c in table.column(i).chunks], type=wide)
+        table = table.set_column(i, field.with_type(wide), column)
+    return table
+
+
+def _seen(store: Path, manifest: dict, hashes: np.ndarray) -> np.ndarray:
+    """Boolean mask: which ``hashes`` already exist in an earlier partition."""
+    seen = np.zeros(len(hashes), dtype=bool)
+    for part in manifest["partitions"]:
+        keys = np.load(Path(store) / part["keys"], mmap_mode="r")
+        if not len(keys):
+            continue
+        pos = np.minimum(np.searchsorted(keys, hashes), len(keys) - 1)
+        seen |= keys[pos] == hashes
+    return seen
+
+
+# ---------------------------------------------------------------------------
+def append_version(store: Path, raw_dir: Path, version: str) -> dict:
+    """Dedup one raw version against the store and write it as a partition."""
+    store = Path(store)
+    store.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(store)
+    if any(p["version"] == version for p in manifest["partitions"]):
+        raise ValueError(f"{version} is already merged into {store}")
+
+    t0 = time.perf_counter()
+    df = read_raw(version_csv(raw_dir, version))
+    rows_in = len(df)
+
+    hashes = hash_keys(df[KEY])
+    keep = np.zeros(rows_in, dtype=bool)
+    keep[np.unique(hashes, return_index=True)[1]] = True   # within version
+    keep &= ~_seen(store, manifest, hashes)                 # across versions
+    df, hashes = df[keep].reset_index(drop=True), hashes[keep]
+
+    arrow = store / f"{version}.arrow"
+    keys = store / f"{version}.keys.npy"
+    table = _int32_indices(pa.Table.from_pandas(df, preserve_index=False))
+    feather.write_feather(table, arrow.with_suffix(".tmp"), compression="uncompressed")
+    os.replace(arrow.with_suffix(".tmp"), arrow)
+    np.save(keys, np.sort(hashes))
+
+    entry = {
+        "version": version,
+        "file": arrow.name,
+        "keys": keys.name,
+        "rows": len(df),
+        "duplicates": rows_in - len(df),
+        "bytes_written": arrow.stat().st_size + keys.stat().st_size,
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    manifest["partitions"].append(entry)
+    _write_manifest(store, manifest)
+    return entry
+
+
+def append_versions(store: Path, raw_dir: Path, upto: str | None = None) -> list[dict]:
+    """Append every raw version (natural order, ≤ ``upto``) not yet merged."""
+    merged = {p["version"] for p in load_manifest(store)["partitions"]}
+    versions = [v for v in list_versions(raw_dir)
+                if version_csv(raw_dir, v).exists()]
+    if upto is not None:
+        versions = [v for v in versions if version_key(v) <= version_key(upto)]
+    return [append_version(store, raw_dir, v) for v in versions if v not in merged]
+
+
+def read_merged(
+    store: Path,
+    columns: list[str] | None = None,
+    with_version: bool = False,
+) -> pd.DataFrame:
+    """Concatenate all partitions (memory-mapped, column-projected).
+
+    ``with_version`` adds a categorical ``data_version`` column naming the
+    partition each row came from.
+    """
+    store = Path(store)
+    tables = []
+    for part in load_manifest(store)["partitions"]:
+        table = feather.read_table(store / part["file"], memory_map=True)
+        if columns is not None:
+            table = table.select([c for c in table.schema.names if c in columns])
+        table = _int32_indices(table)     # partitions written before may hold int8
+        if with_version:
+            table = table.append_column(VERSION_COL, pa.DictionaryArray.from_arrays(
+                pa.array(np.zeros(table.num_rows, dtype=np.int32)),
+                pa.array([part["version"]]),
+            ))
+        tables.append(table)
+    if not tables:
+        raise FileNotFoundError(f"no partitions in {store}")
+    # categoricals carry per-partition dictionaries; unify before pandas
+    return pa.concat_tables(tables).unify_dictionaries().to_pandas()
+
+
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        description="Append unseen raw versions to the merged store"
+    )
+    ap.add_argument("store", type=Path, help="Merged store directory")
+    ap.add_argument("raw_dir", type=Path, help="Raw folder holding v1/ … vN/")
+    ap.add_argument("--upto", help="Last version to merge (default: all)")
+    args = ap.parse_args()
+    for part in append_versions(args.store, args.raw_dir, args.upto):
+        print(
+            f"{part['version']}: +{part['rows']:,} rows "
+            f"({part['duplicates']:,} dupes) in {part['seconds']:.2f}s, "
+            f"{part['bytes_written'] / 2**20:.1f} MiB written"
+        )
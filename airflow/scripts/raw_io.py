@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+raw_io.py – one typed, column-pruned loader for raw transaction CSVs.
+
+Every pipeline step (drift check, merge, featurize, train's drift report,
+the splitter) reads the same raw schema.  Declaring it once here lets
+pandas skip type inference, store low-cardinality strings as categoricals,
+parse the two date columns with a fixed format and – via ``columns=`` –
+never materialise the PII columns a caller would drop straight away.
+
+Each raw CSV can also be converted once into an uncompressed Arrow IPC
+(Feather v2) file next to it, with a JSON manifest holding the CSV's
+checksum and per-column stats.  ``read_raw`` transparently memory-maps that
+copy while the checksum still matches, so repeated drift checks and merges
+skip CSV parsing entirely.
+
+Usage
+-----
+from raw_io import read_raw, FEATURE_COLUMNS
+df = read_raw("data/raw/v2/latest.csv", columns=FEATURE_COLUMNS)
+
+python raw_io.py data/raw/v2          # convert every CSV in a version
+"""
+from __future__ import annotations
+
+import argparse, hashlib, json, os
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+try:                                   # ~3-5x faster multi-threaded parser
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    CSV_ENGINE = "pyarrow"
+except ImportError:                    # pragma: no cover – slim images
+    pa = feather = None
+    CSV_ENGINE = "c"
+
+COLUMNAR_SUFFIX = ".arrow"
+HASH_CHUNK = 1 << 20
+CHUNK_ROWS = 100_000
+
+# ---------------------------------------------------------------------------
+# 1. • declared raw schema •
+# ---------------------------------------------------------------------------
+RAW_DTYPES: dict[str, str] = {
+    "Unnamed: 0": "int64",
+    "cc_num":     "int64",
+    "merchant":   "category",          # ~700 distinct values
+    "category":   "category",          # 14
+    "amt":        "float64",
+    "first":      "string",
+    "last":       "string",
+    "gender":     "category",          # 2
+    "street":     "string",
+    "city":       "string",
+    "state":      "category",          # 51
+    "zip":        "int32",
+    "lat":        "float64",
+    "long":       "float64",
+    "city_pop":   "int32",
+    "job":        "category",          # ~500
+    "trans_num":  "string",
+    "unix_time":  "int64",
+    "merch_lat":  "float64",
+    "merch_long": "float64",
+    "is_fraud":   "uint8",
+}
+
+DATE_FORMATS: dict[str, str] = {
+    "trans_date_trans_time": "%Y-%m-%d %H:%M:%S",
+    "dob":                   "%Y-%m-%d",
+}
+
+RAW_COLUMNS = [
+    "Unnamed: 0", "trans_date_trans_time", "cc_num", "merchant", "category",
+    "amt", "first", "last", "gender", "street", "city", "state", "zip",
+    "lat", "long", "city_pop", "job", "dob", "trans_num", "unix_time",
+    "merch_lat", "merch_long", "is_fraud",
+]
+
+PII_COLUMNS = ["first", "last", "street", "city", "zip", "cc_num", "dob"]
+
+# ---------------------------------------------------------------------------
+# 2. • column projections used by the pipeline •
+# ---------------------------------------------------------------------------
+# Everything featurize.py turns into a model input (plus the label).
+# cc_num and unix_time only key and order the velocity features; trans_num
+# only keys the train/val/test split.
+FEATURE_COLUMNS = [
+    "trans_date_trans_time", "dob", "merchant", "category", "amt",
+    "gender", "state", "lat", "long", "job", "merch_lat", "merch_long",
+    "cc_num", "unix_time", "trans_num", "is_fraud",
+]
+
+# Columns the drift test compares: every raw column but the PII and the
+# row ids and timestamps, which drift by construction between drops and
+# would make every version "drifted".  Derived, so a new raw column is
+# tested unless it is excluded here on purpose.
+DRIFT_EXCLUDED = ["Unnamed: 0", "trans_date_trans_time", "trans_num", "unix_time"]
+DRIFT_COLUMNS = [c for c in RAW_COLUMNS
+                 if c not in PII_COLUMNS and c not in DRIFT_EXCLUDED]
+
+
+# ---------------------------------------------------------------------------
+# 3. • columnar cache •
+# ---------------------------------------------------------------------------
+def columnar_path(csv: str | Path) -> Path:
+    return Path(csv).with_suffix(COLUMNAR_SUFFIX)
+
+
+def manifest_path(csv: str | Path) -> Path:
+    return Path(csv).with_suffix(COLUMNAR_SUFFIX + ".json")
+
+
+def sha256sum(path: str | Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def column_stats(df: pd.DataFrame) -> dict[str, dict]:
+    """Per-column dtype, null count and min/max (numeric, dates) or cardinality."""
+    stats = {}
+    for col in df.columns:
+        s = df[col]
+        entry = {"dtype": str(s.dtype), "nulls": int(s.isna().sum())}
+        if isinstance(s.dtype, pd.CategoricalDtype) or s.dtype == "string":
+            entry["distinct"] = int(s.nunique())
+        elif pd.api.types.is_numeric_dtype(s) or pd.api.types.is_datetime64_any_dtype(s):
+            entry["min"], entry["max"] = str(s.min()), str(s.max())
+        stats[col] = entry
+    return stats
+
+
+def fingerprint(path: str | Path) -> dict:
+    st = Path(path).stat()
+    return {"sha256": sha256sum(path), "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns}
+
+
+def unchanged(path: str | Path, meta: dict) -> bool:
+    """True if ``path`` still matches a ``fingerprint`` taken earlier.
+
+    Size + mtime is the fast path; when only the mtime moved (a copy, a
+    ``touch``) the checksum decides.
+    """
+    st = Path(path).stat()
+    if (st.st_size, st.st_mtime_ns) == (meta["size"], meta["mtime_ns"]):
+        return True
+    return st.st_size == meta["size"] and sha256sum(path) == meta["sha256"]
+
+
+def cached(csv: str | Path) -> Path | None:
+    """Return the columnar copy of ``csv`` if it is still valid, else None."""
+    csv = Path(csv)
+    arrow, man = columnar_path(csv), manifest_path(csv)
+    if feather is None or not (arrow.exists() and man.exists()):
+        return None
+    meta = json.loads(man.read_text())
+    if not unchanged(csv, meta):
+        return None
+    if (mtime := csv.stat().st_mtime_ns) != meta["mtime_ns"]:
+        meta["mtime_ns"] = mtime
+        man.write_text(json.dumps(meta, indent=2))
+    return arrow
+
+
+def columnarize(csv: str | Path, force: bool = False) -> Path:
+    """Convert ``csv`` to its Arrow copy + manifest unless a valid one exists."""
+    if feather is None:
+        raise RuntimeError("pyarrow is required for the columnar cache")
+    csv = Path(csv)
+    if not force and (arrow := cached(csv)) is not None:
+        return arrow
+
+    source = fingerprint(csv)
+    df = _read_csv(csv, None, True, None)
+    arrow, man = columnar_path(csv), manifest_path(csv)
+    tmp = arrow.with_suffix(f".{os.getpid()}.tmp")   # safe for parallel tasks
+    # uncompressed keeps the file memory-mappable without a decode step
+    feather.write_feather(df, tmp, compression="uncompressed")
+    os.replace(tmp, arrow)
+    man.write_text(json.dumps({
+        "source": csv.name,
+        **source,
+        "rows": len(df),
+        "columns": column_stats(df),
+    }, indent=2))
+    return arrow
+
+
+# ---------------------------------------------------------------------------
+def header(path: str | Path) -> list[str]:
+    """Return the column names of a raw CSV without reading any rows."""
+    if (arrow := cached(path)) is not None:
+        return feather.read_table(arrow, memory_map=True).schema.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _project(present: list[str], columns: list[str] | None) -> list[str]:
+    return present if columns is None else [c for c in present if c in columns]
+
+
+def _read_columnar(arrow: Path, columns, parse_dates: bool) -> pd.DataFrame:
+    table = feather.read_table(arrow, memory_map=True)
+    df = table.select(_project(table.schema.names, columns)).to_pandas()
+    if not parse_dates:
+        for col, fmt in DATE_FORMATS.items():
+            if col in df.columns:
+                df[col] = df[col].dt.strftime(fmt).astype("string")
+    return df
+
+
+def read_raw(
+    path: str | Path,
+    columns: list[str] | None = None,
+    parse_dates: bool = True,
+    engine: str | None = None,
+) -> pd.DataFrame:
+    """Read a raw transactions CSV with the declared schema.
+
+    ``columns`` projects the read; names missing from the file are ignored
+    so callers can keep their ``if c in df.columns`` guards.  With
+    ``parse_dates=False`` the date columns stay as strings, which keeps a
+    read → write round-trip byte-identical.  A valid columnar copy is used
+    instead of the CSV unless ``engine`` forces a CSV parser.
+    """
+    if engine is None and (arrow := cached(path)) is not None:
+        return _read_columnar(arrow, columns, parse_dates)
+    return _read_csv(path, columns, parse_dates, engine)
+
+
+def iter_raw(
+    path: str | Path,
+    columns: list[str] | None = None,
+    chunksize: int = CHUNK_ROWS,
+    start: int = 0,
+    stop: int | None = None,
+    engine: str | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Yield typed ``read_raw`` frames of at most ``chunksize`` rows.
+
+    Uses the Arrow copy's record batches when it is valid (no parsing, only
+    the touched pages are mapped in); otherwise streams the CSV with the
+    C parser, the only pandas engine that supports ``chunksize``.
+    ``start``/``stop`` restrict the stream to a row range, so parallel
+    workers can each take one slice of a file; only the Arrow path skips
+    straight to ``start``.  As in ``read_raw``, ``engine`` forces the CSV.
+    """
+    if engine is None and (arrow := cached(path)) is not None:
+        reader = pa.ipc.open_file(pa.memory_map(str(arrow)))
+        usecols = _project(reader.schema.names, columns)
+        offset = 0
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            lo = max(start - offset, 0)
+            hi = batch.num_rows if stop is None else min(stop - offset, batch.num_rows)
+            offset += batch.num_rows
+            if hi <= lo:
+                if stop is not None and offset >= stop:
+                    return
+                continue
+            batch = batch.select(usecols)
+            for pos in range(lo, hi, chunksize):
+                yield batch.slice(pos, min(chunksize, hi - pos)).to_pandas()
+        return
+
+    usecols, dtype = _csv_schema(path, columns, True)
+    offset = 0
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtype,
+                             engine=engine or "c", chunksize=chunksize):
+        lo = max(start - offset, 0)
+        hi = len(chunk) if stop is None else min(stop - offset, len(chunk))
+        offset += len(chunk)
+        if hi > lo:
+            yield _parse_dates(chunk.iloc[lo:hi])
+        if stop is not None and offset >= stop:
+            return
+
+
+def _csv_schema(path, columns, parse_dates: bool):
+    present = list(pd.read_csv(path, nrows=0).columns)
+    usecols = _project(present, columns)
+    dtype = {c: RAW_DTYPES[c] for c in usecols if c in RAW_DTYPES}
+    if not parse_dates:
+        dtype.update({c: "string" for c in usecols if c in DATE_FORMATS})
+    return usecols, dtype
+
+
+def _parse_dates(df: pd.DataFrame) -> pd.DataFrame:
+    for col, fmt in DATE_FORMATS.items():
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format=fmt, cache=True)
+    return df
+
+
+def _read_csv(path, columns, parse_dates: bool, engine) -> pd.DataFrame:
+    usecols, dtype = _csv_schema(path, columns, parse_dates)
+    df = pd.read_csv(
+        path,
+        usecols=usecols,
+        dtype=dtype,
+        engine=engine or CSV_ENGINE,
+    )
+    return _parse_dates(df) if parse_dates else df
+
+
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        description="Build the columnar cache for raw CSVs"
+    )
+    ap.add_argument("paths", nargs="+", type=Path,
+                    help="CSV files or version folders (e.g. data/raw/v2)")
+    ap.add_argument("--force", action="store_true",
+                    help="Rebuild even if the checksum still matches")
+    args = ap.parse_args()
+    for p in args.paths:
+        for csv in (sorted(p.glob("*.csv")) if p.is_dir() else [p]):
+            print(f"{csv} → {columnarize(csv, args.force)}")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+sampling.py – constant-memory reservoir samples for the drift check.
+
+The drift report only ever looks at a few thousand rows, so loading a whole
+version to call ``.sample(n=…)`` wastes nearly all of the parse time and
+memory.  ``sample_raw`` streams a raw file in chunks instead and keeps a
+bottom-k reservoir: every row gets a uniform random key and only the ``n``
+smallest keys survive each chunk.  Memory stays at O(n + chunk), the result
+is a uniform sample without replacement, and a fixed seed makes it
+reproducible.
+
+With ``stratify="is_fraud"`` one reservoir is kept per label and the final
+sample is allocated proportionally to the label counts seen in the stream
+(at least one row per label, so rare fraud is never sampled away).
+
+Usage
+-----
+from sampling import sample_raw
+ref = sample_raw("data/raw/v1/baseline.csv", n=5000, columns=DRIFT_COLUMNS)
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from raw_io import CHUNK_ROWS, iter_raw
+
+SEED = 42
+SAMPLE_SIZE = int(os.getenv("DRIFT_SAMPLE_SIZE", 1000))
+_KEY = "__reservoir_key"
+
+
+# ---------------------------------------------------------------------------
+def reservoir_sample(
+    chunks: Iterable[pd.DataFrame],
+    n: int = SAMPLE_SIZE,
+    seed: int = SEED,
+    stratify: str | None = None,
+) -> pd.DataFrame:
+    """Uniform (optionally stratified) sample of ``n`` rows from a stream."""
+    rng = np.random.default_rng(seed)
+    kept: dict = {}
+    counts: dict = {}
+
+    for chunk in chunks:
+        chunk = chunk.assign(**{_KEY: rng.random(len(chunk))})
+        groups = (chunk.groupby(stratify, observed=True, sort=False)
+                  if stratify else [(None, chunk)])
+        for stratum, part in groups:
+            counts[stratum] = counts.get(stratum, 0) + len(part)
+            pool = part if stratum not in kept else pd.concat([kept[stratum], part])
+            kept[stratum] = pool.nsmallest(n, _KEY)
+
+    if not kept:
+        raise ValueError("cannot sample from an empty stream")
+
+    total = sum(counts.values())
+    quota = {s: min(c, max(1, round(n * c / total))) for s, c in counts.items()}
+    sample = pd.concat([kept[s].nsmallest(quota[s], _KEY) for s in kept])
+    return sample.sort_values(_KEY).drop(columns=_KEY).reset_index(drop=True)
+
+
+def sample_raw(
+    path: str | Path,
+    n: int = SAMPLE_SIZE,
+    columns: list[str] | None = None,
+    seed: int = SEED,
+    stratify: str | None = None,
+    chunksize: int = CHUNK_ROWS,
+    engine: str | None = None,
+) -> pd.DataFrame:
+    """Stream ``path`` through ``iter_raw`` and return a reservoir sample."""
+    if stratify and columns is not None and stratify not in columns:
+        columns = [*columns, stratify]
+    chunks = iter_raw(path, columns, chunksize, engine=engine)
+    return reservoir_sample(chunks, n, seed, stratify)
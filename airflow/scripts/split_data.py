@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+split_data.py – cut a raw transactions file into fake version drops, and
+replay a drop against the serving API.
+
+split
+    One streaming pass over the input (``iter_raw`` chunks) routes every
+    row to its part – by row count (``-n`` / ``--part-rows``) or by a
+    ``trans_date_trans_time`` period (``--by day|week|month``) – and appends
+    it to that part's Arrow spill file.  A process pool then finishes the
+    parts in parallel: optional in-part shuffle, then the final Arrow (or
+    CSV) file.  ``--shuffle`` is out-of-core: rows are first dealt to parts
+    by a random permutation of part labels (exact part sizes, 4 bytes per
+    row), then each part – a fraction of the input – is shuffled on its own.
+    ``--versions`` lays the parts out as ``v1/baseline.csv``,
+    ``v2/latest.csv`` … for the drift DAG – always CSV, the only form the
+    DAG picks up – and refuses a folder that already holds ``vN`` folders.
+
+replay
+    Featurizes a part into ``InputForm`` payloads with a training vocabulary
+    and POSTs them to ``/predict`` open-loop at a fixed rate; latency is
+    measured from each request's scheduled send time, so a slow server
+    cannot hide its queueing.
+
+Usage
+-----
+python split_data.py split dataset.csv parts/ -n 5 [--shuffle] [--workers 4]
+python split_data.py split dataset.csv data/raw -n 5 --versions
+python split_data.py split dataset.csv parts/ --by month
+python split_data.py replay parts/part-00003.arrow --url http://localhost:8000/predict \
+    --rate 50 --token "$JWT" [--vocab data/processed/train.vocab.json] [--limit 5000]
+"""
+from __future__ import annotations
+
+import argparse, json, math, re, shutil, sys, tempfile, threading, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import requests
+
+from featurize import CAT_COLS, transform
+from merged_store import list_versions, version_csv
+from raw_io import (CHUNK_ROWS, DATE_FORMATS, FEATURE_COLUMNS, cached,
+                    iter_raw, manifest_path)
+
+SEED = 42
+PERIODS = {"day": "D", "week": "W", "month": "M"}
+SPILL_SUFFIX = ".arrows"
+
+
+# ---------------------------------------------------------------------------
+# 1. • split •
+# ---------------------------------------------------------------------------
+def count_rows(path: Path) -> int:
+    """Data rows in a raw file: the columnar manifest, else a newline count."""
+    if cached(path) is not None:
+        return json.loads(manifest_path(path).read_text())["rows"]
+    lines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    return max(0, lines - 1 + (last != b"\n"))      # an unterminated last row counts
+
+
+def _plain(df: pd.DataFrame) -> pd.DataFrame:
+    """Categoricals → strings: per-chunk dictionaries would not append."""
+    cats = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    return df.astype({c: "string" for c in cats}) if cats else df
+
+
+def _finish(spill: str, out: str, fmt: str, shuffle: bool, seed: int) -> dict:
+    t0 = time.perf_counter()
+    with pa.memory_map(spill) as src:
+        table = pa.ipc.open_stream(src).read_all()
+    if shuffle:
+        table = table.take(np.random.default_rng(seed).permutation(table.num_rows))
+    Path(out).parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "arrow":
+        feather.write_feather(table, out, compression="uncompressed")
+    else:
+        df = table.to_pandas()
+        for col, date_fmt in DATE_FORMATS.items():   # byte-compatible dates
+            if col in df.columns:
+                df[col] = df[col].dt.strftime(date_fmt)
+        df.to_csv(out, index=False)
+    Path(spill).unlink()
+    return {"part": out, "rows": table.num_rows,
+            "mib": round(Path(out).stat().st_size / 2**20, 2),
+            "seconds": round(time.perf_counter() - t0, 3)}
+
+
+def split(
+    input_path: Path,
+    out_dir: Path,
+    num_parts: int | None = None,
+    part_rows: int | None = None,
+    by: str | None = None,
+    shuffle: bool = False,
+    fmt: str | None = None,
+    versions: bool = False,
+    workers: int | None = None,
+    seed: int = SEED,
+) -> list[dict]:
+    if sum(x is not None for x in (num_parts, part_rows, by)) != 1:
+        raise ValueError("choose exactly one of num_parts, part_rows, by")
+    rng = np.random.default_rng(seed)
+
+    labels = None
+    if num_parts is not None:
+        total = count_rows(input_path)
+        part_rows = math.ceil(total / num_parts)
+        if shuffle:                    # exact sizes, random membership
+            sizes = [min(part_rows, total - i * part_rows) for i in range(num_parts)]
+            labels = rng.permutation(np.repeat(np.arange(num_parts, dtype=np.uint32),
+                                               sizes))
+    elif part_rows is not None and shuffle:
+        raise ValueError("--shuffle with --part-rows needs -n (the row total)")
+    if versions:
+        if fmt not in (None, "csv"):
+            raise ValueError("--versions writes CSV: the DAG reads vN/*.csv only")
+        if out_dir.exists() and (existing := list_versions(out_dir)):
+            raise FileExistsError(f"{out_dir} already holds {', '.join(existing)}; "
+                                  "split into an empty folder")
+    fmt = fmt or ("csv" if versions else "arrow")
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    spill_dir = Path(tempfile.mkdtemp(prefix=".split-", dir=out_dir))
+    writers: dict[str, pa.ipc.RecordBatchStreamWriter] = {}
+    schema = None
+    offset = 0
+    try:
+        for chunk in iter_raw(input_path):
+            chunk = _plain(chunk)
+            if by is not None:
+                keys = chunk["trans_date_trans_time"].dt.to_period(PERIODS[by]).astype(str)
+                keys = keys.str.replace(r"/.*", "", regex=True).to_numpy()  # week spans
+            else:
+                pos = np.arange(offset, offset + len(chunk))
+                idx = labels[pos] if labels is not None else pos // part_rows
+                keys = np.char.zfill((idx + 1).astype(str), 5)
+            offset += len(chunk)
+            for key in pd.unique(keys):
+                batch = pa.RecordBatch.from_pandas(chunk[keys == key],
+                                                   schema=schema, preserve_index=False)
+                schema = schema or batch.schema
+                if key not in writers:
+                    writers[key] = pa.ipc.new_stream(spill_dir / f"{key}{SPILL_SUFFIX}",
+                                                     schema)
+                writers[key].write_batch(batch)
+        keys = sorted(writers)
+        while writers:
+            writers.popitem()[1].close()
+
+        suffix = ".csv" if fmt == "csv" else ".arrow"
+        if versions:
+            outs = [version_csv(out_dir, f"v{i}").with_suffix(suffix)
+                    for i in range(1, len(keys) + 1)]
+        else:
+            outs = [out_dir / f"part-{k}{suffix}" for k in keys]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_finish, str(spill_dir / f"{k}{SPILL_SUFFIX}"),
+                                   str(out), fmt, shuffle, seed + i)
+                       for i, (k, out) in enumerate(zip(keys, outs))]
+            return [f.result() for f in futures]
+    finally:
+        for w in writers.values():         # only left open on failure
+            w.close()
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# 2. • replay •
+# ---------------------------------------------------------------------------
+def iter_part(path: Path, chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Chunks of a split part (Arrow) or of any raw CSV."""
+    if path.suffix == ".arrow" and cached(path) is None:
+        with pa.memory_map(str(path)) as src:
+            reader = pa.ipc.open_file(src)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                for pos in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(pos, chunksize).to_pandas()
+        return
+    yield from iter_raw(path, FEATURE_COLUMNS, chunksize)
+
+
+def payloads(path: Path, vocab: dict, limit: int | None = None) -> Iterator[dict]:
+    """``InputForm`` dicts: the training features of each raw row."""
+    sent = 0
+    for chunk in iter_part(path):
+        df = transform(chunk, vocab).drop(columns="label")
+        # the backend keys its online velocity features on these
+        df[["cc_num", "unix_time"]] = chunk[["cc_num", "unix_time"]].to_numpy()
+        df = pd.get_dummies(df, columns=[c for c in CAT_COLS if c in df.columns])
+        df.columns = [re.sub(r"[^\w]", "_", c) for c in df.columns]
+        for record in df.to_dict("records"):
+            if limit is not None and sent >= limit:
+                return
+            sent += 1
+            yield record
+
+
+def replay(path: Path, url: str, rate: float, token: str, vocab: dict,
+           limit: int | None = None, concurrency: int = 64) -> dict:
+    """Open-loop replay at ``rate`` req/s; returns a JSON-able summary."""
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {token}"
+    lock = threading.Lock()
+    latencies, errors = [], {}
+
+    def send(payload: dict, scheduled: float) -> None:
+        try:
+            status = session.post(url, json=payload, timeout=30).status_code
+        except requests.RequestException as exc:
+            status = type(exc).__name__
+        elapsed = time.perf_counter() - scheduled
+        with lock:
+            if status == 200:
+                latencies.append(elapsed)
+            else:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    t0 = time.perf_counter()
+    n = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for n, payload in enumerate(payloads(path, vocab, limit), start=1):
+            scheduled = t0 + (n - 1) / rate
+            if (wait := scheduled - time.perf_counter()) > 0:
+                time.sleep(wait)
+            pool.submit(send, payload, scheduled)
+    wall = time.perf_counter() - t0
+    lat = np.array(latencies) * 1e3 if latencies else np.array([np.nan])
+    return {
+        "sent": n,
+        "ok": len(latencies),
+        "errors": errors,
+        "target_rps": rate,
+        "achieved_rps": round(n / wall, 2) if wall else 0.0,
+        "p50_ms": round(float(np.nanpercentile(lat, 50)), 2),
+        "p95_ms": round(float(np.nanpercentile(lat, 95)), 2),
+        "p99_ms": round(float(np.nanpercentile(lat, 99)), 2),
+    }
+
+
+def login(base_url: str, email: str, password: str) -> str:
+    resp = requests.post(f"{base_url}/auth/login",
+                         json={"email": email, "password": password}, timeout=10)
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sp = sub.add_parser("split", help="Split a raw file into parts")
+    sp.add_argument("input", type=Path, help="Raw transactions CSV")
+    sp.add_argument("out_dir", type=Path, help="Output folder")
+    how = sp.add_mutually_exclusive_group()
+    how.add_argument("-n", "--num_parts", type=int, help="Number of equal parts")
+    how.add_argument("--part-rows", type=int, help="Rows per part")
+    how.add_argument("--by", choices=sorted(PERIODS), help="One part per period")
+    sp.add_argument("--shuffle", action="store_true",
+                    help="Random part membership (-n) and row order")
+    sp.add_argument("--format", choices=["arrow", "csv"],
+                    help="Part format (default: arrow, csv with --versions)")
+    sp.add_argument("--versions", action="store_true",
+                    help="Write parts as v1/baseline.csv, v2/latest.csv, … for the DAG")
+    sp.add_argument("--workers", type=int, help="Parallel part writers")
+    sp.add_argument("--seed", type=int, default=SEED)
+
+    rp = sub.add_parser("replay", help="Send a part to /predict at a fixed rate")
+    rp.add_argument("part", type=Path, help="Split part (.arrow) or raw CSV")
+    rp.add_argument("--url", default="http://localhost:8000/predict")
+    rp.add_argument("--rate", type=float, default=20.0, help="Requests per second")
+    rp.add_argument("--limit", type=int, help="Stop after this many requests")
+    rp.add_argument("--concurrency", type=int, default=64)
+    rp.add_argument("--vocab", type=Path,
+                    default=Path("/opt/airflow/data/processed/train.vocab.json"),
+                    help="featurize vocabulary the served model was trained with")
+    auth = rp.add_mutually_exclusive_group(required=True)
+    auth.add_argument("--token", help="Bearer JWT")
+    auth.add_argument("--email", help="Log in with this account (needs --password)")
+    rp.add_argument("--password")
+    args = ap.parse_args()
+
+    if args.cmd == "split":
+        if not (args.num_parts or args.part_rows or args.by):
+            args.num_parts = 5
+        if args.num_parts is not None and args.num_parts < 1:
+            print("Error: num_parts must be >= 1", file=sys.stderr)
+            sys.exit(1)
+        try:
+            parts = split(args.input, args.out_dir, args.num_parts, args.part_rows,
+                          args.by, args.shuffle, args.format, args.versions,
+                          args.workers, args.seed)
+        except (ValueError, FileExistsError) as err:
+            print(f"Error: {err}", file=sys.stderr)
+            sys.exit(1)
+        for part in parts:
+            print(f"Wrote {part['rows']:,} rows to {part['part']} "
+                  f"({part['mib']} MiB, {part['seconds']:.2f}s)")
+    else:
+        token = args.token or login(args.url.rsplit("/", 1)[0], args.email, args.password)
+        vocab = json.loads(args.vocab.read_text())
+        print(json.dumps(replay(args.part, args.url, args.rate, token, vocab,
+                                args.limit, args.concurrency), indent=2))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+stage_cache.py – skip a pipeline stage whose inputs, code and parameters
+are unchanged since its last successful run.
+
+The stage command is wrapped:
+
+    python stage_cache.py featurize \
+        --in /opt/airflow/data/merged \
+        --out /opt/airflow/data/processed/train.parquet \
+        --code /opt/airflow/scripts/featurize.py --package pandas \
+        -- python /opt/airflow/scripts/featurize.py …
+
+The fingerprint is a SHA-256 over the stage name, the content checksum of
+every ``--in`` and ``--code`` file (directories and quoted globs expanded),
+the ``--param`` key=value pairs and the installed version of every
+``--package``.  When it equals the one in ``<STAGE_CACHE_DIR>/<stage>.json``
+and every recorded ``--out`` file still has its recorded checksum, the
+command is not run.  Otherwise it runs, and on exit code 0 the fingerprint
+and output checksums are recorded.
+
+With ``--version`` the stage's own pushed metrics (stage_metrics.py) are
+read back after a run and recorded too.  A skip then pushes the group for
+the new version itself – the recorded rows, the recorded input and output
+bytes and ``cached`` = 1 – so ``collect(version)`` sees every stage.
+
+Only the standard library (and, with ``--version``, the Pushgateway
+client) is imported here, so a skipped stage costs an interpreter start and
+the hashing; pandas, mlflow and evidently load only in the wrapped command.
+Checksums are reused while a file's size and mtime match the record, so
+unchanged multi-GB inputs are not re-read.
+
+``--force`` or ``STAGE_CACHE=off`` always runs the command.
+
+Usage
+-----
+python stage_cache.py STAGE [--in P]… [--out P]… [--code P]… \
+    [--param K=V]… [--package NAME]… [--version vN] [--force] -- COMMAND…
+"""
+from __future__ import annotations
+
+import argparse, glob, hashlib, json, os, subprocess, sys, time
+from importlib import metadata
+from pathlib import Path
+
+CACHE_DIR = Path(os.getenv("STAGE_CACHE_DIR", "/opt/airflow/data/stage_cache"))
+ENABLED = os.getenv("STAGE_CACHE", "on") != "off"
+HASH_CHUNK = 1 << 20
+SKIP_SUFFIXES = (".tmp", ".part")      # in-flight files never count
+
+
+# ---------------------------------------------------------------------------
+def expand(patterns: list[str]) -> list[Path]:
+    """Files named by paths, directories (recursively) and globs, sorted."""
+    files = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern) if any(c in pattern for c in "*?[") else [pattern]
+        for path in map(Path, matches):
+            if path.is_dir():
+                files.update(p for p in path.rglob("*")
+                             if p.is_file() and not p.name.endswith(SKIP_SUFFIXES))
+            else:
+                files.add(path)            # missing files are recorded as such
+    return sorted(files)
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def checksums(paths: list[Path], memo: dict) -> dict[str, dict | None]:
+    """path → {sha256, size, mtime_ns} (None if missing), reusing ``memo``."""
+    out = {}
+    for path in paths:
+        if not path.exists():
+            out[str(path)] = None
+            continue
+        st = path.stat()
+        old = memo.get(str(path))
+        if old and (old["size"], old["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            out[str(path)] = old
+        else:
+            out[str(path)] = {"sha256": _sha256(path), "size": st.st_size,
+                              "mtime_ns": st.st_mtime_ns}
+    return out
+
+
+def _content(entries: dict) -> dict:
+    return {p: e and e["sha256"] for p, e in entries.items()}
+
+
+def _version(package: str) -> str | None:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def fingerprint(stage: str, inputs: dict, code: dict, params: dict,
+                packages: list[str]) -> str:
+    spec = {"stage": stage, "inputs": _content(inputs), "code": _content(code),
+            "params": params, "packages": {p: _version(p) for p in packages}}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+def _bytes(entries: dict) -> int:
+    return sum(e["size"] for e in entries.values() if e)
+
+
+def pushed_rows(stage: str, version: str) -> dict | None:
+    """rows_in / rows_out the stage just pushed for ``version``, if readable."""
+    from stage_metrics import collect
+    try:
+        values = collect(version).get(stage)
+    except (OSError, ValueError, KeyError) as err:
+        print(f"{stage}: pushed metrics not readable ({err}) – not recorded")
+        return None
+    return values and {k: values[k] for k in ("rows_in", "rows_out") if k in values}
+
+
+def push_cached(stage: str, version: str, record: dict, in_sums: dict) -> None:
+    """Push a skipped stage's group under ``version`` from its record."""
+    from stage_metrics import StageMetrics
+    metrics = StageMetrics(stage, version)
+    rows = record.get("metrics") or {}
+    metrics.rows_in, metrics.rows_out = rows.get("rows_in", 0), rows.get("rows_out", 0)
+    metrics.bytes_read = _bytes(in_sums)
+    metrics.bytes_written = _bytes(record.get("outputs", {}))
+    metrics.cached = True
+    metrics.push()
+
+
+def _write(path: Path, record: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(record, indent=2))
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------------------------
+def run(stage: str, command: list[str], inputs=(), outputs=(), code=(),
+        params: dict | None = None, packages=(), force: bool = False,
+        cache_dir: Path = CACHE_DIR, version: str | None = None) -> int:
+    """Run ``command`` unless the stage is up to date; return its exit code."""
+    record_path = Path(cache_dir) / f"{stage}.json"
+    old = json.loads(record_path.read_text()) if record_path.exists() else {}
+    memo = {**old.get("inputs", {}), **old.get("code", {})}
+    in_sums = checksums(expand(list(inputs)), memo)
+    code_sums = checksums(expand(list(code)), memo)
+    params = params or {}
+    fp = fingerprint(stage, in_sums, code_sums, params, list(packages))
+
+    if ENABLED and not force and old.get("fingerprint") == fp:
+        out_now = checksums(expand(list(outputs)), old.get("outputs", {}))
+        if _content(out_now) == _content(old.get("outputs", {})):
+            print(f"{stage}: inputs, code and params unchanged since "
+                  f"{old['finished_at']} (fingerprint {fp[:12]}) – skipped")
+            if version:
+                push_cached(stage, version, old, in_sums)
+            return 0
+        print(f"{stage}: fingerprint matches but outputs changed – rerunning")
+
+    t0 = time.perf_counter()
+    rc = subprocess.call(command)
+    if rc == 0:
+        _write(record_path, {
+            "stage": stage, "fingerprint": fp, "params": params,
+            "inputs": in_sums, "code": code_sums,
+            "outputs": checksums(expand(list(outputs)), {}),
+            "seconds": round(time.perf_counter() - t0, 3),
+            "metrics": pushed_rows(stage, version) if version else None,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        })
+    return rc
+
+
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    if "--" not in argv:
+        sys.exit("usage: stage_cache.py STAGE [options] -- COMMAND…")
+    split = argv.index("--")
+    ap = argparse.ArgumentParser(description="Run a stage unless it is up to date")
+    ap.add_argument("stage")
+    ap.add_argument("--in", dest="inputs", action="append", default=[],
+                    help="Input file, directory or quoted glob (repeatable)")
+    ap.add_argument("--out", dest="outputs", action="append", default=[],
+                    help="Output file or directory the stage produces")
+    ap.add_argument("--code", action="append", default=[],
+                    help="Source or config file the result depends on")
+    ap.add_argument("--param", action="append", default=[], help="KEY=VALUE")
+    ap.add_argument("--package", action="append", default=[],
+                    help="Distribution whose installed version counts")
+    ap.add_argument("--version",
+                    help="Data version: record the stage's pushed metrics, "
+                         "push them again when skipped")
+    ap.add_argument("--force", action="store_true")
+    args = ap.parse_args(argv[:split])
+    sys.exit(run(args.stage, argv[split + 1:], args.inputs, args.outputs, args.code,
+                 dict(p.split("=", 1) for p in args.param), args.package, args.force,
+                 version=args.version))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+stage_metrics.py – duration, rows, bytes and peak memory of one pipeline
+stage, pushed to the Pushgateway under ``{stage, version}``.
+
+Each script wraps its work in ``StageMetrics`` and fills in the counts it
+already has; on exit the gauges are pushed as one group per stage and data
+version, with ``success`` 0 if the block raised.  A push failure only logs
+a warning – metrics never fail a stage.  ``collect`` reads every stage of
+one version back from the Pushgateway's JSON API, so the DAG's final task
+can aggregate without opening any data.
+
+Peak RSS is the process high-water mark, so it is the stage's own for the
+BashOperator scripts and includes the task runner for in-DAG tasks.
+
+Usage
+-----
+with StageMetrics("featurize", "v3") as stage:
+    stage.read(src)
+    stage.rows_in = stage.rows_out = featurize(src, out)
+    stage.wrote(out)
+
+collect("v3")   # {"featurize": {"duration_seconds": …, "rows_out": …}, …}
+"""
+from __future__ import annotations
+
+import logging, os, resource, time
+from pathlib import Path
+
+import requests
+from prometheus_client import CollectorRegistry, Gauge, pushadd_to_gateway
+
+PUSHGATEWAY = os.getenv("PUSHGATEWAY", "pushgateway:9091")
+JOB = "fraud_pipeline"
+PREFIX = "pipeline_stage_"
+METRICS = {
+    "duration_seconds": "Stage wall time",
+    "rows_in":          "Rows the stage read",
+    "rows_out":         "Rows the stage wrote",
+    "bytes_read":       "Bytes of input files",
+    "bytes_written":    "Bytes of output files",
+    "peak_rss_bytes":   "Peak resident memory of the stage's process",
+    "success":          "1 if the stage finished without error",
+    "cached":           "1 if stage_cache.py skipped the stage as up to date",
+}
+
+log = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+def path_bytes(path: str | Path) -> int:
+    """Size of a file, or of every file under a directory (0 if missing)."""
+    path = Path(path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size if path.exists() else 0
+
+
+def peak_rss_bytes() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024   # KiB on Linux
+
+
+class StageMetrics:
+    def __init__(self, stage: str, version: str, gateway: str = PUSHGATEWAY):
+        self.stage, self.version, self.gateway = stage, version, gateway
+        self.rows_in = self.rows_out = 0
+        self.bytes_read = self.bytes_written = 0
+        self.cached = False
+        self._t0 = time.perf_counter()
+
+    def read(self, *paths) -> None:
+        self.bytes_read += sum(path_bytes(p) for p in paths)
+
+    def wrote(self, *paths) -> None:
+        self.bytes_written += sum(path_bytes(p) for p in paths)
+
+    def values(self, success: bool = True) -> dict[str, float]:
+        return {
+            "duration_seconds": time.perf_counter() - self._t0,
+            "rows_in": self.rows_in, "rows_out": self.rows_out,
+            "bytes_read": self.bytes_read, "bytes_written": self.bytes_written,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "success": int(success),
+            "cached": int(self.cached),
+        }
+
+    def push(self, success: bool = True) -> None:
+        registry = CollectorRegistry()
+        for name, value in self.values(success).items():
+            Gauge(PREFIX + name, METRICS[name], registry=registry).set(value)
+        try:
+            pushadd_to_gateway(self.gateway, job=JOB, registry=registry,
+                               grouping_key={"stage": self.stage,
+                                             "version": self.version})
+        except OSError as err:
+            log.warning(f"stage metrics for {self.stage}/{self.version} "
+                        f"not pushed: {err}")
+
+    def __enter__(self) -> "StageMetrics":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.push(success=exc_type is None)
+        return False
+
+
+# ---------------------------------------------------------------------------
+def collect(version: str, gateway: str = PUSHGATEWAY) -> dict[str, dict[str, float]]:
+    """Every stage's last pushed values for ``version``, keyed by stage."""
+    url = gateway if "://" in gateway else f"http://{gateway}"
+    resp = requests.get(f"{url}/api/v1/metrics", timeout=10)
+    resp.raise_for_status()
+    stages = {}
+    for group in resp.json()["data"]:
+        labels = group["labels"]
+        if labels.get("job") != JOB or labels.get("version") != version:
+            continue
+        stages[labels["stage"]] = {
+            name: float(group[PREFIX + name]["metrics"][0]["value"])
+            for name in METRICS if PREFIX + name in group
+        }
+    return stages
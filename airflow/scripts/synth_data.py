@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+synth_data.py – synthetic raw transaction drops in the exact raw schema.
+
+Generates ``raw/v1/baseline.csv``, ``raw/v2/latest.csv`` … with the columns
+and formats ``raw_io`` declares, so every pipeline stage can be run at any
+size without the real dataset.  Rows are written in ``CHUNK_ROWS`` chunks,
+so 10M rows need no more memory than 100k.
+
+The generator keeps the structure the features depend on:
+
+* a fixed card population (cc_num → name, address, state, job, dob, home
+  coordinates), with a heavy-tailed number of transactions per card;
+* ~700 ``fraud_``-prefixed merchants with Zipf popularity, each in one of
+  the 14 categories; merchant coordinates near the card's home;
+* amounts log-normal per category; daytime-heavy hours;
+* ``is_fraud`` drawn from a logistic model of amount, night hours and
+  online categories (~0.6% positives).
+
+Each drop covers the next ``--days`` of time.  ``--drift d`` shifts version
+``k`` (0-based) by ``d·k``: amounts inflate, category mix tilts, more night
+traffic and a higher fraud rate – ``d = 0`` gives identically distributed
+versions, ``d ≈ 0.3`` trips the drift check.
+
+Usage
+-----
+python synth_data.py data/synth/raw --rows 1M --versions 3 [--drift 0.1] [--seed 0]
+"""
+from __future__ import annotations
+
+import argparse, json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from merged_store import version_csv
+from raw_io import CHUNK_ROWS, DATE_FORMATS, RAW_COLUMNS
+
+SPEC = "synth.json"
+START = pd.Timestamp("2019-01-01")
+ROWS_PER_CARD = 400
+N_MERCHANTS = 700
+N_JOBS = 500
+BASE_FRAUD_LOGIT = -6.2
+
+CATEGORIES = [
+    "entertainment", "food_dining", "gas_transport", "grocery_net",
+    "grocery_pos", "health_fitness", "home", "kids_pets", "misc_net",
+    "misc_pos", "personal_care", "shopping_net", "shopping_pos", "travel",
+]
+ONLINE = {"grocery_net", "misc_net", "shopping_net"}
+STATES = [
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "DC", "FL", "GA", "HI",
+    "ID", "IL", "IN", "IA", "KS", "KY", "LA", "ME", "MD", "MA", "MI", "MN",
+    "MS", "MO", "MT", "NE", "NV", "NH", "NJ", "NM", "NY", "NC", "ND", "OH",
+    "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT", "VA", "WA",
+    "WV", "WI", "WY",
+]
+JOB_NOUNS = [
+    "engineer", "developer", "architect", "scientist", "researcher",
+    "analyst", "teacher", "lecturer", "nurse", "doctor", "therapist",
+    "surgeon", "manager", "director", "officer", "administrator",
+    "consultant", "lawyer", "accountant", "trader", "designer", "editor",
+    "writer", "sales executive", "marketing executive", "technician",
+    "surveyor", "pilot", "chef", "librarian",
+]
+JOB_ADJ = [
+    "Chief", "Senior", "Junior", "Lead", "Clinical", "Civil", "Chemical",
+    "Software", "Financial", "Research", "Data", "Retail", "Field",
+    "Quality", "Production", "Environmental", "Mining", "Health", "Museum",
+    "Education", "Land", "Tax", "Media", "Water", "Energy",
+]
+SYLLABLES = ["ku", "hn", "ber", "gar", "schu", "mm", "cor", "mier", "kil",
+             "back", "hal", "vor", "son", "rei", "chel", "do", "lan", "ey"]
+SUFFIXES = ["LLC", "PLC", "Inc", "Ltd", "Group", "and Sons"]
+FIRST = ["James", "Mary", "John", "Linda", "Robert", "Susan", "Michael",
+         "Karen", "David", "Lisa", "Daniel", "Nancy", "Paul", "Sandra"]
+LAST = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller",
+        "Davis", "Lopez", "Wilson", "Moore", "Taylor", "Thomas", "White"]
+
+
+# ---------------------------------------------------------------------------
+def parse_rows(text: str) -> int:
+    """'100k', '1M', '2.5M', '10000' → int."""
+    text = text.strip().lower().replace("_", "")
+    scale = {"k": 10**3, "m": 10**6, "g": 10**9}.get(text[-1:], 1)
+    return int(float(text.rstrip("kmg")) * scale)
+
+
+def merchants(rng: np.random.Generator) -> pd.DataFrame:
+    names = set()
+    while len(names) < N_MERCHANTS:
+        stem = "".join(rng.choice(SYLLABLES, rng.integers(2, 4))).capitalize()
+        names.add(f"fraud_{stem} {rng.choice(SUFFIXES)}")
+    return pd.DataFrame({
+        "merchant": sorted(names),
+        "category": rng.choice(CATEGORIES, N_MERCHANTS),
+        "popularity": 1 / np.arange(1, N_MERCHANTS + 1) ** 0.8,   # Zipf
+    })
+
+
+def cards(n: int, rng: np.random.Generator) -> pd.DataFrame:
+    jobs = np.array(sorted({f"{a} {b}" for a in JOB_ADJ for b in JOB_NOUNS}))
+    jobs = rng.choice(jobs, min(N_JOBS, len(jobs)), replace=False)
+    dob = START - pd.to_timedelta(rng.integers(18 * 365, 90 * 365, n), unit="D")
+    return pd.DataFrame({
+        "cc_num": rng.integers(10**15, 10**16, n, dtype=np.int64),
+        "first": rng.choice(FIRST, n),
+        "last": rng.choice(LAST, n),
+        "gender": rng.choice(["F", "M"], n),
+        "street": [f"{k} Main St" for k in rng.integers(1, 9999, n)],
+        "city": [f"City{k}" for k in rng.integers(0, 900, n)],
+        "state": rng.choice(STATES, n),
+        "zip": rng.integers(1000, 99999, n, dtype=np.int32),
+        "lat": rng.uniform(25, 48, n),
+        "long": rng.uniform(-124, -68, n),
+        "city_pop": rng.lognormal(8, 2, n).astype(np.int32) + 20,
+        "job": rng.choice(jobs, n),
+        "dob": dob.strftime(DATE_FORMATS["dob"]),
+        "activity": rng.pareto(1.5, n) + 1,       # heavy-tailed tx per card
+    })
+
+
+def _timestamps(rng, n: int, t0: pd.Timestamp, span: pd.Timedelta,
+                night: float) -> pd.DatetimeIndex:
+    """``n`` sorted times in [t0, t0 + span), daytime-heavy by hour of day."""
+    day = np.r_[np.full(6, 0.3), np.full(16, 1.0), np.full(2, 0.6)]
+    per_hour = day + night * np.r_[np.ones(4), np.zeros(18), np.ones(2)]
+    hours = pd.date_range(t0.floor("h"), t0 + span, freq="h", inclusive="left")
+    w = per_hour[hours.hour]
+    at = hours[rng.choice(len(hours), n, p=w / w.sum())]
+    ts = pd.Series(at + pd.to_timedelta(rng.integers(0, 3600, n), unit="s"))
+    ts = ts.clip(t0, t0 + span - pd.Timedelta(seconds=1))   # partial end hours
+    return pd.DatetimeIndex(ts).sort_values()
+
+
+def _chunk(rng, n: int, t0: pd.Timestamp, span: pd.Timedelta, shift: float,
+           card: pd.DataFrame, merch: pd.DataFrame, tilt: np.ndarray) -> pd.DataFrame:
+    c = rng.choice(len(card), n, p=card["activity"] / card["activity"].sum())
+    w = merch["popularity"].to_numpy() * np.exp(shift * tilt)
+    m = rng.choice(len(merch), n, p=w / w.sum())
+    df = card.drop(columns="activity").iloc[c].reset_index(drop=True)
+    df["merchant"] = merch["merchant"].to_numpy()[m]
+    df["category"] = cat = merch["category"].to_numpy()[m]
+    ts = _timestamps(rng, n, t0, span, 0.5 * shift)
+
+    codes = pd.Categorical(cat, categories=CATEGORIES).codes
+    amt = rng.lognormal(3.5 + 0.25 * (codes % 5), 1.0) * (1 + shift)
+    night = np.asarray((ts.hour < 4) | (ts.hour >= 22))
+    logit = (BASE_FRAUD_LOGIT + shift + 0.9 * (np.log(amt) - 4)
+             + 1.5 * night + 1.0 * np.isin(cat, list(ONLINE)))
+    fraud = rng.random(n) < 1 / (1 + np.exp(-logit))
+    amt = np.where(fraud, amt * rng.uniform(1.5, 4.0, n), amt)
+
+    df["amt"] = amt.round(2)
+    df["trans_date_trans_time"] = ts.strftime(DATE_FORMATS["trans_date_trans_time"])
+    df["unix_time"] = ts.asi8 // 10**9
+    df["merch_lat"] = df["lat"] + rng.uniform(-1, 1, n)
+    df["merch_long"] = df["long"] + rng.uniform(-1, 1, n)
+    df["trans_num"] = [f"{a:016x}{b:016x}" for a, b in
+                       rng.integers(0, 2**63, (n, 2), dtype=np.int64)]
+    df["is_fraud"] = fraud.astype(np.uint8)
+    return df
+
+
+# ---------------------------------------------------------------------------
+def generate(raw_dir: Path, rows: int, versions: int = 3, drift: float = 0.1,
+             days: int = 30, seed: int = 0) -> list[Path]:
+    """Write ``versions`` drops of ``rows`` rows each; return their CSVs.
+
+    Re-running with the same arguments reuses the files already written.
+    """
+    raw_dir = Path(raw_dir)
+    spec = {"rows": rows, "versions": versions, "drift": drift,
+            "days": days, "seed": seed}
+    paths = [version_csv(raw_dir, f"v{k}") for k in range(1, versions + 1)]
+    spec_path = raw_dir / SPEC
+    if (spec_path.exists() and json.loads(spec_path.read_text()) == spec
+            and all(p.exists() for p in paths)):
+        return paths
+
+    rng = np.random.default_rng(seed)
+    card = cards(max(rows // ROWS_PER_CARD, 100), rng)
+    merch = merchants(rng)
+    tilt = rng.normal(0, 1, len(CATEGORIES))[
+        merch["category"].map(CATEGORIES.index).to_numpy()]
+    span = pd.Timedelta(days=days)
+
+    for k, path in enumerate(paths):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        n_chunks = -(-rows // CHUNK_ROWS)
+        written = 0
+        for i in range(n_chunks):
+            n = min(CHUNK_ROWS, rows - written)
+            t0 = START + k * span + i * span / n_chunks
+            df = _chunk(rng, n, t0, span / n_chunks, drift * k, card, merch, tilt)
+            df.insert(0, "Unnamed: 0", np.arange(written, written + n))
+            df[RAW_COLUMNS].to_csv(path, mode="a" if i else "w",
+                                   header=not i, index=False)
+            written += n
+        print(f"v{k + 1}: {rows:,} rows → {path}")
+    spec_path.write_text(json.dumps(spec, indent=2))
+    return paths
+
+
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Synthetic raw transaction drops")
+    ap.add_argument("raw_dir", type=Path, help="Output raw folder (v1/ … vN/)")
+    ap.add_argument("--rows", type=parse_rows, default=parse_rows("100k"),
+                    help="Rows per version, e.g. 100k, 1M, 10M")
+    ap.add_argument("--versions", type=int, default=3)
+    ap.add_argument("--drift", type=float, default=0.1,
+                    help="Shift added per version (0 = no drift)")
+    ap.add_argument("--days", type=int, default=30, help="Days covered per version")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    generate(args.raw_dir, args.rows, args.versions, args.drift, args.days, args.seed)
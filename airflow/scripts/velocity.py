@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+velocity.py – per-card velocity features, computed offline for training.
+
+For every transaction, from the same card's *earlier* transactions:
+
+* ``vel_count_1h`` / ``vel_amt_1h``   – count and amount in (t − 1h, t]
+* ``vel_count_24h`` / ``vel_amt_24h`` – the same over 24h
+* ``vel_secs_since_last``            – seconds since the previous one
+* ``vel_km_from_last``               – great-circle km from the previous
+  merchant to this one
+
+A card with no transaction in the last ``MAX_GAP`` seconds has no history:
+counts and sums are 0, the last two features ``NO_HISTORY``.  Amounts are
+summed in integer cents, so sums are exact.
+
+This is the offline twin of the backend's Redis ``VelocityStore``
+(fraud_detection_app/backend/velocity_store.py), which maintains the same values
+incrementally at serving time; ``bench_velocity.py parity`` there checks
+that both agree.  Rows are ordered per card by ``unix_time`` then file
+order – the order the stream delivers them.
+
+Everything is vectorized: one sort, one ``searchsorted`` per window over a
+(card, time) key and a prefix sum of cents.
+
+A file read in chunks goes through ``ChunkedVelocity``: it keeps, per card,
+the rows that can still count for a later row – those inside the longest
+window of the card's last transaction, and the last transaction itself
+while it is within ``MAX_GAP`` of the newest time seen – and computes each
+chunk on that tail plus the chunk.  For a file in time order this equals
+``velocity_features`` on the whole file.
+
+Usage
+-----
+from velocity import VELOCITY_COLS, velocity_features
+df[VELOCITY_COLS] = velocity_features(df)
+
+stream = ChunkedVelocity()
+for chunk in chunks:
+    chunk[VELOCITY_COLS] = stream.features(chunk)
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+WINDOWS = {"1h": 3600, "24h": 86_400}
+MAX_GAP = 30 * 86_400          # the backend keeps last-transaction state this long
+NO_HISTORY = -1.0
+EARTH_KM = 6371.0088
+VELOCITY_COLS = [
+    *(f"vel_{kind}_{name}" for name in WINDOWS for kind in ("count", "amt")),
+    "vel_secs_since_last", "vel_km_from_last",
+]
+INPUT_COLS = ["cc_num", "unix_time", "amt", "merch_lat", "merch_long"]
+
+
+# ---------------------------------------------------------------------------
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; NumPy arrays or scalars."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_KM * np.arcsin(np.sqrt(a))
+
+
+def to_cents(amt) -> np.ndarray:
+    return np.rint(np.asarray(amt, dtype=np.float64) * 100).astype(np.int64)
+
+
+def velocity_features(df: pd.DataFrame) -> pd.DataFrame:
+    """``VELOCITY_COLS`` for every row of ``df`` (needs ``INPUT_COLS``)."""
+    n = len(df)
+    card = df["cc_num"].to_numpy()
+    ts = df["unix_time"].to_numpy().astype(np.int64)
+    order = np.lexsort((np.arange(n), ts, card))    # card, then time, then file
+    card, ts = card[order], ts[order]
+    cents = to_cents(df["amt"].to_numpy())[order]
+    lat = df["merch_lat"].to_numpy(dtype=np.float64)[order]
+    lon = df["merch_long"].to_numpy(dtype=np.float64)[order]
+
+    new_card = np.r_[True, card[1:] != card[:-1]] if n else np.zeros(0, bool)
+    group = np.cumsum(new_card) - 1
+    # one monotone key: cards in blocks of 2**32 s, time inside the block
+    key = group * (1 << 32) + ts
+    csum = np.r_[0, np.cumsum(cents)]
+    idx = np.arange(n)
+
+    out = np.empty((n, len(VELOCITY_COLS)))
+    col = 0
+    for seconds in WINDOWS.values():
+        first = np.searchsorted(key, key - seconds, side="right")
+        out[:, col] = idx - first
+        out[:, col + 1] = (csum[idx] - csum[first]) / 100
+        col += 2
+
+    prev = np.maximum(idx - 1, 0)
+    gap = ts - ts[prev]
+    fresh = new_card | (gap > MAX_GAP)
+    # after MAX_GAP idle seconds the backend has forgotten the card
+    out[:, col] = np.where(fresh, NO_HISTORY, gap)
+    out[:, col + 1] = np.where(fresh, NO_HISTORY,
+                               haversine_km(lat[prev], lon[prev], lat, lon))
+
+    result = np.empty_like(out)
+    result[order] = out
+    return pd.DataFrame(result, index=df.index, columns=VELOCITY_COLS)
+
+
+class ChunkedVelocity:
+    """``velocity_features`` over consecutive chunks of one file."""
+
+    def __init__(self):
+        self.tail = pd.DataFrame(columns=INPUT_COLS)
+
+    def _combined(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        rows = chunk[INPUT_COLS]
+        if self.tail.empty:
+            return rows.reset_index(drop=True)
+        return pd.concat([self.tail, rows], ignore_index=True)
+
+    def _keep(self, rows: pd.DataFrame) -> None:
+        ts = rows["unix_time"].to_numpy().astype(np.int64)
+        last = rows.groupby("cc_num")["unix_time"].transform("max").to_numpy()
+        recent = ts > last - max(WINDOWS.values())
+        alive = last >= (ts.max() if len(ts) else 0) - MAX_GAP
+        self.tail = rows[recent & alive].reset_index(drop=True)
+
+    def warm(self, chunk: pd.DataFrame) -> None:
+        """Take history from rows that are not scored themselves."""
+        self._keep(self._combined(chunk))
+
+    def features(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        rows = self._combined(chunk)
+        out = velocity_features(rows).iloc[len(rows) - len(chunk):]
+        self._keep(rows)
+        return out.set_axis(chunk.index)
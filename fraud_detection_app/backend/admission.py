@@ -0,0 +1,203 @@
+# admission.py
+"""
+Admission control for the endpoints that call an upstream – /predict (model
+server) and /explain (Gemini) – so a slow upstream degrades the API into
+fast 429/503s instead of a pile of blocked threads.
+
+* ``Admission`` – a FastAPI dependency per route, in place of
+  ``get_current_user``:
+  - a token bucket per client (``rate`` req/s, ``burst``) → 429 + Retry-After;
+  - at most ``limit`` requests of the route in flight; a request waits for a
+    slot at most ``queue_target`` seconds, then is shed → 503 + Retry-After.
+  Both run on the event loop, before the handler takes a worker thread, so
+  rejected requests cost no thread at all.
+* ``CircuitBreaker`` – ``with MODEL_BREAKER: requests.post(...)``.  After
+  ``failures`` consecutive failures (connection errors, timeouts, 5xx) it
+  opens and calls fail fast with ``CircuitOpen``; after ``reset_after``
+  seconds one probe is let through (half-open) and its outcome closes or
+  re-opens it.
+
+``TokenBucket``, ``Admission`` and ``CircuitBreaker`` take a ``clock``
+(``time.monotonic`` by default) so tests can drive refills and reset
+timeouts without sleeping.
+
+The limits are per worker process (gunicorn_conf.py): N workers admit
+N × ``limit`` and, at worst, give a client N × ``rate``.  Keep the in-flight
+limits of all routes below the threadpool size (40 by default) so auth and
+the cheap routes always find a thread.
+
+State is exported as Prometheus metrics: ``admission_in_flight``,
+``admission_limit``, ``admission_rejected_total{reason}``,
+``rate_limit_clients``, ``circuit_breaker_state`` (0 closed, 1 half-open,
+2 open), ``circuit_breaker_transitions_total`` and
+``circuit_breaker_rejected_total``.
+"""
+import asyncio, math, os, threading, time
+
+import requests
+from fastapi import Depends, HTTPException
+from prometheus_client import Counter, Gauge
+
+from auth import get_current_user
+
+QUEUE_TARGET = float(os.getenv("ADMISSION_QUEUE_TARGET_MS", 50)) / 1e3
+MAX_CLIENTS = 10_000            # buckets kept before idle (full) ones are dropped
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+STATE_NAMES = {CLOSED: "closed", HALF_OPEN: "half_open", OPEN: "open"}
+
+# ─── Metrics ───────────────────────────────────────────────────────────────────
+
+# multiprocess_mode: how gunicorn workers' values combine on /metrics
+IN_FLIGHT = Gauge("admission_in_flight", "Admitted requests in progress", ["route"],
+                  multiprocess_mode="livesum")
+LIMIT = Gauge("admission_limit", "Concurrency limit", ["route"],
+              multiprocess_mode="livesum")
+REJECTED = Counter(
+    "admission_rejected_total",
+    "Requests refused before reaching the handler",
+    ["route", "reason"],            # rate_limited | shed
+)
+CLIENTS = Gauge("rate_limit_clients", "Clients with a token bucket", ["route"],
+                multiprocess_mode="livemax")
+BREAKER_STATE = Gauge(
+    "circuit_breaker_state", "0 closed, 1 half-open, 2 open", ["upstream"],
+    multiprocess_mode="livemax")            # the worst worker's breaker
+BREAKER_TRANSITIONS = Counter(
+    "circuit_breaker_transitions_total", "Breaker state changes", ["upstream", "to"])
+BREAKER_REJECTED = Counter(
+    "circuit_breaker_rejected_total", "Calls refused by an open breaker", ["upstream"])
+
+# ─── Rate limit and concurrency ────────────────────────────────────────────────
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate, self.burst, self.clock = rate, burst, clock
+        self.tokens, self.stamp = float(burst), clock()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def take(self) -> float:
+        """Take a token: 0.0, or the seconds until one is available."""
+        self.refill(self.clock())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Admission:
+    def __init__(self, route: str, rate: float, burst: float, limit: int,
+                 queue_target: float = QUEUE_TARGET, clock=time.monotonic):
+        self.route, self.rate, self.burst = route, rate, burst
+        self.limit, self.queue_target, self.clock = limit, queue_target, clock
+        self.buckets: dict[str, TokenBucket] = {}
+        self.in_flight = 0
+        self._slots: asyncio.Semaphore | None = None
+        LIMIT.labels(route=route).set(limit)
+
+    def bucket(self, client: str) -> TokenBucket:
+        if client not in self.buckets:
+            if len(self.buckets) >= MAX_CLIENTS:
+                now = self.clock()
+                for key, b in list(self.buckets.items()):
+                    b.refill(now)
+                    if b.tokens >= b.burst:
+                        del self.buckets[key]
+            self.buckets[client] = TokenBucket(self.rate, self.burst, self.clock)
+            CLIENTS.labels(route=self.route).set(len(self.buckets))
+        return self.buckets[client]
+
+    async def acquire(self) -> bool:
+        """A slot within ``queue_target`` seconds, or False."""
+        if self._slots is None:                  # bind to the running loop
+            self._slots = asyncio.Semaphore(self.limit)
+        if self._slots.locked() and self.queue_target <= 0:
+            return False
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_target)
+        except asyncio.TimeoutError:
+            return False
+        self.in_flight += 1
+        IN_FLIGHT.labels(route=self.route).set(self.in_flight)
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        IN_FLIGHT.labels(route=self.route).set(self.in_flight)
+        self._slots.release()
+
+    async def __call__(self, user: str = Depends(get_current_user)):
+        if wait := self.bucket(user).take():
+            REJECTED.labels(route=self.route, reason="rate_limited").inc()
+            raise HTTPException(429, "Rate limit exceeded",
+                                headers={"Retry-After": str(math.ceil(wait))})
+        if not await self.acquire():
+            REJECTED.labels(route=self.route, reason="shed").inc()
+            raise HTTPException(503, "Server overloaded, retry later",
+                                headers={"Retry-After": "1"})
+        try:
+            yield user
+        finally:
+            self.release()
+
+# ─── Circuit breaker ───────────────────────────────────────────────────────────
+
+class CircuitOpen(Exception):
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} unavailable (circuit open)")
+        self.upstream, self.retry_after = upstream, retry_after
+
+
+def is_failure(err: BaseException) -> bool:
+    """Connection errors, timeouts and 5xx count; a 4xx is the caller's fault."""
+    if isinstance(err, requests.HTTPError) and err.response is not None:
+        return err.response.status_code >= 500
+    return isinstance(err, requests.RequestException)
+
+
+class CircuitBreaker:
+    def __init__(self, upstream: str, failures: int = 5, reset_after: float = 10.0,
+                 clock=time.monotonic):
+        self.upstream, self.max_failures, self.reset_after = upstream, failures, reset_after
+        self.clock = clock
+        self.state, self.failures, self.opened_at = CLOSED, 0, 0.0
+        self.probing = False
+        self._lock = threading.Lock()            # handlers run in worker threads
+        BREAKER_STATE.labels(upstream=upstream).set(CLOSED)
+
+    def _move(self, state: int) -> None:
+        self.state = state
+        BREAKER_STATE.labels(upstream=self.upstream).set(state)
+        BREAKER_TRANSITIONS.labels(upstream=self.upstream, to=STATE_NAMES[state]).inc()
+
+    def __enter__(self) -> "CircuitBreaker":
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self.opened_at + self.reset_after - self.clock()
+                if remaining > 0:
+                    BREAKER_REJECTED.labels(upstream=self.upstream).inc()
+                    raise CircuitOpen(self.upstream, remaining)
+                self._move(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self.probing:                 # one probe at a time
+                    BREAKER_REJECTED.labels(upstream=self.upstream).inc()
+                    raise CircuitOpen(self.upstream, self.reset_after)
+                self.probing = True
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        with self._lock:
+            self.probing = False
+            if exc is None or not is_failure(exc):
+                self.failures = 0
+                if self.state != CLOSED:
+                    self._move(CLOSED)
+            else:
+                self.failures += 1
+                if self.state == HALF_OPEN or self.failures >= self.max_failures:
+                    self.opened_at = self.clock()
+                    if self.state != OPEN:
+                        self._move(OPEN)
+        return False
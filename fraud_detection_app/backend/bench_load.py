@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+bench_load.py – capacity benchmark for the backend against local stubs.
+
+``run`` starts three things on localhost:
+
+* a stub server answering ``POST /invocations`` (the MLServer contract:
+  ``{"inputs": [...]}`` → ``{"predictions": [...]}``) and Gemini's
+  ``generateContent``, each after a configurable latency;
+* the FastAPI app under gunicorn with ``--app-workers`` uvicorn workers
+  (gunicorn_conf.py, as in the Docker image), pointed at the stub through
+  ``MODEL_ENDPOINT`` / ``GEMINI_BASE_URL`` and at a throw-away SQLite
+  database seeded with ``--users`` accounts;
+* an asyncio open-loop load generator: requests are sent on a fixed (or
+  Poisson) schedule whatever the server does, and latency is measured from
+  the scheduled send time, so queueing shows up in the percentiles instead
+  of silently lowering the offered rate.
+
+JWTs are minted up front with the app's own secret and ``InputForm``
+payloads are drawn from realistic ranges with exactly one level set per
+one-hot group (or none – the dropped first level).
+
+Latency specs: ``fixed:MS``, ``uniform:LO:HI``, ``exp:MEAN`` or
+``lognormal:MEDIAN:SIGMA`` (milliseconds).
+
+The JSON report holds offered/achieved rate, throughput, p50/p95/p99,
+error rate and status codes per endpoint plus the git commit; ``compare``
+diffs two reports.
+
+Overload check: with an upstream slower than the offered rate can sustain,
+admission control should answer the excess with fast 429/503s and keep the
+tail bounded.  ``--max-p99-ms`` makes ``run`` exit 1 if any endpoint's p99,
+over all responses, exceeds it.  The app reads its limits from the
+environment (``PREDICT_IN_FLIGHT``, ``MODEL_TIMEOUT``, … in main.py).
+
+Worker scaling: ``scale`` repeats ``run`` at each ``--workers`` count and
+prints successful requests/s, speedup over the smallest count and p99.
+Offer more than the largest count can serve (the excess is shed, so ok/s is
+capacity), give the model stub a realistic latency, and keep the load
+generator on cores of its own – at 8 workers a single-process generator is
+easily the bottleneck.  Record the table with the commit it ran on.
+
+Needs the backend requirements plus ``httpx``; velocity features and the
+last-prediction store use Redis at ``REDIS_URL`` and fall back without it.
+
+Usage
+-----
+python bench_load.py run --rate 200 --duration 30 \
+    --mix predict=0.8,explain=0.1,login=0.1 \
+    --model-latency lognormal:8:0.5 --llm-latency fixed:400 --out after.json
+python bench_load.py compare before.json after.json
+MODEL_TIMEOUT=1 python bench_load.py run --rate 300 --mix predict=1 \
+    --model-latency fixed:2000 --max-p99-ms 1500              # overloaded model
+python bench_load.py stub --port 9001 --model-latency fixed:5   # stub only
+python bench_load.py scale --workers 1,2,4,8 --rate 2000 --mix predict=1 \
+    --out scale.json                                           # worker scaling
+"""
+from __future__ import annotations
+
+import argparse, asyncio, json, os, random, subprocess, sys, tempfile, time
+from pathlib import Path
+
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+ENDPOINTS = ("predict", "explain", "login")
+PASSWORD = "load-test-Pa55word!"
+START_TIMEOUT = 60
+ONE_HOT_GROUPS = ("merchant_grouped_", "category_", "job_grouped_", "region_")
+
+
+# ─── Latency specs ─────────────────────────────────────────────────────────────
+
+def latency_sampler(spec: str, rng: random.Random):
+    """Return a zero-argument callable giving one delay in seconds."""
+    kind, *args = spec.split(":")
+    a = [float(x) for x in args]
+    samplers = {
+        "fixed":     lambda: a[0] / 1e3,
+        "uniform":   lambda: rng.uniform(a[0], a[1]) / 1e3,
+        "exp":       lambda: rng.expovariate(1e3 / a[0]) if a[0] else 0.0,
+        "lognormal": lambda: a[0] / 1e3 * rng.lognormvariate(0, a[1]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"unknown latency spec {spec!r}")
+    return samplers[kind]
+
+
+# ─── Stub model + LLM server ───────────────────────────────────────────────────
+
+def stub_app(model_latency: str, llm_latency: str, error_rate: float = 0.0,
+             seed: int = 0):
+    from fastapi import FastAPI, HTTPException
+
+    rng = random.Random(seed)
+    model_delay = latency_sampler(model_latency, rng)
+    llm_delay = latency_sampler(llm_latency, rng)
+    app = FastAPI(title="bench stub")
+
+    @app.post("/invocations")
+    async def invocations(body: dict):
+        await asyncio.sleep(model_delay())
+        if rng.random() < error_rate:
+            raise HTTPException(503, "stub model unavailable")
+        # mostly legitimate, a thin fraud tail – like the real score mix
+        return {"predictions": [rng.random() ** 4 for _ in body.get("inputs", [])]}
+
+    @app.post("/v1beta/models/{target}")       # "<model>:generateContent"
+    async def generate(target: str, body: dict):
+        await asyncio.sleep(llm_delay())
+        if rng.random() < error_rate:
+            raise HTTPException(503, "stub LLM unavailable")
+        text = "The amount and merchant category drove this prediction. " * 8
+        return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+    return app
+
+
+# ─── Users, tokens, payloads ───────────────────────────────────────────────────
+
+def seed_users(n: int) -> list[dict]:
+    """Create ``n`` accounts in DATABASE_URL; return email/password/token."""
+    from jose import jwt
+    from passlib.hash import bcrypt
+    from auth import ALGORITHM, SECRET_KEY, SessionLocal
+    from models import User
+
+    hashed = bcrypt.hash(PASSWORD)             # one hash, shared – it is slow
+    users = []
+    with SessionLocal() as db:
+        for i in range(n):
+            email = f"load{i}@example.com"
+            if not db.query(User).filter(User.email == email).first():
+                db.add(User(email=email, hashed_pw=hashed, name=f"Load {i}"))
+            users.append({"email": email, "password": PASSWORD,
+                          "token": jwt.encode({"sub": email}, SECRET_KEY,
+                                              algorithm=ALGORITHM)})
+        db.commit()
+    return users
+
+
+def make_payloads(n: int, seed: int = 0) -> list[dict]:
+    """``n`` valid InputForm bodies drawn from the training data's ranges."""
+    from main import InputForm
+
+    rng = random.Random(seed)
+    fields = list(InputForm.model_fields)
+    groups = {g: [f for f in fields if f.startswith(g)] for g in ONE_HOT_GROUPS}
+    out = []
+    for _ in range(n):
+        lat, long = rng.uniform(25, 48), rng.uniform(-124, -68)
+        body = {
+            "amt": round(rng.lognormvariate(3.9, 1.2), 2),
+            "lat": lat, "long": long,
+            "merch_lat": lat + rng.uniform(-1, 1),
+            "merch_long": long + rng.uniform(-1, 1),
+            "tx_hour": rng.randrange(24),
+            "tx_dayofweek": rng.randrange(7),
+            "tx_month": rng.randrange(1, 13),
+            "age": rng.randrange(18, 90),
+            "gender_M": rng.random() < 0.5,
+            # a few thousand cards, so velocity state builds up
+            "cc_num": rng.randrange(10**15, 10**15 + 5000),
+        }
+        for members in groups.values():
+            body.update(dict.fromkeys(members, False))
+            # index len(members) = the level drop_first removed
+            if (pick := rng.randrange(len(members) + 1)) < len(members):
+                body[members[pick]] = True
+        out.append(body)
+    return out
+
+
+# ─── Load generator ────────────────────────────────────────────────────────────
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {k: float(v) for k, v in (p.split("=") for p in spec.split(","))}
+    if unknown := set(mix) - set(ENDPOINTS):
+        raise ValueError(f"unknown endpoints in mix: {sorted(unknown)}")
+    total = sum(mix.values())
+    return {k: v / total for k, v in mix.items() if v > 0}
+
+
+def request_for(kind: str, rng: random.Random, users: list[dict],
+                payloads: list[dict]) -> tuple[str, dict, dict]:
+    user = rng.choice(users)
+    auth = {"Authorization": f"Bearer {user['token']}"}
+    if kind == "predict":
+        return "/predict", rng.choice(payloads), auth
+    if kind == "explain":
+        prompt = ("Explain this fraud prediction.\n"
+                  + json.dumps(rng.choice(payloads), indent=2))
+        return "/explain", {"prompt": prompt}, auth
+    return "/auth/login", {"email": user["email"], "password": user["password"]}, {}
+
+
+async def drive(base_url: str, mix: dict[str, float], rate: float,
+                duration: float, users: list[dict], payloads: list[dict],
+                poisson: bool = False, timeout: float = 30.0,
+                seed: int = 0) -> list[tuple]:
+    """Open-loop run; returns (endpoint, status | error name, latency_s)."""
+    import httpx
+
+    rng = random.Random(seed)
+    kinds, weights = list(mix), list(mix.values())
+    loop = asyncio.get_running_loop()
+    results: list[tuple] = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout,
+                                 limits=limits) as client:
+        async def one(kind: str, scheduled: float) -> None:
+            path, body, headers = request_for(kind, rng, users, payloads)
+            try:
+                resp = await client.post(path, json=body, headers=headers)
+                status = resp.status_code
+            except httpx.HTTPError as err:
+                status = type(err).__name__
+            results.append((kind, status, loop.time() - scheduled))
+
+        tasks, t0 = [], loop.time()
+        at = t0
+        while at < t0 + duration:
+            await asyncio.sleep(max(0.0, at - loop.time()))
+            kind = rng.choices(kinds, weights)[0]
+            tasks.append(asyncio.create_task(one(kind, at)))
+            at += rng.expovariate(rate) if poisson else 1 / rate
+        await asyncio.gather(*tasks)
+    return results
+
+
+def summarize(results: list[tuple], duration: float, wall: float) -> dict:
+    """Offered rate is over the schedule; throughput is over ``wall``, the time
+    until the last response, so an overloaded server cannot report the
+    offered rate as its throughput."""
+    def stats(rows: list[tuple]) -> dict:
+        ok = [lat for _, status, lat in rows if status == 200]
+        codes: dict[str, int] = {}
+        for _, status, _ in rows:
+            codes[str(status)] = codes.get(str(status), 0) + 1
+        lat_ms = np.array([lat for *_, lat in rows]) * 1e3
+        pct = (np.percentile(lat_ms, [50, 95, 99]) if len(lat_ms)
+               else [float("nan")] * 3)
+        return {
+            "requests": len(rows),
+            "offered_rps": len(rows) / duration,
+            "throughput_rps": len(ok) / wall,
+            "error_rate": 1 - len(ok) / len(rows) if rows else 0.0,
+            "p50_ms": float(pct[0]), "p95_ms": float(pct[1]), "p99_ms": float(pct[2]),
+            "max_ms": float(lat_ms.max()) if len(lat_ms) else float("nan"),
+            "status": codes,
+        }
+
+    out = {kind: stats([r for r in results if r[0] == kind])
+           for kind in ENDPOINTS if any(r[0] == kind for r in results)}
+    out["all"] = stats(results)
+    return out
+
+
+# ─── Orchestration ─────────────────────────────────────────────────────────────
+
+def free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, proc: subprocess.Popen) -> None:
+    import httpx
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} not ready after {START_TIMEOUT}s")
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    stub_port, app_port = free_port(), free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": args.database_url or f"sqlite:///{tmp}/bench.db",
+            "MODEL_ENDPOINT": f"http://127.0.0.1:{stub_port}/invocations",
+            "GEMINI_BASE_URL": f"http://127.0.0.1:{stub_port}",
+        }
+        os.environ.update(env)              # seeding imports auth in-process
+        users = seed_users(args.users)
+        payloads = make_payloads(args.payloads, args.seed)
+
+        stub = subprocess.Popen(
+            [sys.executable, __file__, "stub", "--port", str(stub_port),
+             "--model-latency", args.model_latency, "--llm-latency", args.llm_latency,
+             "--error-rate", str(args.stub_error_rate), "--seed", str(args.seed)],
+            env=env)
+        # the production launcher: gunicorn + uvicorn workers, shared metrics
+        app = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn_conf.py"],
+            cwd=HERE, env={**env, "BIND": f"127.0.0.1:{app_port}",
+                           "WEB_CONCURRENCY": str(args.app_workers),
+                           "PROMETHEUS_MULTIPROC_DIR": f"{tmp}/prometheus",
+                           "LOG_LEVEL": "warning"})
+        try:
+            wait_ready(f"http://127.0.0.1:{stub_port}/docs", stub)
+            wait_ready(f"http://127.0.0.1:{app_port}/metrics", app)
+            base, mix = f"http://127.0.0.1:{app_port}", parse_mix(args.mix)
+            if args.warmup:
+                asyncio.run(drive(base, mix, args.rate, args.warmup, users, payloads,
+                                  args.poisson, args.timeout, args.seed + 1))
+            t0 = time.perf_counter()
+            results = asyncio.run(drive(base, mix, args.rate, args.duration, users,
+                                        payloads, args.poisson, args.timeout, args.seed))
+            wall = time.perf_counter() - t0
+        finally:
+            for proc in (app, stub):
+                proc.terminate()
+                proc.wait(timeout=10)
+
+    return {
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {k: v for k, v in vars(args).items()
+                   if k not in ("cmd", "out", "database_url")},
+        "wall_seconds": wall,
+        "endpoints": summarize(results, args.duration, wall),
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"commit {report['commit']}  rate {report['config']['rate']}/s  "
+          f"{report['config']['duration']}s  mix {report['config']['mix']}")
+    print(f"{'endpoint':<9} {'reqs':>7} {'ok/s':>8} {'err%':>6} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, s in report["endpoints"].items():
+        print(f"{name:<9} {s['requests']:>7} {s['throughput_rps']:>8.1f} "
+              f"{s['error_rate'] * 100:>6.2f} {s['p50_ms']:>8.1f} "
+              f"{s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f}  "
+              + " ".join(f"{code}:{n}" for code, n in sorted(s["status"].items())))
+
+
+def scale(args) -> dict:
+    """One ``run`` per worker count; prints throughput and p99 against 1 worker.
+
+    Every run shares one database: seeding imports auth.py in-process, and
+    its engine binds to the DATABASE_URL of the first import.
+    """
+    reports = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        args.database_url = args.database_url or f"sqlite:///{tmp}/bench.db"
+        for n in map(int, args.workers.split(",")):
+            args.app_workers = n
+            reports[n] = run(args)
+            print_report(reports[n])
+    base = reports[min(reports)]["endpoints"]["all"]["throughput_rps"]
+    print(f"{'workers':>7} {'ok/s':>9} {'speedup':>8} {'p99 ms':>8} {'err%':>6}")
+    for n, report in reports.items():
+        s = report["endpoints"]["all"]
+        print(f"{n:>7} {s['throughput_rps']:>9.1f} "
+              f"{s['throughput_rps'] / base if base else float('nan'):>7.2f}× "
+              f"{s['p99_ms']:>8.1f} {s['error_rate'] * 100:>6.2f}")
+    return {"commit": git_commit(), "runs": {str(n): r for n, r in reports.items()}}
+
+
+def compare(before: dict, after: dict) -> None:
+    print(f"{before['commit']} → {after['commit']}")
+    print(f"{'endpoint':<9} {'metric':<15} {'before':>10} {'after':>10} {'change':>8}")
+    for name in after["endpoints"]:
+        if name not in before["endpoints"]:
+            continue
+        b, a = before["endpoints"][name], after["endpoints"][name]
+        for metric in ("throughput_rps", "error_rate", "p50_ms", "p95_ms", "p99_ms"):
+            change = (f"{a[metric] / b[metric] - 1:+.1%}" if b[metric] else "n/a")
+            print(f"{name:<9} {metric:<15} {b[metric]:>10.3f} {a[metric]:>10.3f} "
+                  f"{change:>8}")
+
+
+# ─── CLI ───────────────────────────────────────────────────────────────────────
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Backend load benchmark")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    load = argparse.ArgumentParser(add_help=False)     # shared by run and scale
+    r = load
+    r.add_argument("--rate", type=float, default=100, help="Requests/s offered")
+    r.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    r.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds first")
+    r.add_argument("--mix", default="predict=0.8,explain=0.1,login=0.1")
+    r.add_argument("--poisson", action="store_true",
+                   help="Poisson arrivals instead of a fixed interval")
+    r.add_argument("--model-latency", default="fixed:5")
+    r.add_argument("--llm-latency", default="lognormal:300:0.4")
+    r.add_argument("--stub-error-rate", type=float, default=0.0)
+    r.add_argument("--users", type=int, default=50)
+    r.add_argument("--payloads", type=int, default=1000)
+    r.add_argument("--app-workers", type=int, default=1)
+    r.add_argument("--timeout", type=float, default=30.0, help="Client timeout (s)")
+    r.add_argument("--database-url", help="Default: a temporary SQLite file")
+    r.add_argument("--seed", type=int, default=0)
+    r.add_argument("--out", type=Path, help="JSON report path")
+
+    r = sub.add_parser("run", parents=[load], help="Start stubs + app and drive load")
+    r.add_argument("--max-p99-ms", type=float,
+                   help="Exit 1 if any endpoint's p99 exceeds this")
+
+    w = sub.add_parser("scale", parents=[load],
+                       help="Repeat run at several worker counts")
+    w.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker counts")
+
+    s = sub.add_parser("stub", help="Serve only the stub model/LLM")
+    s.add_argument("--port", type=int, default=9001)
+    s.add_argument("--model-latency", default="fixed:5")
+    s.add_argument("--llm-latency", default="lognormal:300:0.4")
+    s.add_argument("--error-rate", type=float, default=0.0)
+    s.add_argument("--seed", type=int, default=0)
+
+    c = sub.add_parser("compare", help="Diff two JSON reports")
+    c.add_argument("before", type=Path)
+    c.add_argument("after", type=Path)
+
+    args = ap.parse_args()
+    if args.cmd == "stub":
+        import uvicorn
+        uvicorn.run(stub_app(args.model_latency, args.llm_latency,
+                             args.error_rate, args.seed),
+                    host="127.0.0.1", port=args.port, log_level="warning")
+    elif args.cmd == "compare":
+        compare(json.loads(args.before.read_text()), json.loads(args.after.read_text()))
+    elif args.cmd == "scale":
+        report = scale(args)
+        if args.out:
+            args.out.write_text(json.dumps(report, indent=2))
+    else:
+        report = run(args)
+        print_report(report)
+        if args.out:
+            args.out.write_text(json.dumps(report, indent=2))
+        if args.max_p99_ms is not None:
+            slow = [name for name, s in report["endpoints"].items()
+                    if s["p99_ms"] > args.max_p99_ms]
+            if slow:
+                sys.exit(f"p99 above {args.max_p99_ms} ms: {', '.join(slow)}")
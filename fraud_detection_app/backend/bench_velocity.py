@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+bench_velocity.py – online/offline parity and update latency of the
+per-card velocity features.
+
+``parity`` reads the first ``--rows`` transactions of a raw CSV, computes
+the training features with airflow/scripts/velocity.py, then replays the
+same rows in stream order – ``unix_time``, then file order – through the
+Redis ``VelocityStore`` under a throw-away key prefix.  Counts, amounts and
+seconds must match exactly, distances to 1e-9 km; the first mismatches are
+printed and the exit code is 1.  The replay also reports p50/p99 latency
+of one update (a single script round trip) and updates/s.  Keys are
+deleted afterwards.
+
+Run from the repo checkout: it imports the pipeline modules from
+airflow/scripts.  Needs a Redis at ``REDIS_URL``.
+
+Usage
+-----
+REDIS_URL=redis://localhost:6379/0 \
+    python bench_velocity.py parity data/raw/fraudTrain.csv --rows 100k
+"""
+from __future__ import annotations
+
+import argparse, sys, time, uuid
+from pathlib import Path
+
+import numpy as np
+
+from velocity_store import VelocityStore
+
+HERE = Path(__file__).resolve().parent
+sys.path.append(str(HERE.parents[1] / "airflow" / "scripts"))
+
+import velocity as offline                               # noqa: E402
+from raw_io import read_raw                              # noqa: E402
+from synth_data import parse_rows                        # noqa: E402
+
+KM_TOLERANCE = 1e-9
+SHOW = 10
+
+
+# ---------------------------------------------------------------------------
+def replay(store: VelocityStore, df) -> tuple[np.ndarray, np.ndarray]:
+    """Online features for every row of ``df`` and per-update seconds."""
+    order = np.lexsort((np.arange(len(df)), df["unix_time"].to_numpy()))
+    cols = [df[c].to_numpy() for c in offline.INPUT_COLS]
+    online = np.empty((len(df), len(offline.VELOCITY_COLS)))
+    seconds = np.empty(len(df))
+    for i in order:
+        cc, ts, amt, lat, lon = (c[i] for c in cols)
+        t0 = time.perf_counter()
+        row = store.update(int(cc), int(ts), float(amt), float(lat), float(lon))
+        seconds[i] = time.perf_counter() - t0
+        online[i] = [row[c] for c in offline.VELOCITY_COLS]
+    return online, seconds
+
+
+def mismatches(expected: np.ndarray, online: np.ndarray) -> list[tuple[int, str, float, float]]:
+    bad = []
+    for j, col in enumerate(offline.VELOCITY_COLS):
+        tol = KM_TOLERANCE if col == "vel_km_from_last" else 0.0
+        for i in np.flatnonzero(np.abs(expected[:, j] - online[:, j]) > tol):
+            bad.append((int(i), col, expected[i, j], online[i, j]))
+    return bad
+
+
+def parity(csv: Path, rows: int) -> bool:
+    df = read_raw(csv, columns=offline.INPUT_COLS).head(rows)
+    t0 = time.perf_counter()
+    expected = offline.velocity_features(df).to_numpy()
+    print(f"offline: {len(df):,} rows, {df['cc_num'].nunique():,} cards "
+          f"in {time.perf_counter() - t0:.2f}s")
+
+    store = VelocityStore(prefix=f"velbench:{uuid.uuid4().hex[:8]}:")
+    try:
+        t0 = time.perf_counter()
+        online, seconds = replay(store, df)
+        wall = time.perf_counter() - t0
+    finally:
+        for key in store.r.scan_iter(f"{store.prefix}*", count=1000):
+            store.r.delete(key)
+
+    p50, p99 = np.percentile(seconds, [50, 99]) * 1e3
+    print(f"online:  {len(df) / wall:,.0f} updates/s, "
+          f"p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+
+    bad = mismatches(expected, online)
+    for i, col, want, got in bad[:SHOW]:
+        print(f"  row {i}: {col} offline={want!r} online={got!r}")
+    print(f"parity: {'OK' if not bad else f'{len(bad):,} mismatches'}")
+    return not bad
+
+
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Velocity feature parity and latency")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("parity", help="Replay a raw CSV through Redis and compare")
+    p.add_argument("csv", type=Path, help="Raw transactions CSV")
+    p.add_argument("--rows", default="100k", help="Rows to replay (100k, 1M, …)")
+    args = ap.parse_args()
+    sys.exit(0 if parity(args.csv, parse_rows(args.rows)) else 1)
@@ -0,0 +1,12 @@
+# decision.py
+"""
+The fraud / not-fraud decision, shared by online predictions (main.py) and
+bulk scoring jobs (jobs.py) so both label a probability the same way.
+"""
+import os
+
+FRAUD_THRESHOLD = float(os.getenv("FRAUD_THRESHOLD", 0.8))
+
+
+def label(proba: float, threshold: float = FRAUD_THRESHOLD) -> str:
+    return "fraud" if proba >= threshold else "not_fraud"
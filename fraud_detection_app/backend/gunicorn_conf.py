@@ -0,0 +1,58 @@
+# gunicorn_conf.py
+"""
+Multi-worker serving: gunicorn manages uvicorn workers.
+
+    gunicorn main:app -c gunicorn_conf.py
+
+* ``WEB_CONCURRENCY`` workers, default one per core the container may use
+  (cgroup CPU quota, else CPU affinity).
+* Every worker imports the app itself (no ``preload_app``), and main.py
+  opens its HTTP session and Redis client in the startup hook, so no socket
+  is shared across a fork.
+* Prometheus multiprocess mode: ``PROMETHEUS_MULTIPROC_DIR`` must be set in
+  the environment before anything imports prometheus_client (the Dockerfile
+  does).  The directory is emptied when the master starts and a dead
+  worker's live gauges are dropped, so /metrics on any worker reports the
+  sum over all workers.
+* Graceful restart: on SIGTERM (or SIGHUP, which replaces the workers) a
+  worker stops accepting connections and finishes in-flight requests for up
+  to ``GRACEFUL_TIMEOUT`` seconds.  Keep docker's stop_grace_period above it.
+"""
+import os, shutil
+from pathlib import Path
+
+from prometheus_client import multiprocess
+
+
+def available_cores() -> int:
+    """CPUs this process may use: cgroup v2 quota, else affinity."""
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0))
+
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", available_cores()))
+worker_class = "uvicorn.workers.UvicornWorker"
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))       # silent worker → restarted
+keepalive = 5
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        server.log.warning("PROMETHEUS_MULTIPROC_DIR unset – /metrics is per worker")
+        return
+    shutil.rmtree(path, ignore_errors=True)          # stale files of a previous run
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,488 @@
+# jobs.py
+"""
+Bulk scoring jobs: upload a CSV or Parquet file of transactions, get a job
+ID, poll progress, download results while they are produced.
+
+    POST /jobs                  multipart ``file`` → {"id": …, "state": "queued"}
+    GET  /jobs/{id}             state, rows_done / rows_total, rows_per_s
+    GET  /jobs/{id}/results     CSV scored so far (row, [trans_num,]
+                                fraud_probability, prediction)
+    POST /jobs/{id}/cancel
+
+The file may be in the raw schema (``trans_date_trans_time``, ``merchant``,
+… as in data/raw) or the featurized one (``tx_hour``, one-hot columns, as in
+train.parquet).  Raw rows go through the pipeline's own ``featurize.transform``
+(imported from ``FEATURIZE_DIR``) with the vocabulary at ``JOB_VOCAB``;
+velocity features carry each card's history from one chunk into the next
+(``velocity.ChunkedVelocity``), so they match training's for a file in time
+order.
+
+Everything lives on local disk under ``JOBS_DIR/<id>/``: the upload, a
+``status.json`` rewritten atomically after every chunk, the results CSV and
+``claim`` / ``cancel`` marker files.  The API only writes the upload and the
+markers; a separate worker process (``python jobs.py worker``, any number
+of them) claims queued jobs with an O_EXCL ``claim`` file holding its
+``host:pid`` and reads each file in ``JOB_CHUNK_ROWS`` chunks, so memory is
+bounded by one chunk whatever the file size.  Chunks are scored in
+``JOB_SCORE_BATCH`` rows per ``/invocations`` call, or in-process when
+``JOB_MODEL_URI`` names a local MLflow model – then nothing but the disk is
+needed.
+
+Model inputs are the local booster's own ``feature_name()``, in that
+order; for the server, the feature columns of the featurized training
+parquet at ``JOB_FEATURES`` (the ones train.py logs in the signature).
+
+Every chunk refreshes ``updated_at`` in ``status.json``: a claimed job whose
+heartbeat is older than ``JOB_STALE_SECONDS`` lost its worker and is queued
+again from the start, at most ``JOB_MAX_ATTEMPTS`` times in all.  Keep the
+timeout well above the time one chunk takes to score.
+
+A download returns the results up to the byte count in ``status.json``, so
+it never ends in a half-written row.
+
+Usage
+-----
+python jobs.py worker [--once]                    # serve queued jobs
+JOB_MODEL_URI=mlruns/…/model JOBS_DIR=/tmp/jobs \
+    python jobs.py run day.csv                    # one file, locally
+"""
+import argparse, json, logging, os, re, socket, sys, time, uuid
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+
+from auth import get_current_user
+from decision import label
+
+HERE = Path(__file__).resolve().parent
+JOBS_DIR = Path(os.getenv("JOBS_DIR", "/data/jobs"))
+FEATURIZE_DIR = Path(os.getenv("FEATURIZE_DIR", HERE.parents[1] / "airflow" / "scripts"))
+JOB_VOCAB = Path(os.getenv("JOB_VOCAB", "/opt/airflow/data/processed/train.vocab.json"))
+JOB_FEATURES = Path(os.getenv("JOB_FEATURES", "/opt/airflow/data/processed/train.parquet"))
+JOB_MODEL_URI = os.getenv("JOB_MODEL_URI")        # local model instead of the server
+MODEL_ENDPOINT = os.getenv("MODEL_ENDPOINT", "http://localhost:5001/invocations")
+CHUNK_ROWS = int(os.getenv("JOB_CHUNK_ROWS", 50_000))
+SCORE_BATCH = int(os.getenv("JOB_SCORE_BATCH", 5_000))
+MAX_UPLOAD_BYTES = int(os.getenv("JOB_MAX_UPLOAD_BYTES", 4 << 30))
+STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", 600))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+UPLOAD_CHUNK = 1 << 20
+POLL_SECONDS = 1.0
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet"}
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINAL = (DONE, FAILED, CANCELLED)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+log = logging.getLogger(__name__)
+router_jobs = APIRouter(prefix="/jobs", tags=["jobs"])
+
+# ─── Job files ─────────────────────────────────────────────────────────────────
+
+def job_dir(job_id: str) -> Path:
+    if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+        raise HTTPException(404, "Job not found")
+    return JOBS_DIR / job_id
+
+
+def read_status(path: Path) -> dict:
+    return json.loads((path / "status.json").read_text())
+
+
+def write_status(path: Path, status: dict) -> None:
+    status["updated_at"] = time.time()
+    tmp = path / f"status.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(status, indent=2))
+    os.replace(tmp, path / "status.json")
+
+
+def claim(path: Path) -> bool:
+    """Take a job for this process; False if someone else has it."""
+    try:
+        fd = os.open(path / "claim", os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as f:
+        f.write(WORKER_ID)
+    return True
+
+
+def heartbeat(path: Path, status: dict, claim_file: str = "claim") -> float:
+    """Last sign of life of a claimed job: its status write or its claim."""
+    try:
+        claimed = (path / claim_file).stat().st_mtime
+    except FileNotFoundError:
+        claimed = 0.0
+    return max(status.get("updated_at") or 0.0, claimed)
+
+
+def release_stale(path: Path) -> bool:
+    """Re-queue a job whose worker died; False if it is alive or taken.
+
+    The claim is renamed away first – only one worker's rename succeeds –
+    and put back if by then it is a live worker's fresh claim.
+    """
+    stale = f"claim.{uuid.uuid4().hex}"
+    try:
+        os.rename(path / "claim", path / stale)
+    except FileNotFoundError:
+        return False
+    status = read_status(path)
+    if status["state"] in FINAL or time.time() - heartbeat(path, status, stale) < STALE_SECONDS:
+        os.rename(path / stale, path / "claim")
+        return False
+    (path / stale).unlink()
+    attempts = status.get("attempts", 0)
+    log.warning(f"job {status['id']}: worker {status.get('worker')} silent for "
+                f"{STALE_SECONDS:.0f}s after attempt {attempts}/{MAX_ATTEMPTS}")
+    if attempts >= MAX_ATTEMPTS:
+        if claim(path):
+            status.update(state=FAILED, finished_at=time.time(),
+                          error=f"worker lost on {attempts} attempts")
+            write_status(path, status)
+        return False
+    status.update(state=QUEUED, rows_done=0, result_bytes=0, rows_per_s=None,
+                  started_at=None, worker=None)
+    write_status(path, status)
+    return True
+
+
+def input_file(path: Path, status: dict) -> Path:
+    return path / f"input.{status['format']}"
+
+
+def inspect(path: Path, fmt: str) -> tuple[str, int | None]:
+    """(schema, row count) of an uploaded file; raises ValueError if unusable."""
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        meta = pq.ParquetFile(path).metadata
+        columns, rows = meta.schema.names, meta.num_rows
+    else:
+        columns, rows = list(pd.read_csv(path, nrows=0).columns), None
+    if "trans_date_trans_time" in columns:
+        return "raw", rows
+    if "tx_hour" in columns:
+        return "featurized", rows
+    raise ValueError("neither the raw (trans_date_trans_time, …) nor the "
+                     "featurized (tx_hour, …) schema")
+
+
+def create_job(src, filename: str, owner: str, jobs_dir: Path = JOBS_DIR) -> dict:
+    """Copy an uploaded stream into a new queued job."""
+    fmt = FORMATS.get(Path(filename or "").suffix.lower())
+    if fmt is None:
+        raise HTTPException(415, f"Upload a {', '.join(FORMATS)} file")
+    job_id = uuid.uuid4().hex
+    path = jobs_dir / job_id
+    path.mkdir(parents=True)
+    size = lines = 0
+    last = b"\n"
+    with open(path / f"input.{fmt}", "wb") as out:
+        while chunk := src.read(UPLOAD_CHUNK):
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                out.close()
+                _remove(path)
+                raise HTTPException(413, f"File larger than {MAX_UPLOAD_BYTES} bytes")
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+            out.write(chunk)
+    try:
+        schema, rows = inspect(path / f"input.{fmt}", fmt)
+    except Exception as err:
+        _remove(path)
+        raise HTTPException(422, f"Unreadable {fmt} file: {err}")
+    if rows is None:                       # CSV: lines minus the header
+        rows = max(0, lines - 1 + (last != b"\n"))
+    status = {
+        "id": job_id, "owner": owner, "filename": filename, "format": fmt,
+        "schema": schema, "state": QUEUED, "bytes": size,
+        "rows_total": rows, "rows_done": 0, "rows_per_s": None,
+        "result_bytes": 0, "error": None,
+        "created_at": time.time(), "started_at": None, "finished_at": None,
+    }
+    write_status(path, status)
+    return status
+
+
+def _remove(path: Path) -> None:
+    for p in path.iterdir():
+        p.unlink()
+    path.rmdir()
+
+# ─── API ───────────────────────────────────────────────────────────────────────
+
+def owned(job_id: str, user: str) -> tuple[Path, dict]:
+    path = job_dir(job_id)
+    if not (path / "status.json").exists():
+        raise HTTPException(404, "Job not found")
+    status = read_status(path)
+    if status["owner"] != user:
+        raise HTTPException(404, "Job not found")
+    return path, status
+
+
+def public(path: Path, status: dict) -> dict:
+    out = {k: v for k, v in status.items() if k not in ("owner", "worker")}
+    if status["state"] in (QUEUED, RUNNING) and (path / "cancel").exists():
+        out["state"] = "cancelling"
+    if status["rows_total"]:
+        out["progress"] = round(status["rows_done"] / status["rows_total"], 4)
+    return out
+
+
+@router_jobs.post("", status_code=202)
+def submit(file: UploadFile = File(...), user: str = Depends(get_current_user)):
+    status = create_job(file.file, file.filename, user, JOBS_DIR)
+    return public(JOBS_DIR / status["id"], status)
+
+
+@router_jobs.get("/{job_id}")
+def job_status(job_id: str, user: str = Depends(get_current_user)):
+    return public(*owned(job_id, user))
+
+
+@router_jobs.get("/{job_id}/results")
+def results(job_id: str, user: str = Depends(get_current_user)):
+    path, status = owned(job_id, user)
+    if not (path / "results.csv").exists():
+        raise HTTPException(409, f"No results yet (job {status['state']})")
+    committed = status["result_bytes"]
+
+    def body():
+        with open(path / "results.csv", "rb") as f:
+            left = committed
+            while left and (chunk := f.read(min(UPLOAD_CHUNK, left))):
+                left -= len(chunk)
+                yield chunk
+
+    return StreamingResponse(body(), media_type="text/csv", headers={
+        "Content-Disposition": f'attachment; filename="{job_id}.csv"',
+        "X-Job-State": status["state"],
+        "X-Rows-Done": str(status["rows_done"]),
+    })
+
+
+@router_jobs.post("/{job_id}/cancel")
+def cancel(job_id: str, user: str = Depends(get_current_user)):
+    path, status = owned(job_id, user)
+    if status["state"] in FINAL:
+        return public(path, status)
+    (path / "cancel").touch()
+    if claim(path):                        # still queued: no worker will pick it up
+        status.update(state=CANCELLED, finished_at=time.time())
+        write_status(path, status)
+    return public(path, read_status(path))
+
+# ─── Worker ────────────────────────────────────────────────────────────────────
+
+class Cancelled(Exception):
+    pass
+
+
+def served_columns(parquet: Path = JOB_FEATURES) -> tuple[list[str], list[str]]:
+    """The served model's input columns and which of them are one-hot booleans.
+
+    Selected from the featurized training parquet as train.py's
+    ``load_training_data`` selects them.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from featurize import SPLIT_COL
+    from merged_store import VERSION_COL
+
+    fields = [f for f in pq.read_schema(parquet)
+              if f.name not in ("label", VERSION_COL, SPLIT_COL)
+              and (pa.types.is_boolean(f.type) or pa.types.is_integer(f.type)
+                   or pa.types.is_floating(f.type))]
+    names = [re.sub(r"[^\w]", "_", f.name) for f in fields]
+    return names, [n for n, f in zip(names, fields) if pa.types.is_boolean(f.type)]
+
+
+def read_chunks(path: Path, status: dict):
+    """Frames of at most CHUNK_ROWS rows, in the file's own schema."""
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    file = input_file(path, status)
+    if status["format"] == "parquet":
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=CHUNK_ROWS):
+            yield batch.to_pandas()
+    elif status["schema"] == "raw":
+        from raw_io import FEATURE_COLUMNS, iter_raw
+        yield from iter_raw(file, FEATURE_COLUMNS, CHUNK_ROWS)
+    else:
+        yield from pd.read_csv(file, chunksize=CHUNK_ROWS)
+
+
+class Scorer:
+    """Chunk → model inputs → fraud probabilities, for one job's schema."""
+
+    def __init__(self, schema: str):
+        import requests
+
+        self.schema = schema
+        self.vocab = json.loads(JOB_VOCAB.read_text()) if schema == "raw" else None
+        self.model = None
+        if JOB_MODEL_URI:
+            import mlflow.lightgbm
+            from mlflow.exceptions import MlflowException
+            try:
+                self.model = mlflow.lightgbm.load_model(JOB_MODEL_URI)
+            except MlflowException:         # versions logged with the sklearn flavour
+                import mlflow.sklearn
+                self.model = mlflow.sklearn.load_model(JOB_MODEL_URI).booster_
+            # the booster takes columns by position: its own order
+            self.columns, self.bools = list(self.model.feature_name()), []
+        else:
+            self.columns, self.bools = served_columns()
+        self.http = requests.Session()
+        self.velocity = None
+        if schema == "raw":
+            from velocity import ChunkedVelocity
+            self.velocity = ChunkedVelocity()
+
+    def features(self, chunk):
+        import pandas as pd
+        from velocity_store import EMPTY
+
+        if self.schema == "raw":
+            import velocity
+            from featurize import CAT_COLS, transform
+            from raw_io import DATE_FORMATS
+            for col, fmt in DATE_FORMATS.items():   # Parquet may hold them as text
+                if col in chunk and not pd.api.types.is_datetime64_any_dtype(chunk[col]):
+                    chunk[col] = pd.to_datetime(chunk[col], format=fmt)
+            if set(velocity.INPUT_COLS) <= set(chunk.columns):
+                chunk[velocity.VELOCITY_COLS] = self.velocity.features(chunk)
+            chunk = transform(chunk, self.vocab)
+            chunk = pd.get_dummies(chunk, columns=[c for c in CAT_COLS if c in chunk.columns])
+            chunk.columns = [re.sub(r"[^\w]", "_", c) for c in chunk.columns]
+        X = chunk.reindex(columns=self.columns, fill_value=0)   # one-hot levels absent
+        for col in self.columns:
+            if col in EMPTY and col not in chunk.columns:
+                X[col] = EMPTY[col]         # file predates velocity features
+        X[self.bools] = X[self.bools].fillna(False).astype(bool)
+        return X
+
+    def score(self, X, cancelled) -> list[float]:
+        import numpy as np
+
+        if self.model is not None:
+            return self.model.predict(X.astype(np.float32)).tolist()
+        proba = []
+        for pos in range(0, len(X), SCORE_BATCH):
+            if cancelled():
+                raise Cancelled
+            records = X.iloc[pos:pos + SCORE_BATCH].to_dict("records")
+            resp = self.http.post(MODEL_ENDPOINT, json={"inputs": records}, timeout=120)
+            resp.raise_for_status()
+            proba += resp.json()["predictions"]
+        return proba
+
+
+def process(path: Path) -> dict:
+    """Score one claimed job to completion, failure or cancellation."""
+    import pandas as pd
+
+    status = read_status(path)
+    cancelled = (path / "cancel").exists
+    status.update(state=RUNNING, started_at=time.time(), worker=WORKER_ID,
+                  attempts=status.get("attempts", 0) + 1)
+    write_status(path, status)
+    try:
+        if str(FEATURIZE_DIR) not in sys.path:
+            sys.path.append(str(FEATURIZE_DIR))
+        scorer = Scorer(status["schema"])
+        with open(path / "results.csv", "w", newline="") as out:
+            offset = 0
+            for chunk in read_chunks(path, status):
+                if cancelled():
+                    raise Cancelled
+                trans_num = chunk["trans_num"].to_numpy() if "trans_num" in chunk else None
+                proba = scorer.score(scorer.features(chunk), cancelled)
+                result = pd.DataFrame({"row": range(offset, offset + len(proba))})
+                if trans_num is not None:
+                    result["trans_num"] = trans_num
+                result["fraud_probability"] = proba
+                result["prediction"] = [label(p) for p in proba]
+                result.to_csv(out, header=offset == 0, index=False)
+                out.flush()
+                offset += len(result)
+                elapsed = time.time() - status["started_at"]
+                status.update(rows_done=offset, result_bytes=out.tell(),
+                              rows_per_s=round(offset / elapsed, 1) if elapsed else None)
+                write_status(path, status)              # also the heartbeat
+        status["state"] = DONE
+    except Cancelled:
+        status["state"] = CANCELLED
+    except Exception as err:
+        log.exception(f"job {status['id']} failed")
+        status.update(state=FAILED, error=f"{type(err).__name__}: {err}")
+    status["finished_at"] = time.time()
+    write_status(path, status)
+    return status
+
+
+def next_job(jobs_dir: Path = JOBS_DIR) -> Path | None:
+    """Claim the oldest queued job, or None; re-queues jobs of dead workers."""
+    queued = []
+    for status_file in jobs_dir.glob("*/status.json"):
+        try:
+            status = json.loads(status_file.read_text())
+        except (OSError, ValueError):
+            continue
+        path = status_file.parent
+        if status["state"] in FINAL:
+            continue
+        if (path / "claim").exists():
+            if time.time() - heartbeat(path, status) < STALE_SECONDS \
+                    or not release_stale(path):
+                continue
+        queued.append((status["created_at"], path))
+    for _, path in sorted(queued):
+        if claim(path):
+            return path
+    return None
+
+
+def worker(once: bool = False) -> None:
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    while True:
+        path = next_job()
+        if path is None:
+            if once:
+                return
+            time.sleep(POLL_SECONDS)
+            continue
+        status = process(path)
+        log.info(f"job {status['id']}: {status['state']}, {status['rows_done']} rows, "
+                 f"{status['rows_per_s']} rows/s")
+
+# ─── CLI ───────────────────────────────────────────────────────────────────────
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    ap = argparse.ArgumentParser(description="Bulk scoring jobs")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("worker", help="Process queued jobs under JOBS_DIR")
+    w.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    r = sub.add_parser("run", help="Submit one local file and score it here")
+    r.add_argument("file", type=Path)
+    args = ap.parse_args()
+
+    if args.cmd == "worker":
+        worker(args.once)
+    else:
+        JOBS_DIR.mkdir(parents=True, exist_ok=True)
+        with open(args.file, "rb") as src:
+            job = create_job(src, args.file.name, "local")
+        path = JOBS_DIR / job["id"]
+        claim(path)
+        status = process(path)
+        print(json.dumps(public(path, status), indent=2))
+        print(f"results: {path / 'results.csv'}")
+        sys.exit(0 if status["state"] == DONE else 1)
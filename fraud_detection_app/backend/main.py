@@ -2,19 +2,40 @@ from fastapi import FastAPI, Depends, Request, HTTPException
 from prometheus_fastapi_instrumentator import Instrumentator
 import pandas as pd, os
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 from prometheus_client import Counter
 from pydantic import BaseModel, Field, conint, confloat
 import requests
 import json
+import logging, time
+import redis
+from velocity_store import EMPTY, VelocityStore
+from admission import Admission, CircuitBreaker, CircuitOpen
+from decision import label
 
 MODEL_ENDPOINT = os.getenv("MODEL_ENDPOINT", "http://localhost:5001/invocations")
-FRAUD_THRESHOLD = float(os.getenv("FRAUD_THRESHOLD", 0.8))
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "your_gemini_api_key")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
 GEMINI_URL   = (
-    f"https://generativelanguage.googleapis.com/v1beta/models/"
+    f"{GEMINI_BASE_URL}/v1beta/models/"
     f"{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
 )
+MODEL_TIMEOUT  = float(os.getenv("MODEL_TIMEOUT", 5))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", 15))
+
+# per-client req/s and burst, in-flight cap per worker (sum < 40 threads)
+PREDICT_RATE      = float(os.getenv("PREDICT_RATE", 50))
+PREDICT_BURST     = float(os.getenv("PREDICT_BURST", 100))
+PREDICT_IN_FLIGHT = int(os.getenv("PREDICT_IN_FLIGHT", 24))
+EXPLAIN_RATE      = float(os.getenv("EXPLAIN_RATE", 2))
+EXPLAIN_BURST     = float(os.getenv("EXPLAIN_BURST", 10))
+EXPLAIN_IN_FLIGHT = int(os.getenv("EXPLAIN_IN_FLIGHT", 8))
+BREAKER_FAILURES    = int(os.getenv("BREAKER_FAILURES", 5))
+BREAKER_RESET_AFTER = float(os.getenv("BREAKER_RESET_AFTER", 10))
+REDIS_URL  = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+LATEST_TTL = int(os.getenv("LATEST_TTL_SECONDS", 86_400))
 # ─── Models ────────────────────────────────────────────────────────────────────
 
 class InputForm(BaseModel):
@@ -72,6 +93,10 @@ class InputForm(BaseModel):
     region_South:     bool = False
     region_West:      bool = False
 
+    # card and event time – not model inputs, they key the velocity features
+    cc_num:    int | None = None
+    unix_time: int | None = None
+
 
 class Feedback(BaseModel):
     prediction: str       # "fraud" or "not_fraud"
@@ -79,16 +104,31 @@ class Feedback(BaseModel):
 
 # ─── Load & App Setup ─────────────────────────────────────────────────────────
 
-app = FastAPI(title="Fraud‑Detection API")
-app.state.latest: dict[str, dict] = {}      # { user_id → {"features":…, "prediction":…, "proba":…} }
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # per-worker clients, opened after gunicorn forks (gunicorn_conf.py)
+    app.state.http = requests.Session()          # keep-alive to model & Gemini
+    pool = requests.adapters.HTTPAdapter(pool_maxsize=PREDICT_IN_FLIGHT + EXPLAIN_IN_FLIGHT)
+    app.state.http.mount("http://", pool)
+    app.state.http.mount("https://", pool)
+    app.state.redis = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    app.state.velocity = VelocityStore(app.state.redis)
+    yield
+    app.state.http.close()
+    app.state.redis.close()
+
+
+app = FastAPI(title="Fraud‑Detection API", lifespan=lifespan)
 # Instrument before startup
 Instrumentator().instrument(app).expose(app)
 
 # Routers & CORS
 from auth import router as auth_router, get_current_user
 from clients import router_clients
+from jobs import router_jobs
 app.include_router(auth_router, prefix="/auth")
 app.include_router(router_clients)
+app.include_router(router_jobs)
 
 app.add_middleware(
     CORSMiddleware,
@@ -157,6 +197,60 @@ MODEL_PREDICT_FN = Counter(
     ["client"]
 )
 
+VELOCITY_FALLBACK = Counter(
+    "velocity_fallback_total",
+    "Predictions scored with empty velocity features because Redis failed",
+)
+
+# ─── Admission control & circuit breakers ─────────────────────────────────────
+
+admit_predict = Admission("/predict", PREDICT_RATE, PREDICT_BURST, PREDICT_IN_FLIGHT)
+admit_explain = Admission("/explain", EXPLAIN_RATE, EXPLAIN_BURST, EXPLAIN_IN_FLIGHT)
+MODEL_BREAKER  = CircuitBreaker("model", BREAKER_FAILURES, BREAKER_RESET_AFTER)
+GEMINI_BREAKER = CircuitBreaker("gemini", BREAKER_FAILURES, BREAKER_RESET_AFTER)
+
+
+@app.exception_handler(CircuitOpen)
+async def circuit_open(request: Request, err: CircuitOpen):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(err)},
+        headers={"Retry-After": str(max(1, round(err.retry_after)))},
+    )
+
+
+def velocity_features(payload: InputForm) -> dict[str, float]:
+    """Update the card's velocity state; empty features without a card or Redis."""
+    if payload.cc_num is None:
+        return dict(EMPTY)
+    try:
+        return app.state.velocity.update(
+            payload.cc_num, payload.unix_time or int(time.time()),
+            payload.amt, payload.merch_lat, payload.merch_long)
+    except redis.RedisError as err:
+        VELOCITY_FALLBACK.inc()
+        logging.warning(f"velocity features unavailable: {err}")
+        return dict(EMPTY)
+
+
+# Last prediction per user, in Redis so every worker sees it
+# ({"features":…, "prediction":…, "proba":…})
+
+def remember_latest(user_id: str, record: dict) -> None:
+    try:
+        app.state.redis.set(f"latest:{user_id}", json.dumps(record), ex=LATEST_TTL)
+    except redis.RedisError as err:
+        logging.warning(f"latest prediction not stored: {err}")
+
+
+def recall_latest(user_id: str) -> dict | None:
+    try:
+        raw = app.state.redis.get(f"latest:{user_id}")
+    except redis.RedisError as err:
+        logging.warning(f"latest prediction unavailable: {err}")
+        return None
+    return json.loads(raw) if raw else None
+
 # ─── Middleware for call counting ──────────────────────────────────────────────
 
 @app.middleware("http")
@@ -197,35 +291,37 @@ async def count_calls(request: Request, call_next):
 # ─── Endpoints ─────────────────────────────────────────────────────────────────
 
 @app.post("/predict")
-def predict(payload: InputForm, user=Depends(get_current_user)):
-    features = payload.model_dump()             # → plain dict ready for JSON
-    resp = requests.post(
-        MODEL_ENDPOINT,
-        json={"inputs": [features]},
-        timeout=5,
-    )
-    resp.raise_for_status()
+def predict(payload: InputForm, user=Depends(admit_predict)):
+    features = payload.model_dump(exclude={"cc_num", "unix_time"})   # → plain dict ready for JSON
+    features.update(velocity_features(payload))
+    with MODEL_BREAKER:
+        resp = app.state.http.post(
+            MODEL_ENDPOINT,
+            json={"inputs": [features]},
+            timeout=MODEL_TIMEOUT,
+        )
+        resp.raise_for_status()
     proba = resp.json()["predictions"][0]
-    prediction = "fraud" if proba >= FRAUD_THRESHOLD else "not_fraud"
+    prediction = label(proba)
 
     user_id = getattr(user, "email", "anon")
-    app.state.latest[user_id] = {
+    remember_latest(user_id, {
         "features": features,
         "prediction": prediction,
         "proba": proba,
-    }
+    })
 
     return {"fraud_probability": proba, "prediction": prediction}
 
 @app.get("/explain/latest")
 def explain_latest(user=Depends(get_current_user)):
     """Return the last input + prediction for this user (or empty {})."""
-    return app.state.latest.get(getattr(user, "email", "anon"), {})
+    return recall_latest(getattr(user, "email", "anon")) or {}
 
 @app.get("/explain/prompt")
 def get_prompt(user=Depends(get_current_user)):
     user_id = getattr(user, "email", "anon")
-    payload = app.state.latest.get(user_id)
+    payload = recall_latest(user_id)
     if not payload:
         raise HTTPException(404, "No prompt available; please run /predict first")
 
@@ -245,7 +341,7 @@ def get_prompt(user=Depends(get_current_user)):
 
 
 @app.post("/explain")
-def explain(body: dict, user=Depends(get_current_user)):
+def explain(body: dict, user=Depends(admit_explain)):
     user_id = getattr(user, "email", "anon")
 
     # If the client sent us a raw prompt, use it directly
@@ -253,7 +349,7 @@ def explain(body: dict, user=Depends(get_current_user)):
         prompt = body["prompt"]
     else:
         # else fall back to old behavior: build prompt from stored payload
-        payload = body or app.state.latest.get(user_id)
+        payload = body or recall_latest(user_id)
         if not payload:
             raise HTTPException(400, "No previous prediction found; please run /predict first")
 
@@ -272,10 +368,14 @@ def explain(body: dict, user=Depends(get_current_user)):
     # Call Gemini
     payload = {"contents": [{"parts": [{"text": prompt}]}]}
     try:
-        gresp = requests.post(GEMINI_URL, json=payload, timeout=15)
-        gresp.raise_for_status()
+        with GEMINI_BREAKER:
+            gresp = app.state.http.post(GEMINI_URL, json=payload, timeout=GEMINI_TIMEOUT)
+            gresp.raise_for_status()
         data = gresp.json()
         explanation = data["candidates"][0]["content"]["parts"][0]["text"].strip()
+    except CircuitOpen:
+        MODEL_EXPLAIN_FAILURE.labels(client=user_id).inc()
+        raise
     except Exception as err:
         MODEL_EXPLAIN_FAILURE.labels(client=user_id).inc()
         raise HTTPException(500, f"Gemini error: {err}")
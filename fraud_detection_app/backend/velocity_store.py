@@ -0,0 +1,113 @@
+# velocity_store.py
+"""
+Per-card velocity features, maintained incrementally in Redis for serving.
+
+The online twin of airflow/scripts/velocity.py (training): same features,
+same values.  Per card, under one hash tag so a cluster keeps them on one
+slot:
+
+* ``vel:{cc}:1h`` / ``vel:{cc}:24h``         – lists of "ts:cents", oldest first
+* ``vel:{cc}:1h:sum`` / ``vel:{cc}:24h:sum`` – running cent sums of the lists
+* ``vel:{cc}``                               – hash of the last ts / lat / long
+
+One Lua script per transaction evicts entries that left each window,
+reads count (LLEN) and sum, appends the new entry and swaps in the new
+"last" – one round trip, atomic per card, amortized O(1): every entry is
+pushed and popped once per window.  Window keys expire one window after the
+last write, so an idle card's counters vanish together; the last-transaction
+hash lives ``MAX_GAP`` seconds, which training mirrors.
+
+Amounts are kept in integer cents, so sums are exact.  Transactions of one
+card must arrive in non-decreasing ``unix_time``; a retried request counts
+twice.
+"""
+import math, os
+
+import redis
+
+WINDOWS = {"1h": 3600, "24h": 86_400}
+MAX_GAP = 30 * 86_400
+NO_HISTORY = -1.0
+EARTH_KM = 6371.0088
+KEY_PREFIX = "vel:"
+VELOCITY_COLS = [
+    *(f"vel_{kind}_{name}" for name in WINDOWS for kind in ("count", "amt")),
+    "vel_secs_since_last", "vel_km_from_last",
+]
+# what a card with no recent history – or no card number – gets
+EMPTY = {**dict.fromkeys(VELOCITY_COLS, 0.0),
+         "vel_secs_since_last": NO_HISTORY, "vel_km_from_last": NO_HISTORY}
+
+# KEYS: last-hash, then (list, sum) per window.  ARGV: ts, cents, lat, long,
+# MAX_GAP, then one window length per (list, sum) pair.
+_UPDATE = """
+local ts, cents = tonumber(ARGV[1]), tonumber(ARGV[2])
+local out = {}
+for i = 1, (#KEYS - 1) / 2 do
+  local list, total, w = KEYS[2 * i], KEYS[2 * i + 1], tonumber(ARGV[5 + i])
+  while true do
+    local head = redis.call('LINDEX', list, 0)
+    if not head then break end
+    local sep = string.find(head, ':', 1, true)
+    if tonumber(string.sub(head, 1, sep - 1)) > ts - w then break end
+    redis.call('LPOP', list)
+    redis.call('DECRBY', total, string.sub(head, sep + 1))
+  end
+  out[#out + 1] = redis.call('LLEN', list)
+  out[#out + 1] = tonumber(redis.call('GET', total) or 0)
+  redis.call('RPUSH', list, ARGV[1] .. ':' .. ARGV[2])
+  redis.call('INCRBY', total, cents)
+  redis.call('EXPIRE', list, w)
+  redis.call('EXPIRE', total, w)
+end
+local last = redis.call('HMGET', KEYS[1], 'ts', 'lat', 'long')
+redis.call('HSET', KEYS[1], 'ts', ARGV[1], 'lat', ARGV[3], 'long', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+out[#out + 1] = last[1] or ''
+out[#out + 1] = last[2] or ''
+out[#out + 1] = last[3] or ''
+return out
+"""
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_KM * math.asin(math.sqrt(a))
+
+
+class VelocityStore:
+    def __init__(self, client: redis.Redis | None = None, prefix: str = KEY_PREFIX):
+        self.r = client or redis.Redis.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+        self.prefix = prefix
+        self._update = self.r.register_script(_UPDATE)
+
+    def keys(self, cc_num: int) -> list[str]:
+        card = f"{self.prefix}{{{cc_num}}}"
+        return [card, *(f"{card}:{name}{suffix}"
+                        for name in WINDOWS for suffix in ("", ":sum"))]
+
+    def update(self, cc_num: int, unix_time: int, amt: float,
+               merch_lat: float, merch_long: float) -> dict[str, float]:
+        """Record one transaction; return its features (history before it)."""
+        ts, cents = int(unix_time), int(round(amt * 100))
+        reply = self._update(
+            keys=self.keys(cc_num),
+            args=[ts, cents, repr(float(merch_lat)), repr(float(merch_long)),
+                  MAX_GAP, *WINDOWS.values()],
+        )
+        *windows, last_ts, last_lat, last_long = reply
+        features = {}
+        for i, name in enumerate(WINDOWS):
+            features[f"vel_count_{name}"] = float(windows[2 * i])
+            features[f"vel_amt_{name}"] = int(windows[2 * i + 1]) / 100
+        gap = ts - int(last_ts) if last_ts else None
+        if gap is None or gap > MAX_GAP:
+            features["vel_secs_since_last"] = features["vel_km_from_last"] = NO_HISTORY
+        else:
+            features["vel_secs_since_last"] = float(gap)
+            features["vel_km_from_last"] = haversine_km(
+                float(last_lat), float(last_long), float(merch_lat), float(merch_long))
+        return features
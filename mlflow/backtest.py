@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# mlflow/backtest.py
+# ---------------------------------------------------------------
+"""
+Champion/challenger backtest: replay raw versions through featurization and
+score them with two registered ``fraud_model`` versions.
+
+Each raw version is columnarized once and cut into row slices; a process
+pool takes one slice at a time and streams it in ``CHUNK_ROWS`` chunks, so
+memory is bounded by the chunk size, not the history.  Each chunk is
+featurized per model with the vocabulary that model was trained on
+(``featurize/*.vocab.json`` in its run) and scored with one vectorized
+``predict_proba`` call per model.  Velocity features carry each card's
+history across chunk, slice and version boundaries
+(``velocity.ChunkedVelocity``): a slice first streams the five card columns
+of the rows up to ``MAX_GAP`` before its first row – the end of every
+earlier raw version, then its own file – located by binary search on the
+Arrow copies' ``unix_time``.  That equals training's velocity over the
+merged store when drops are in time order and do not overlap; rows the
+merged store drops as duplicates of an earlier version still count here.
+
+Nothing per row is kept: every (version, month) cell accumulates score
+histograms per label – AUC is computed from those, exact to 1/SCORE_BINS –
+plus confusion counts at ``FRAUD_THRESHOLD`` and champion/challenger
+disagreement.
+
+Usage
+-----
+python backtest.py v2 v3 v4 --champion Production --challenger 12 \
+    [--threshold 0.8] [--workers 4] [--out backtest.csv]
+"""
+import argparse, json, multiprocessing as mp, os, sys, tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import mlflow
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+from mlflow.tracking import MlflowClient
+
+# /opt/mlflow/backtest.py → /opt/airflow/scripts (same layout in the repo)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "airflow" / "scripts"))
+from featurize import CAT_COLS, transform
+from merged_store import list_versions, version_csv, version_key
+from raw_io import CHUNK_ROWS, FEATURE_COLUMNS, columnarize, iter_raw
+from train import MODEL_NAME, load_model, sanitize
+from velocity import INPUT_COLS, MAX_GAP, VELOCITY_COLS, ChunkedVelocity
+
+RAW_DIR = Path("/opt/airflow/data/raw")
+FRAUD_THRESHOLD = float(os.getenv("FRAUD_THRESHOLD", 0.8))   # as the backend
+SCORE_BINS = 10_000
+SLICE_ROWS = 2_000_000       # rows per pool task
+MODELS = ("champion", "challenger")
+
+_worker: dict = {}
+
+
+# ---------------------------------------------------------------
+def resolve(client: MlflowClient, spec: str):
+    """A registry stage ('Production') or a version number ('12')."""
+    if spec.isdigit():
+        return client.get_model_version(MODEL_NAME, spec)
+    found = client.get_latest_versions(MODEL_NAME, stages=[spec])
+    if not found:
+        raise SystemExit(f"no {MODEL_NAME} version in stage {spec!r}")
+    return found[0]
+
+
+def fetch(client: MlflowClient, spec: str, dst: Path) -> dict:
+    """Download a model version and its featurization vocabulary."""
+    mv = resolve(client, spec)
+    model_dir = mlflow.artifacts.download_artifacts(
+        artifact_uri=f"models:/{MODEL_NAME}/{mv.version}", dst_path=str(dst / "model"))
+    try:
+        vocab_dir = Path(client.download_artifacts(mv.run_id, "featurize", str(dst)))
+        vocab = json.loads(next(vocab_dir.glob("*.vocab.json")).read_text())
+    except (StopIteration, OSError, mlflow.exceptions.MlflowException):
+        raise SystemExit(f"{MODEL_NAME} v{mv.version} has no featurize vocabulary; "
+                         "it predates backtest support") from None
+    return {"version": mv.version, "model_dir": model_dir, "vocab": vocab}
+
+
+def featurize_chunk(chunk: pd.DataFrame, vocab: dict, columns: list[str]) -> pd.DataFrame:
+    """Training features for a raw chunk, aligned to one model's columns.
+
+    ``chunk`` already carries ``VELOCITY_COLS`` (see ``_score_slice``).
+    One-hot here keeps every level; reindexing drops the level training's
+    ``drop_first`` dropped and zero-fills levels absent from the chunk.
+    """
+    df = transform(chunk.copy(), vocab)
+    df = pd.get_dummies(df, columns=[c for c in CAT_COLS if c in df.columns])
+    df.columns = sanitize(list(df.columns))
+    return df.reindex(columns=columns, fill_value=0).astype(np.float32)
+
+
+def _cell() -> dict:
+    return {"hist": np.zeros((len(MODELS), 2, SCORE_BINS), dtype=np.int64),
+            "conf": np.zeros((len(MODELS), 3), dtype=np.int64),   # tp, fp, fn
+            "rows": 0, "disagree": 0, "abs_diff": 0.0}
+
+
+# ---------------------------------------------------------------
+def _init_worker(specs: list[dict], threshold: float) -> None:
+    models = []
+    for spec in specs:
+        model = load_model(spec["model_dir"])
+        models.append((model, spec["vocab"], list(model.booster_.feature_name())))
+    _worker.update(models=models, threshold=threshold)
+
+
+def _score_slice(version: str, csv: str, start: int, stop: int,
+                 history: list[tuple[str, int, int]]) -> dict:
+    threshold, cells = _worker["threshold"], {}
+    velocity = ChunkedVelocity()
+    for path, lo, hi in history:
+        for head in iter_raw(path, INPUT_COLS, CHUNK_ROWS, lo, hi):
+            velocity.warm(head)
+    for chunk in iter_raw(csv, FEATURE_COLUMNS, CHUNK_ROWS, start, stop):
+        chunk[VELOCITY_COLS] = velocity.features(chunk)
+        month = chunk["trans_date_trans_time"].dt.strftime("%Y-%m").to_numpy()
+        y = chunk["is_fraud"].to_numpy().astype(np.int8)
+        built: dict = {}
+        proba = []
+        for model, vocab, columns in _worker["models"]:
+            key = (json.dumps(vocab, sort_keys=True), tuple(columns))
+            if key not in built:       # champion and challenger often share
+                built[key] = featurize_chunk(chunk, vocab, columns)
+            proba.append(model.predict_proba(built[key])[:, 1])
+        proba = np.vstack(proba)
+        flagged = proba >= threshold
+        bins = np.minimum((proba * SCORE_BINS).astype(np.int64), SCORE_BINS - 1)
+
+        for m in np.unique(month):
+            rows = month == m
+            cell = cells.setdefault((version, m), _cell())
+            yr = y[rows]
+            for i in range(len(MODELS)):
+                for label in (0, 1):
+                    cell["hist"][i, label] += np.bincount(
+                        bins[i, rows][yr == label], minlength=SCORE_BINS)
+                f = flagged[i, rows]
+                cell["conf"][i] += [(f & (yr == 1)).sum(), (f & (yr == 0)).sum(),
+                                    (~f & (yr == 1)).sum()]
+            cell["rows"] += int(rows.sum())
+            cell["disagree"] += int((flagged[0, rows] != flagged[1, rows]).sum())
+            cell["abs_diff"] += float(np.abs(proba[0, rows] - proba[1, rows]).sum())
+    return cells
+
+
+def _merge(into: dict, cells: dict) -> None:
+    for key, cell in cells.items():
+        if key not in into:
+            into[key] = cell
+            continue
+        for k in ("hist", "conf"):
+            into[key][k] += cell[k]
+        for k in ("rows", "disagree", "abs_diff"):
+            into[key][k] += cell[k]
+
+
+# ---------------------------------------------------------------
+def unix_times(csv: Path) -> np.ndarray:
+    """``unix_time`` of every row, from the memory-mapped Arrow copy."""
+    table = feather.read_table(columnarize(csv), columns=["unix_time"], memory_map=True)
+    return table.column(0).to_numpy()
+
+
+def history_ranges(files: list[tuple[str, np.ndarray]], start_time: int
+                   ) -> list[tuple[str, int, int]]:
+    """Rows of each time-ordered file that a slice starting at ``start_time`` warms from.
+
+    An older row is more than ``MAX_GAP`` before every row of the slice, so
+    it cannot change a velocity feature.  ``files`` are the earlier versions,
+    then the slice's own file cut at the slice start.
+    """
+    ranges = []
+    for path, times in files:
+        lo = int(np.searchsorted(times, start_time - MAX_GAP, "left"))
+        hi = int(np.searchsorted(times, start_time, "right"))
+        if hi > lo:
+            ranges.append((path, lo, hi))
+    return ranges
+
+
+def auc_from_hist(neg: np.ndarray, pos: np.ndarray) -> float:
+    """ROC AUC from per-bin counts; ties inside a bin count one half."""
+    n_neg, n_pos = neg.sum(), pos.sum()
+    if not n_neg or not n_pos:
+        return float("nan")
+    below = np.cumsum(neg) - neg
+    return float((pos * (below + 0.5 * neg)).sum() / (n_neg * n_pos))
+
+
+def summarize(cell: dict) -> dict:
+    out = {"rows": cell["rows"],
+           "fraud_rate": cell["hist"][0, 1].sum() / max(cell["rows"], 1),
+           "disagreement": cell["disagree"] / max(cell["rows"], 1),
+           "mean_abs_diff": cell["abs_diff"] / max(cell["rows"], 1)}
+    for i, name in enumerate(MODELS):
+        tp, fp, fn = cell["conf"][i]
+        out[f"{name}_auc"] = auc_from_hist(cell["hist"][i, 0], cell["hist"][i, 1])
+        out[f"{name}_precision"] = tp / (tp + fp) if tp + fp else float("nan")
+        out[f"{name}_recall"] = tp / (tp + fn) if tp + fn else float("nan")
+    return out
+
+
+def report(cells: dict) -> pd.DataFrame:
+    rows = []
+    for version in sorted({v for v, _ in cells}, key=lambda v: int(v.lstrip("v"))):
+        total = _cell()
+        for (v, month), cell in sorted(cells.items()):
+            if v != version:
+                continue
+            _merge({"t": total}, {"t": cell})
+            rows.append({"version": v, "month": month, **summarize(cell)})
+        rows.append({"version": version, "month": "all", **summarize(total)})
+    return pd.DataFrame(rows)
+
+
+def backtest(versions: list[str], champion: str, challenger: str,
+             threshold: float = FRAUD_THRESHOLD, workers: int | None = None,
+             raw_dir: Path = RAW_DIR) -> pd.DataFrame:
+    client = MlflowClient()
+    times = {}                                # version → unix_time per row
+    for v in list_versions(raw_dir):
+        if version_key(v) <= max(map(version_key, versions)):
+            times[v] = unix_times(version_csv(raw_dir, v))
+    tasks = []
+    for v in versions:
+        csv = str(version_csv(raw_dir, v))
+        earlier = [(str(version_csv(raw_dir, e)), t) for e, t in times.items()
+                   if version_key(e) < version_key(v)]
+        n = len(times[v])
+        for lo in range(0, n, SLICE_ROWS):
+            history = history_ranges([*earlier, (csv, times[v][:lo])], times[v][lo])
+            tasks.append((v, csv, lo, min(lo + SLICE_ROWS, n), history))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        specs = [fetch(client, spec, Path(tmp) / name)
+                 for name, spec in zip(MODELS, (champion, challenger))]
+        print(f"Backtest: champion v{specs[0]['version']} vs challenger "
+              f"v{specs[1]['version']}, {len(tasks)} slices of ≤{SLICE_ROWS:,} rows")
+        cells: dict = {}
+        # spawn: LightGBM's OpenMP pool does not survive a fork
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(), mp_context=mp.get_context("spawn"),
+            initializer=_init_worker, initargs=(specs, threshold),
+        ) as pool:
+            for fut in as_completed([pool.submit(_score_slice, *t) for t in tasks]):
+                _merge(cells, fut.result())
+    return report(cells)
+
+
+# ---------------------------------------------------------------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Champion/challenger backtest")
+    ap.add_argument("versions", nargs="+", help="Raw versions to replay (v2 v3 …)")
+    ap.add_argument("--champion", default="Production",
+                    help="Stage or version number (default: Production)")
+    ap.add_argument("--challenger", required=True,
+                    help="Stage or version number, e.g. 12 or None")
+    ap.add_argument("--threshold", type=float, default=FRAUD_THRESHOLD)
+    ap.add_argument("--workers", type=int)
+    ap.add_argument("--raw-dir", type=Path, default=RAW_DIR)
+    ap.add_argument("--out", type=Path, help="Optional CSV report path")
+    args = ap.parse_args()
+    result = backtest(args.versions, args.champion, args.challenger,
+                      args.threshold, args.workers, args.raw_dir)
+    print(result.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    if args.out:
+        result.to_csv(args.out, index=False)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# mlflow/bench_downsample.py
+# ---------------------------------------------------------------
+"""
+Training time, AUC and calibration with negatives downsampled, against
+full-data training on the same split and params.
+
+Usage
+-----
+python bench_downsample.py data/processed/train.parquet [--rates 1 0.5 0.2 0.1]
+"""
+import argparse, time
+
+import lightgbm as lgb
+import pandas as pd
+
+from train import (BoosterModel, downsample_negatives, downsampled_params,
+                   evaluate, load_params, load_training_data)
+
+
+def bench(data_path: str, rates: list[float]) -> pd.DataFrame:
+    (X_train, _, X_test), (y_train, _, y_test), _, _ = load_training_data(data_path)
+    base = load_params()
+    rows = []
+    for rate in rates:
+        idx, weight = downsample_negatives(y_train, rate)
+        params = downsampled_params(base, y_train) if rate < 1 else base
+        t0 = time.perf_counter()
+        booster = lgb.train(
+            {k: v for k, v in params.items() if k != "n_estimators"},
+            lgb.Dataset(X_train.iloc[idx], y_train.iloc[idx],
+                        weight=weight if rate < 1 else None),
+            num_boost_round=params.get("n_estimators", 100),
+        )
+        seconds = time.perf_counter() - t0
+        model = BoosterModel(booster)
+        scores = evaluate(model, X_test, y_test)
+        rows.append({
+            "neg_rate": rate,
+            "train_rows": len(idx),
+            "train_s": round(seconds, 2),
+            "auc": round(scores["auc"], 5),
+            "ece": round(scores["ece"], 5),
+            "mean_proba": round(float(model.predict_proba(X_test)[:, 1].mean()), 5),
+        })
+    report = pd.DataFrame(rows)
+    full = report.loc[report["neg_rate"] == 1.0]
+    if not full.empty:
+        report["speedup"] = (full["train_s"].iloc[0] / report["train_s"]).round(2)
+        report["auc_delta"] = (report["auc"] - full["auc"].iloc[0]).round(5)
+    return report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark negative downsampling")
+    ap.add_argument("data_path", help="Featurized training parquet")
+    ap.add_argument("--rates", type=float, nargs="+", default=[1.0, 0.5, 0.2, 0.1])
+    args = ap.parse_args()
+    print(bench(args.data_path, args.rates).to_string(index=False))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# mlflow/latency.py
+# ---------------------------------------------------------------
+"""
+Serving-cost profile of a fitted model and the budget gate that guards
+promotion to Production.
+
+``profile`` times ``predict_proba`` the way the model server calls it: one
+row at a time (p50/p99 over many distinct rows) and in batches (rows/s),
+and measures the pickled model size.  ``profiles`` does the same for
+several models in interleaved rounds, so a hiccup lands in one round of one
+model instead of skewing a whole profile; p50 and throughput are medians of
+the per-round values.  ``violations`` checks the candidate's p99 and size
+against the budgets, and its p50 and throughput against the current
+Production model profiled alongside it – a tail percentile is too noisy to
+rank two models by.
+"""
+import os, pickle, time
+
+import numpy as np
+
+BATCH_SIZES = (1, 10, 100, 1000)
+SINGLE_REPS = 500       # single-row calls per model, split over the rounds
+ROUNDS = 5
+BATCH_SECONDS = 0.25    # time spent per batch size, split over the rounds
+
+# budgets – a candidate over any of these is registered but not promoted
+P99_BUDGET_MS = float(os.getenv("LATENCY_P99_BUDGET_MS", 10))
+SIZE_BUDGET_MB = float(os.getenv("MODEL_SIZE_BUDGET_MB", 50))
+MAX_REGRESSION = float(os.getenv("LATENCY_MAX_REGRESSION", 1.25))
+
+
+# ---------------------------------------------------------------
+def model_bytes(model) -> int:
+    return len(pickle.dumps(model))
+
+
+def _single_row_times(model, rows) -> np.ndarray:
+    times = np.empty(len(rows))
+    for i, row in enumerate(rows):
+        t0 = time.perf_counter()
+        model.predict_proba(row)
+        times[i] = time.perf_counter() - t0
+    return times
+
+
+def _throughput(model, batch, seconds: float) -> float:
+    done, t0 = 0, time.perf_counter()
+    while (elapsed := time.perf_counter() - t0) < seconds:
+        model.predict_proba(batch)
+        done += len(batch)
+    return done / elapsed
+
+
+def profiles(models: dict, X, reps: int = SINGLE_REPS, rounds: int = ROUNDS,
+             batch_sizes=BATCH_SIZES, warmup: int = 20) -> dict[str, dict[str, float]]:
+    """``profile`` of each named model, measured in interleaved rounds.
+
+    Every round times each model on the same rows, in an order rotated per
+    round.  p99 pools all single-row times; p50 and batch throughput are
+    medians over rounds.
+    """
+    names = list(models)
+    rows = [X.iloc[[i % len(X)]] for i in range(warmup + reps)]
+    for model in models.values():
+        _single_row_times(model, rows[:warmup])
+    per_round = max(1, reps // rounds)
+    batches = {size: X.iloc[:size] for size in batch_sizes if len(X) >= size}
+    times = {name: [] for name in names}
+    p50s = {name: [] for name in names}
+    rates = {name: {size: [] for size in batches} for name in names}
+    for r in range(rounds):
+        chunk = rows[warmup + r * per_round:warmup + (r + 1) * per_round]
+        for name in names[r % len(names):] + names[:r % len(names)]:
+            t = _single_row_times(models[name], chunk)
+            times[name].append(t)
+            p50s[name].append(np.percentile(t, 50))
+            for size, batch in batches.items():
+                rates[name][size].append(
+                    _throughput(models[name], batch, BATCH_SECONDS / rounds))
+
+    out = {}
+    for name, model in models.items():
+        out[name] = {
+            "latency_p50_ms": float(np.median(p50s[name]) * 1e3),
+            "latency_p99_ms": float(np.percentile(np.concatenate(times[name]), 99) * 1e3),
+            "model_bytes": model_bytes(model),
+        }
+        for size in batches:
+            out[name][f"throughput_b{size}_rows_per_s"] = float(np.median(rates[name][size]))
+    return out
+
+
+def profile(model, X, **kwargs) -> dict[str, float]:
+    """Single-row p50/p99 (ms), batch throughput (rows/s) and model size."""
+    return profiles({"model": model}, X, **kwargs)["model"]
+
+
+def violations(candidate: dict, production: dict | None = None,
+               p99_budget_ms: float = P99_BUDGET_MS,
+               size_budget_mb: float = SIZE_BUDGET_MB,
+               max_regression: float = MAX_REGRESSION) -> list[str]:
+    """Reasons the candidate must not be promoted (empty list = promote).
+
+    ``production`` must come from the same ``profiles`` call as ``candidate``.
+    """
+    found = []
+    if candidate["latency_p99_ms"] > p99_budget_ms:
+        found.append(f"p99 {candidate['latency_p99_ms']:.2f} ms > "
+                     f"budget {p99_budget_ms:.2f} ms")
+    if candidate["model_bytes"] > size_budget_mb * 2**20:
+        found.append(f"size {candidate['model_bytes'] / 2**20:.1f} MiB > "
+                     f"budget {size_budget_mb:.1f} MiB")
+    if production:
+        if candidate["latency_p50_ms"] > production["latency_p50_ms"] * max_regression:
+            found.append(f"p50 {candidate['latency_p50_ms']:.2f} ms > "
+                         f"{max_regression:.2f}× Production "
+                         f"({production['latency_p50_ms']:.2f} ms)")
+        big = f"throughput_b{max(BATCH_SIZES)}_rows_per_s"
+        if big in candidate and big in production and \
+                candidate[big] * max_regression < production[big]:
+            found.append(f"batch throughput {candidate[big]:,.0f} rows/s < "
+                         f"Production {production[big]:,.0f} / {max_regression:.2f}")
+    return found
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# mlflow/search.py
+# ---------------------------------------------------------------
+"""
+Parallel random search over LightGBM params on one cached binned dataset.
+
+Every trial trains with ``lgb.train`` on the train/val binary files that
+``train.py`` caches, so no trial re-bins the data.  Trials run in a local
+process pool, each LightGBM using ``threads`` cores so that
+``workers × threads`` fits the machine.  A trial stops early when the
+validation AUC stops improving, and is pruned when its AUC at a checkpoint
+falls below the median of all trials that reached the same checkpoint.
+
+Binning params are fixed by ``params.json`` (they are part of the dataset
+cache key), so they cannot appear in the search space.
+
+This module never touches MLflow; ``train.py`` logs the returned trials.
+"""
+import json, multiprocessing as mp, os, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import lightgbm as lgb
+import numpy as np
+
+SEARCH_PATH = Path(__file__).with_name("search_space.json")
+METRIC = "auc"
+
+_worker: dict = {}      # per-process datasets + shared pruning state
+
+
+# ---------------------------------------------------------------
+def load_search(path: str | Path = SEARCH_PATH) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def sample_params(space: dict, rng: np.random.Generator) -> dict:
+    """Draw one configuration; ranges are uniform, or log-uniform with ``log``."""
+    params = {}
+    for name, spec in space.items():
+        if "choices" in spec:
+            params[name] = spec["choices"][rng.integers(len(spec["choices"]))]
+            continue
+        lo, hi = spec["low"], spec["high"]
+        value = (np.exp(rng.uniform(np.log(lo), np.log(hi))) if spec.get("log")
+                 else rng.uniform(lo, hi))
+        params[name] = int(round(value)) if spec.get("int") else float(value)
+    return params
+
+
+def trial_layout(n_trials: int, threads_per_trial: int | None = None) -> tuple[int, int]:
+    """(workers, LightGBM threads per trial) for the cores this process may use."""
+    cores = len(os.sched_getaffinity(0))
+    threads = threads_per_trial or max(1, cores // min(n_trials, cores))
+    workers = max(1, min(n_trials, cores // threads))
+    return workers, max(1, cores // workers)
+
+
+# ---------------------------------------------------------------
+class MedianPruner:
+    """LightGBM callback: stop a trial that trails the median at a checkpoint."""
+
+    def __init__(self, warmup: int, every: int, min_trials: int):
+        self.warmup, self.every, self.min_trials = warmup, every, min_trials
+        self.pruned_at = None
+
+    def __call__(self, env) -> None:
+        it = env.iteration + 1
+        if it < self.warmup or it % self.every:
+            return
+        score = next(r[2] for r in env.evaluation_result_list if r[1] == METRIC)
+        scores, lock = _worker["scores"], _worker["lock"]
+        with lock:
+            seen = scores.get(it, ())
+            scores[it] = seen + (score,)
+        if len(seen) >= self.min_trials and score < np.median(seen):
+            self.pruned_at = it
+            raise lgb.callback.EarlyStopException(env.iteration, env.evaluation_result_list)
+
+
+def _init_worker(train_bin: str, val_bin: str, bin_params: dict, scores, lock) -> None:
+    train = lgb.Dataset(train_bin, params=bin_params)
+    val = lgb.Dataset(val_bin, reference=train, params=bin_params)
+    _worker.update(train=train.construct(), val=val.construct(),
+                   scores=scores, lock=lock)
+
+
+def _run_trial(trial: int, params: dict, num_boost_round: int,
+               early_stopping_rounds: int, prune: dict) -> dict:
+    pruner = MedianPruner(prune.get("warmup", 100), prune.get("every", 25),
+                          prune.get("min_trials", 4))
+    t0 = time.perf_counter()
+    booster = lgb.train(
+        params,
+        _worker["train"],
+        num_boost_round=num_boost_round,
+        valid_sets=[_worker["val"]],
+        valid_names=["valid_0"],
+        callbacks=[lgb.early_stopping(early_stopping_rounds, first_metric_only=True,
+                                      verbose=False),
+                   pruner],
+    )
+    return {
+        "trial": trial,
+        "params": params,
+        "auc": booster.best_score["valid_0"][METRIC],
+        "best_iteration": booster.best_iteration,
+        "pruned_at": pruner.pruned_at,
+        "seconds": round(time.perf_counter() - t0, 3),
+        # pruned trials never win, so their trees are not worth shipping back
+        "model": None if pruner.pruned_at else booster.model_to_string(),
+    }
+
+
+# ---------------------------------------------------------------
+def run_search(train_bin: Path, val_bin: Path, base_params: dict,
+               bin_params: dict, config: dict, fixed: tuple = (),
+               seed: int = 42) -> tuple[list[dict], float]:
+    """Run ``config["n_trials"]`` trials; return (results by trial, wall seconds).
+
+    ``fixed`` names the params baked into the binned dataset.
+    """
+    clash = sorted(set(config["space"]) & set(fixed))
+    if clash:
+        raise ValueError(f"binning params cannot be searched: {clash}")
+
+    n_trials = config["n_trials"]
+    workers, threads = trial_layout(n_trials, config.get("threads_per_trial"))
+    rng = np.random.default_rng(seed)
+    base = {k: v for k, v in base_params.items() if k != "n_estimators"}
+    trials = [{**base, **sample_params(config["space"], rng),
+               "num_threads": threads, "verbosity": -1}
+              for _ in range(n_trials)]
+    print(f"Search: {n_trials} trials on {workers} workers × {threads} threads")
+
+    # spawn, not fork: LightGBM's OpenMP pool does not survive a fork
+    ctx = mp.get_context("spawn")
+    manager = ctx.Manager()
+    t0 = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=ctx, initializer=_init_worker,
+        initargs=(str(train_bin), str(val_bin), bin_params,
+                  manager.dict(), manager.Lock()),
+    ) as pool:
+        futures = [pool.submit(_run_trial, i, p, config.get("num_boost_round", 2000),
+                               config.get("early_stopping_rounds", 50),
+                               config.get("prune", {}))
+                   for i, p in enumerate(trials)]
+        for fut in as_completed(futures):
+            r = fut.result()
+            status = f"pruned@{r['pruned_at']}" if r["pruned_at"] else f"best@{r['best_iteration']}"
+            print(f"  trial {r['trial']:3d}: auc={r['auc']:.4f} {status} ({r['seconds']:.1f}s)")
+            results.append(r)
+    manager.shutdown()
+    return sorted(results, key=lambda r: r["trial"]), time.perf_counter() - t0
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # mlflow/train.py
 # ---------------------------------------------------------------
-import argparse, json, os, re, sys, tempfile
+import argparse, hashlib, json, os, re, resource, sys, tempfile, time
 from pathlib import Path
 from prometheus_client import CollectorRegistry, Gauge, pushadd_to_gateway
 from mlflow import lightgbm as mlflow_lgb 
@@ -9,6 +9,9 @@ import lightgbm as lgb
 import mlflow
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from mlflow.exceptions import MlflowException
 from mlflow.tracking import MlflowClient
 from sklearn.metrics import (
     roc_auc_score,
@@ -18,24 +21,114 @@ from sklearn.metrics import (
 )
 from sklearn.model_selection import train_test_split
 
-from evidently.metrics import DatasetDriftMetric
-from evidently.report import Report
+# /opt/mlflow/train.py → /opt/airflow/scripts (same layout in the repo)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "airflow" / "scripts"))
+from drift import DRIFT_HTML, DRIFT_RESULT, drift_check
+from featurize import SPLIT_COL, vocab_path
+from merged_store import VERSION_COL, version_key
+from raw_io import sha256sum
+from stage_metrics import StageMetrics
+from search import SEARCH_PATH, load_search, run_search
+import latency
+from compiled import compile_booster, parity
 
 # ---------------------------------------------------------------
 EXPERIMENT = "Fraud detection model training"
 PARAMS_PATH = Path(__file__).with_name("params.json")
 BASELINE_CSV = Path("/opt/airflow/data/raw/v1/baseline.csv")  
 SEED = 42
+MODEL_NAME = "fraud_model"
 
-mlflow.set_experiment(EXPERIMENT)
-mlflow.lightgbm.autolog(log_models=False)  # we'll log the model manually
+# warm-start policy: extra trees per incremental run, and when to force full
+EXTRA_TREES = 50
+FULL_EVERY = 5          # a full retrain after this many incremental runs
+FULL_DRIFT = 0.75       # … or when this share of columns drifted
+
+# keep this share of legitimate transactions in full retrains (1 = all)
+NEG_RATE = float(os.getenv("NEG_RATE", 1.0))
+
+# binned lgb.Dataset cache, keyed by parquet content + binning params
+CACHE_DIR = Path(os.getenv("LGB_CACHE_DIR", "/opt/airflow/data/lgb_cache"))
+CACHE_KEEP = 4          # newest cached train/val pairs kept on disk
+BIN_PARAMS = (          # params that change how LightGBM bins the data
+    "max_bin", "max_bin_by_feature", "min_data_in_bin",
+    "bin_construct_sample_cnt", "min_data_in_leaf", "feature_pre_filter",
+    "use_missing", "zero_as_missing", "categorical_feature", "linear_tree",
+    "data_random_seed", "seed", "random_state",
+)
 
 # ---------------------------------------------------------------
-def sanitize(df: pd.DataFrame) -> pd.DataFrame:
+def sanitize(columns: list[str]) -> list[str]:
     """LightGBM forbids some chars in column names; replace them once."""
-    df = df.copy()
-    df.columns = [re.sub(r"[^\w]", "_", c) for c in df.columns]
-    return df
+    return [re.sub(r"[^\w]", "_", c) for c in columns]
+
+
+def peak_rss_mib() -> float:
+    """High-water mark of this process's resident memory (Linux: KiB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_training_data(data_path: str):
+    """Read the featurized parquet into one float32 matrix, already split.
+
+    The split is fixed per transaction by featurize.py's ``split_bucket``
+    (70 / 15 / 15), so a row held out in this version was held out in
+    every earlier one: neither the Production model nor a warm start from
+    it has trained on the test rows, and incremental and full runs are
+    scored on the same unseen rows.  A parquet without the bucket falls
+    back to a seeded random split.
+
+    Only the label is read before splitting; features are then read one
+    column at a time straight into their row slot, in split order
+    (train | val | test), so every split is a view of the same array.
+    Booleans and small ints fit float32 exactly, the label is uint8.
+
+    Returns ((X_train, X_val, X_test), (y_train, y_val, y_test), v_train,
+    dtypes) – ``dtypes`` are the parquet's own column types, used for the
+    logged model signature so serving inputs are unchanged.
+    """
+    pf = pq.ParquetFile(data_path)
+    schema = pf.schema_arrow
+    features = [f.name for f in schema
+                if f.name not in ("label", VERSION_COL, SPLIT_COL)
+                and (pa.types.is_boolean(f.type) or pa.types.is_integer(f.type)
+                     or pa.types.is_floating(f.type))]
+
+    label = pf.read(columns=["label"]).column(0).to_numpy().astype(np.uint8)
+    if SPLIT_COL in schema.names:
+        bucket = pf.read(columns=[SPLIT_COL]).column(0).to_numpy()
+        rows = np.arange(len(label))
+        idx_train = rows[bucket < 70]
+        idx_val = rows[(bucket >= 70) & (bucket < 85)]
+        idx_test = rows[bucket >= 85]
+    else:
+        idx_train, idx_tmp = train_test_split(
+            np.arange(len(label)), test_size=0.30, random_state=SEED, stratify=label
+        )
+        idx_val, idx_test = train_test_split(
+            idx_tmp, test_size=0.50, random_state=SEED, stratify=label[idx_tmp]
+        )
+    order = np.concatenate([idx_train, idx_val, idx_test])
+    cuts = [len(idx_train), len(idx_train) + len(idx_val)]
+
+    X = np.empty((len(order), len(features)), dtype=np.float32)
+    for j, name in enumerate(features):
+        X[:, j] = pf.read(columns=[name]).column(0).to_numpy()[order]
+
+    columns = sanitize(features)
+    Xs = tuple(pd.DataFrame(part, columns=columns, copy=False)
+               for part in np.split(X, cuts))
+    ys = tuple(pd.Series(part, name="label", copy=False)
+               for part in np.split(label[order], cuts))
+
+    v_train = None
+    if VERSION_COL in schema.names:
+        versions = pf.read(columns=[VERSION_COL]).column(0).to_pandas()
+        v_train = versions.take(idx_train).reset_index(drop=True)
+
+    dtypes = dict(zip(columns, (schema.field(f).type.to_pandas_dtype()
+                                for f in features)))
+    return Xs, ys, v_train, dtypes
 
 
 def load_params() -> dict:
@@ -43,6 +136,15 @@ def load_params() -> dict:
         return json.load(f)
 
 
+def calibration_error(y, proba, bins: int = 10) -> float:
+    """Expected calibration error over equal-width probability bins."""
+    y, proba = np.asarray(y), np.asarray(proba)
+    which = np.minimum((proba * bins).astype(int), bins - 1)
+    n = np.bincount(which, minlength=bins)
+    gap = np.abs(np.bincount(which, proba, bins) - np.bincount(which, y, bins))
+    return float(gap.sum() / max(n.sum(), 1))
+
+
 def evaluate(model, X_test, y_test) -> dict[str, float]:
     proba = model.predict_proba(X_test)[:, 1]
     pred = (proba >= 0.5).astype(int)
@@ -51,93 +153,401 @@ def evaluate(model, X_test, y_test) -> dict[str, float]:
         "log_loss": log_loss(y_test, proba),
         "accuracy": accuracy_score(y_test, pred),
         "f1": f1_score(y_test, pred),
+        "ece": calibration_error(y_test, proba),
     }
 
 
-def compute_drift(ref: pd.DataFrame, cur: pd.DataFrame) -> tuple[float, str]:
-    """Return (result, html_report_path)."""
-    report = Report(metrics=[DatasetDriftMetric()])
-    report.run(reference_data=ref, current_data=cur)
-    result = report.as_dict()["metrics"][0]["result"]
+def downsample_negatives(y, rate: float, seed: int = SEED):
+    """Return (row index, weight): every positive, ``rate`` of the negatives.
+
+    Kept negatives weigh ``1 / rate``, so the weighted loss – and with it
+    the predicted probability scale that FRAUD_THRESHOLD depends on – matches
+    training on all rows in expectation.
+    """
+    y = np.asarray(y)
+    keep = (y == 1) | (np.random.default_rng(seed).random(len(y)) < rate)
+    idx = np.flatnonzero(keep)
+    weight = np.where(y[idx] == 1, 1.0, 1.0 / rate).astype(np.float32)
+    return idx, weight
+
+
+def downsampled_params(params: dict, y_full) -> dict:
+    """``is_unbalance`` counts rows, not weights: pin the full-data ratio."""
+    if not params.get("is_unbalance"):
+        return params
+    y_full = np.asarray(y_full)
+    n_pos = int(y_full.sum())
+    params = {k: v for k, v in params.items() if k != "is_unbalance"}
+    return {**params, "scale_pos_weight": (len(y_full) - n_pos) / max(n_pos, 1)}
+
+
+def dataset_key(data_path: str, split: str, bin_params: dict) -> str:
+    """Hash of the parquet bytes, the split and everything that affects binning."""
+    spec = {"data": sha256sum(data_path), "split": split,
+            "lightgbm": lgb.__version__, **bin_params}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _prune_cache(keep: int = CACHE_KEEP) -> None:
+    bins = sorted(CACHE_DIR.glob("*.train.bin"), key=lambda p: p.stat().st_mtime)
+    for old in bins[:-keep]:
+        for p in CACHE_DIR.glob(old.name.replace(".train.bin", ".*")):
+            p.unlink(missing_ok=True)
+
+
+def cache_paths(data_path: str, split: str, bin_params: dict) -> tuple[Path, Path]:
+    key = dataset_key(data_path, split, bin_params)
+    return CACHE_DIR / f"{key}.train.bin", CACHE_DIR / f"{key}.val.bin"
+
+
+def cached_datasets(data_path, split, params, X_train, y_train, X_val, y_val,
+                    weight=None):
+    """Return (train, val, hit): constructed lgb.Datasets, binned at most once.
+
+    The validation set is binned against the training set's bin boundaries,
+    so both files of a pair share one key.  A miss bins from pandas and saves
+    both in LightGBM's binary format; a hit loads them without re-binning.
+    """
+    bin_params = {k: params[k] for k in BIN_PARAMS if k in params}
+    train_bin, val_bin = cache_paths(data_path, split, bin_params)
+
+    if train_bin.exists() and val_bin.exists():
+        train = lgb.Dataset(str(train_bin), params=bin_params)
+        val = lgb.Dataset(str(val_bin), reference=train, params=bin_params)
+        train_bin.touch()                      # keep hot pairs out of pruning
+        return train.construct(), val.construct(), True
+
+    train = lgb.Dataset(X_train, y_train, weight=weight, params=bin_params)
+    val = lgb.Dataset(X_val, y_val, reference=train, params=bin_params)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # val first: the train file appearing marks the pair complete
+    for ds, path in ((val, val_bin), (train, train_bin)):
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        ds.save_binary(str(tmp))
+        os.replace(tmp, path)
+    _prune_cache()
+    return train, val, False
+
+
+class BoosterModel:
+    """A Booster with the ``predict_proba`` / ``booster_`` surface of LGBMClassifier.
+
+    ``lgb.train`` on the cached Datasets returns a bare Booster, and the
+    sklearn classifier has no public way to adopt one; models are therefore
+    logged with MLflow's lightgbm flavour, which stores the Booster itself
+    and serves fraud probabilities.
+    """
+
+    def __init__(self, booster: lgb.Booster):
+        self.booster_ = booster
+
+    def predict_proba(self, X) -> np.ndarray:
+        p = self.booster_.predict(X)
+        return np.column_stack([1 - p, p])
+
+
+def load_model(uri: str) -> BoosterModel:
+    """Load a logged model, including versions logged with the sklearn flavour."""
+    try:
+        booster = mlflow_lgb.load_model(uri)
+    except MlflowException:
+        booster = mlflow.sklearn.load_model(uri).booster_
+    return BoosterModel(booster)
+
+
+def search_model(config_path, data_path: str, split: str, params: dict):
+    """Search on the cached datasets; return (best Booster, its params).
+
+    Every trial becomes a nested run; only the winner is returned, so only
+    the winner gets registered.
+    """
+    config = load_search(config_path)
+    bin_params = {k: params[k] for k in BIN_PARAMS if k in params}
+    train_bin, val_bin = cache_paths(data_path, split, bin_params)
+    results, seconds = run_search(train_bin, val_bin, params, bin_params,
+                                  config, BIN_PARAMS, SEED)
+
+    for r in results:
+        with mlflow.start_run(run_name=f"trial-{r['trial']:03d}", nested=True):
+            mlflow.log_params({k: r["params"][k] for k in config["space"]})
+            mlflow.log_metrics({"val_auc": r["auc"],
+                                "best_iteration": r["best_iteration"],
+                                "trial_seconds": r["seconds"]})
+            mlflow.set_tag("pruned_at", r["pruned_at"] or "")
+
+    finished = [r for r in results if r["model"]]
+    best = max(finished, key=lambda r: r["auc"])
+    mlflow.log_metrics({
+        "search_trials": len(results),
+        "search_pruned": len(results) - len(finished),
+        "search_seconds": seconds,
+        "search_trials_per_hour": len(results) * 3600 / seconds,
+        "search_best_val_auc": best["auc"],
+    })
+    mlflow.set_tag("search_best_trial", best["trial"])
+    print(f"Search: {len(results)} trials in {seconds:.0f}s "
+          f"({len(results) * 3600 / seconds:.0f} trials/h), "
+          f"best trial {best['trial']} auc={best['auc']:.4f}")
+
+    best_params = {**params, **{k: best["params"][k] for k in config["space"]},
+                   "n_estimators": best["best_iteration"]}
+    mlflow.log_params(best_params)
+    return lgb.Booster(model_str=best["model"]), best_params
+
+
+def production_model(client: MlflowClient):
+    """Return (model, run) of the current Production model, or (None, None)."""
+    try:
+        versions = client.get_latest_versions(MODEL_NAME, stages=["Production"])
+    except MlflowException:             # fresh registry: fraud_model not registered yet
+        return None, None
+    if not versions:
+        return None, None
+    mv = versions[0]
+    model = load_model(f"models:/{MODEL_NAME}/{mv.version}")
+    return model, client.get_run(mv.run_id)
+
+
+def new_rows(v_train: pd.Series | None, prod_run) -> np.ndarray | None:
+    """Mask of training rows from versions newer than the Production model."""
+    if v_train is None or "data_version" not in prod_run.data.tags:
+        return None
+    base = version_key(prod_run.data.tags["data_version"])
+    keys = v_train.astype("category").map(version_key).astype(int)
+    return (keys > base).to_numpy()
+
+
+def choose_mode(requested, prod_model, prod_run, X_train, mask, drift,
+                full_every: int, full_drift: float) -> tuple[str, str]:
+    """Return (mode, reason); incremental only when it is actually possible."""
+    if requested == "full":
+        return "full", "requested"
+    if prod_model is None:
+        return "full", "no Production model"
+    if list(prod_model.booster_.feature_name()) != list(X_train.columns):
+        return "full", "feature set changed"
+    if mask is None or not mask.any():
+        return "full", "no rows newer than the Production model"
+    if requested == "incremental":
+        return "incremental", "requested"
+    streak = int(prod_run.data.tags.get("incremental_streak", 0))
+    if streak >= full_every:
+        return "full", f"{streak} incremental runs since the last full one"
+    if drift and drift["share_of_drifted_columns"] >= full_drift:
+        return "full", f"drift share {drift['share_of_drifted_columns']:.2f}"
+    return "incremental", f"incremental run {streak + 1}/{full_every}"
 
-    html_path = tempfile.mktemp(suffix=".html")
-    report.save_html(html_path)
-    return result, html_path
 
 # ---------------------------------------------------------------
-def main(data_path: str, baseline_path: str, new_version: str):
-    df_full = sanitize(pd.read_parquet(data_path))
-    X = df_full.drop(columns="label")
-    y = df_full["label"]
-
-    X_train, X_tmp, y_train, y_tmp = train_test_split(
-        X, y, test_size=0.30, random_state=SEED, stratify=y
-    )
-    X_val, X_test, y_val, y_test = train_test_split(
-        X_tmp, y_tmp, test_size=0.50, random_state=SEED, stratify=y_tmp
-    )
+def main(data_path: str, baseline_path: str, new_version: str,
+         mode: str = "auto", extra_trees: int = EXTRA_TREES,
+         full_every: int = FULL_EVERY, full_drift: float = FULL_DRIFT,
+         search: str | None = None, neg_rate: float = NEG_RATE,
+         budgets: dict | None = None, stage: StageMetrics | None = None):
+    mlflow.set_experiment(EXPERIMENT)
+    # filled in as the run goes; the CLI's ``with`` block pushes it
+    stage = stage or StageMetrics("train", new_version)
+    stage.read(data_path)
+    mlflow.lightgbm.autolog(log_models=False)  # we'll log the model manually
+
+    t0 = time.perf_counter()
+    (X_train, X_val, X_test), (y_train, y_val, y_test), v_train, dtypes = \
+        load_training_data(data_path)
+    load_seconds, load_rss = time.perf_counter() - t0, peak_rss_mib()
+    stage.rows_in = len(X_train) + len(X_val) + len(X_test)
+    data_mib = (X_train.values.nbytes + X_val.values.nbytes
+                + X_test.values.nbytes) / 2**20
+    print(f"Loaded {data_mib:.1f} MiB feature matrix in {load_seconds:.2f}s "
+          f"(peak RSS {load_rss:.0f} MiB)")
 
     params = load_params()
+    client = MlflowClient()
 
     with mlflow.start_run() as run:
+        registry = CollectorRegistry()
+        # the vocabulary featurize.py learned; backtest.py rebuilds features with it
+        if (vocab := vocab_path(Path(data_path))).exists():
+            mlflow.log_artifact(str(vocab), artifact_path="featurize")
+        # -------------- drift -------------------
+        # checked first: a large drift forces a full retrain
+        result = None
+        if new_version != "v1":
+            # new version: compute drift
+            cur_path = Path(f'/opt/airflow/data/raw/{new_version}/latest.csv')
+            # the DAG's branch task already saved this; recomputed only if stale
+            result = drift_check(Path(baseline_path), cur_path)
+            for artifact in (DRIFT_RESULT, DRIFT_HTML):
+                if (p := cur_path.with_name(artifact)).exists():
+                    mlflow.log_artifact(str(p), artifact_path="drift_report")
+            mlflow.log_metric("drift_share", result["drift_share"])
+            mlflow.log_metric("share_of_drifted_columns", result["share_of_drifted_columns"])
+            mlflow.log_metric("dataset_drift", result["dataset_drift"])
+            Gauge("share_of_drifted_columns", "Share of drifted cols", registry=registry).set(result["share_of_drifted_columns"])
+            Gauge("drift_share", "Drift share", registry=registry).set(result["drift_share"])
+            Gauge("dataset_drift", "Dataset drift", registry=registry).set(result["dataset_drift"])
+
         # ---------------- train -----------------
-        model = lgb.LGBMClassifier(**params)
-        model.fit(
-            X_train,
-            y_train,
-            eval_set=[(X_val, y_val)],
-            eval_metric="auc",
-            callbacks=[lgb.log_evaluation(period=50)],
-        )
+        prod_model, prod_run = production_model(client)
+        mask = new_rows(v_train, prod_run) if prod_run else None
+        if search:
+            mode, reason = "full", "hyperparameter search"
+        else:
+            mode, reason = choose_mode(mode, prod_model, prod_run, X_train, mask,
+                                       result, full_every, full_drift)
+        print(f"Training mode: {mode} ({reason})")
+
+        if mode == "incremental":
+            # continue boosting the Production booster on the new rows only;
+            # they are few, and init scores need the raw rows, so no cache
+            X_fit, y_fit = X_train[mask], y_train[mask]
+            dataset_seconds, cache = 0.0, "skipped"
+            t0 = time.perf_counter()
+            clf = lgb.LGBMClassifier(**{**params, "n_estimators": extra_trees})
+            clf.fit(
+                X_fit,
+                y_fit,
+                eval_set=[(X_val, y_val)],
+                eval_metric="auc",
+                init_model=prod_model.booster_,
+                callbacks=[lgb.log_evaluation(period=50)],
+            )
+            model = BoosterModel(clf.booster_)
+            train_seconds = time.perf_counter() - t0
+            streak = int(prod_run.data.tags.get("incremental_streak", 0)) + 1
+        else:
+            X_fit, y_fit, weight = X_train, y_train, None
+            split = f"train/val seed={SEED}"
+            if neg_rate < 1:
+                idx, weight = downsample_negatives(y_train, neg_rate)
+                X_fit, y_fit = X_train.iloc[idx], y_train.iloc[idx]
+                params = downsampled_params(params, y_train)
+                split += f" neg_rate={neg_rate}"
+            t0 = time.perf_counter()
+            train_set, val_set, hit = cached_datasets(
+                data_path, split, params, X_fit, y_fit, X_val, y_val, weight,
+            )
+            dataset_seconds, cache = time.perf_counter() - t0, "hit" if hit else "miss"
+            t0 = time.perf_counter()
+            if search:
+                # trials reload the cached binary files in their own processes
+                booster, params = search_model(search, data_path, split, params)
+            else:
+                booster = lgb.train(
+                    {k: v for k, v in params.items() if k != "n_estimators"},
+                    train_set,
+                    num_boost_round=params.get("n_estimators", 100),
+                    valid_sets=[val_set],
+                    valid_names=["valid_0"],
+                    callbacks=[lgb.log_evaluation(period=50)],
+                )
+            train_seconds = time.perf_counter() - t0
+            model = BoosterModel(booster)
+            streak = 0
+        stage.rows_out = len(X_fit)
+        print(f"Dataset cache {cache}: {dataset_seconds:.2f}s binning/loading, "
+              f"{train_seconds:.2f}s boosting")
+
+        mlflow.set_tags({
+            "train_mode": mode,
+            "train_mode_reason": reason,
+            "incremental_streak": streak,
+            "data_version": new_version,
+            "dataset_cache": cache,
+            "neg_rate": neg_rate if mode == "full" else 1.0,
+        })
 
         # -------------- metrics -----------------
-        mlflow.log_metric("train_rows", len(X_train))
+        mlflow.log_metric("load_seconds", load_seconds)
+        mlflow.log_metric("data_mib", data_mib)
+        mlflow.log_metric("load_peak_rss_mib", load_rss)
+        mlflow.log_metric("dataset_seconds", dataset_seconds)
+        mlflow.log_metric("train_seconds", train_seconds)
+        mlflow.log_metric("train_rows", len(X_fit))
         mlflow.log_metric("val_rows", len(X_val))
         mlflow.log_metric("test_rows", len(X_test))
 
         for k, v in evaluate(model, X_test, y_test).items():
             mlflow.log_metric(k, v)
-        registry = CollectorRegistry()
         for k, v in evaluate(model, X_test, y_test).items():
             Gauge(f"fraud_{k}", f"{k} on test split", registry=registry).set(v)
+        Gauge("fraud_train_seconds", f"{mode} training wall time",
+              registry=registry).set(train_seconds)
 
+        # -------------- latency gate ------------
+        # profiled on serving dtypes; Production is re-profiled here, in
+        # rounds interleaved with the candidate's, so both numbers come from
+        # the same machine and moment
+        bench_X = X_test.head(max(latency.SINGLE_REPS, *latency.BATCH_SIZES)).astype(dtypes)
+        models = {"candidate": model}
+        if prod_model is not None and \
+                list(prod_model.booster_.feature_name()) == list(X_test.columns):
+            models["production"] = prod_model
+        benches = latency.profiles(models, bench_X)
+        bench, prod_bench = benches["candidate"], benches.get("production")
+        stage.bytes_written = bench["model_bytes"]
+        if prod_bench is not None:
+            mlflow.log_metrics({f"production_{k}": v for k, v in prod_bench.items()})
+        mlflow.log_metrics(bench)
+        for k, v in bench.items():
+            Gauge(f"fraud_{k}", f"candidate {k}", registry=registry).set(v)
+        blocked = latency.violations(bench, prod_bench, **(budgets or {}))
+        Gauge("fraud_promotion_blocked", "1 if the candidate broke a serving budget",
+              registry=registry).set(int(bool(blocked)))
+        print(f"Latency p50={bench['latency_p50_ms']:.2f} ms "
+              f"p99={bench['latency_p99_ms']:.2f} ms, "
+              f"size={bench['model_bytes'] / 2**20:.1f} MiB")
+
+        # -------------- compiled export ---------
+        # array-backed copy of the trees, shipped next to the model only if
+        # it reproduces predict_proba on the whole test split
+        try:
+            compiled = compile_booster(model.booster_)
+            diff = parity(compiled, model, X_test)
+        except (NotImplementedError, AssertionError) as e:
+            mlflow.set_tag("compiled_export", f"skipped: {e}")
+            print(f"Compiled export skipped: {e}")
+        else:
+            mlflow.log_metric("compiled_parity_max_abs_diff", diff)
+            compiled_bench = latency.profile(compiled, bench_X)
+            mlflow.log_metrics({f"compiled_{k}": v for k, v in compiled_bench.items()})
+            for k, v in compiled_bench.items():
+                Gauge(f"fraud_compiled_{k}", f"compiled {k}", registry=registry).set(v)
+            with tempfile.TemporaryDirectory() as tmp:
+                compiled.save(Path(tmp) / "compiled_model.npz")
+                mlflow.log_artifact(str(Path(tmp) / "compiled_model.npz"),
+                                    artifact_path="compiled")
+            mlflow.set_tag("compiled_export", "ok")
+            print(f"Compiled export: p99 {compiled_bench['latency_p99_ms']:.3f} ms "
+                  f"vs booster {bench['latency_p99_ms']:.3f} ms, max |Δp|={diff:.1e}")
 
-        # -------------- drift -------------------
-        
-        if new_version != "v1":
-            # new version: compute drift
-            ref_df = pd.read_csv(baseline_path)
-            cur_df = pd.read_csv(f'/opt/airflow/data/raw/{new_version}/latest.csv')
-            ref_df = ref_df.sample(n=1000, random_state=SEED)
-            cur_df = cur_df.sample(n=1000, random_state=SEED)
-            result, html = compute_drift(ref_df, cur_df)
-            mlflow.log_metric("drift_share", result["drift_share"])
-            mlflow.log_metric("share_of_drifted_columns", result["share_of_drifted_columns"])
-            mlflow.log_metric("dataset_drift", result["dataset_drift"])
-            mlflow.log_artifact(html, artifact_path="drift_report")
-            Gauge("share_of_drifted_columns", "Share of drifted cols", registry=registry).set(result["share_of_drifted_columns"])
-            Gauge("drift_share", "Drift share", registry=registry).set(result["drift_share"])
-            Gauge("dataset_drift", "Dataset drift", registry=registry).set(result["dataset_drift"])
-            
         pushadd_to_gateway("pushgateway:9091", job="fraud_train", registry=registry)
+        # peak over load + binning + boosting: what an Airflow worker must fit
+        mlflow.log_metric("peak_rss_mib", peak_rss_mib())
+
         # -------------- model -------------------
-        mlflow.sklearn.log_model(
-            model,
+        # signature in the parquet's dtypes, not the float32 training matrix
+        example = X_test.head(5).astype(dtypes)
+        mlflow_lgb.log_model(
+            model.booster_,
             artifact_path="model",
-            input_example=X_test.head(1),
-            registered_model_name="fraud_model",
-            signature=mlflow.models.infer_signature(X_test, model.predict_proba(X_test)),
-            pip_requirements=[
-            "scikit-learn==1.4.1.post1",
-            "lightgbm==4.3.0"
-            ],            
+            input_example=example.head(1),
+            registered_model_name=MODEL_NAME,
+            signature=mlflow.models.infer_signature(example, model.booster_.predict(example)),
+            pip_requirements=[f"lightgbm=={lgb.__version__}"],
         )
 
-        # auto-promote newest version
-        client = MlflowClient()
-        latest = client.get_latest_versions("fraud_model", stages=["None"])[0]
+        # auto-promote newest version unless it broke a serving budget
+        latest = client.get_latest_versions(MODEL_NAME, stages=["None"])[0]
+        if blocked:
+            mlflow.set_tag("promotion", "blocked")
+            mlflow.set_tag("promotion_blocked_by", "; ".join(blocked))
+            client.set_model_version_tag(MODEL_NAME, latest.version,
+                                         "promotion_blocked_by", "; ".join(blocked))
+            print(f"⛔ fraud_model v{latest.version} not promoted: " + "; ".join(blocked))
+            return
+        mlflow.set_tag("promotion", "promoted")
         client.transition_model_version_stage(
-            "fraud_model",
+            MODEL_NAME,
             latest.version,
             stage="Production",
             archive_existing_versions=True,
@@ -150,5 +560,38 @@ if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("data_path", help="processed parquet with label column")
     p.add_argument("new_version", help="version folder name (e.g. v2, v3, …)")
+    p.add_argument("--mode", choices=["auto", "full", "incremental"],
+                   default=os.getenv("TRAIN_MODE", "auto"),
+                   help="warm-start from Production (incremental), retrain "
+                        "from scratch (full) or let the policy decide (auto)")
+    p.add_argument("--extra-trees", type=int, default=EXTRA_TREES,
+                   help="trees added per incremental run")
+    p.add_argument("--full-every", type=int, default=FULL_EVERY,
+                   help="force a full retrain after this many incremental runs")
+    p.add_argument("--full-drift", type=float, default=FULL_DRIFT,
+                   help="force a full retrain at this drifted-column share")
+    p.add_argument("--search", nargs="?", const=str(SEARCH_PATH),
+                   help="run a parallel hyperparameter search over this "
+                        f"search-space JSON (default {SEARCH_PATH.name}) "
+                        "instead of fitting params.json once")
+    p.add_argument("--neg-rate", type=float, default=NEG_RATE,
+                   help="share of negatives kept in full retrains; kept "
+                        "negatives are up-weighted by 1/rate")
+    p.add_argument("--p99-budget-ms", type=float, default=latency.P99_BUDGET_MS,
+                   help="block promotion above this single-row p99 latency")
+    p.add_argument("--size-budget-mb", type=float, default=latency.SIZE_BUDGET_MB,
+                   help="block promotion above this pickled model size")
+    p.add_argument("--max-regression", type=float, default=latency.MAX_REGRESSION,
+                   help="block promotion when p50 or batch throughput is this "
+                        "many times worse than the Production model's")
     args = p.parse_args()
-    main(args.data_path, str(BASELINE_CSV), args.new_version)
+    if not 0 < args.neg_rate <= 1:
+        p.error("--neg-rate must be in (0, 1]")
+    with StageMetrics("train", args.new_version) as stage:
+        main(args.data_path, str(BASELINE_CSV), args.new_version,
+             args.mode, args.extra_trees, args.full_every, args.full_drift,
+             args.search, args.neg_rate,
+             {"p99_budget_ms": args.p99_budget_ms,
+              "size_budget_mb": args.size_budget_mb,
+              "max_regression": args.max_regression},
+             stage)
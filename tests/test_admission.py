@@ -0,0 +1,197 @@
+"""
+Unit tests for fraud_detection_app/backend/admission.py: token bucket
+refill, load shedding and circuit-breaker transitions.
+
+Time is a fake clock, and the "slow upstream" is a coroutine holding an
+admission slot, so nothing here sleeps longer than a queue target.  auth.py
+connects to the database on import; only ``get_current_user`` is needed, so
+a stand-in module is registered first.
+
+Run from the repo root:  python -m pytest tests/test_admission.py
+"""
+import asyncio, sys, types
+from pathlib import Path
+
+import pytest
+import requests
+from fastapi import HTTPException
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "fraud_detection_app" / "backend"))
+sys.modules.setdefault("auth", types.SimpleNamespace(get_current_user=lambda: "tester"))
+
+from admission import (CLOSED, HALF_OPEN, OPEN, Admission, CircuitBreaker,  # noqa: E402
+                       CircuitOpen, TokenBucket)
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+# ─── Token bucket ──────────────────────────────────────────────────────────────
+
+def test_bucket_spends_burst_then_refills_at_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, burst=3, clock=clock)
+
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() == pytest.approx(0.5)        # one token at 2/s
+
+    clock.advance(0.25)
+    assert bucket.take() == pytest.approx(0.25)
+    clock.advance(0.25)
+    assert bucket.take() == 0.0
+
+
+def test_bucket_never_refills_past_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10.0, burst=2, clock=clock)
+    clock.advance(60)
+    assert [bucket.take() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.take() > 0
+
+
+def test_admission_rejects_with_retry_after():
+    clock = FakeClock()
+    admission = Admission("test_rate", rate=1.0, burst=1, limit=4, clock=clock)
+
+    async def scenario():
+        first = admission("alice")
+        assert await first.__anext__() == "alice"
+        await first.aclose()
+        with pytest.raises(HTTPException) as err:
+            await admission("alice").__anext__()
+        assert err.value.status_code == 429
+        assert err.value.headers["Retry-After"] == "1"
+        # another client has its own bucket
+        other = admission("bob")
+        assert await other.__anext__() == "bob"
+        await other.aclose()
+
+    asyncio.run(scenario())
+
+# ─── Load shedding ─────────────────────────────────────────────────────────────
+
+async def slow_upstream(admission: Admission, user: str, admitted: asyncio.Event,
+                        hold: asyncio.Event) -> None:
+    """A request that keeps its slot until ``hold`` is set."""
+    request = admission(user)
+    await request.__anext__()
+    admitted.set()
+    try:
+        await hold.wait()
+    finally:
+        await request.aclose()
+
+
+def test_sheds_when_no_slot_frees_within_queue_target():
+    admission = Admission("test_shed", rate=1000, burst=1000, limit=1,
+                          queue_target=0.05, clock=FakeClock())
+
+    async def scenario():
+        admitted, hold = asyncio.Event(), asyncio.Event()
+        busy = asyncio.create_task(slow_upstream(admission, "alice", admitted, hold))
+        await admitted.wait()
+        assert admission.in_flight == 1
+
+        with pytest.raises(HTTPException) as err:
+            await admission("bob").__anext__()
+        assert err.value.status_code == 503
+
+        hold.set()
+        await busy
+        assert admission.in_flight == 0
+        request = admission("bob")                      # the slot is free again
+        assert await request.__anext__() == "bob"
+        await request.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_waiter_admitted_when_slot_frees_in_time():
+    admission = Admission("test_queue", rate=1000, burst=1000, limit=1,
+                          queue_target=1.0, clock=FakeClock())
+
+    async def scenario():
+        admitted, hold = asyncio.Event(), asyncio.Event()
+        busy = asyncio.create_task(slow_upstream(admission, "alice", admitted, hold))
+        await admitted.wait()
+        asyncio.get_running_loop().call_later(0.01, hold.set)
+        request = admission("bob")
+        assert await request.__anext__() == "bob"
+        await request.aclose()
+        await busy
+
+    asyncio.run(scenario())
+
+# ─── Circuit breaker ───────────────────────────────────────────────────────────
+
+def fail(breaker: CircuitBreaker) -> None:
+    with pytest.raises(requests.ConnectionError):
+        with breaker:
+            raise requests.ConnectionError("upstream down")
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test_open", failures=3, reset_after=10, clock=FakeClock())
+    fail(breaker)
+    fail(breaker)
+    with breaker:                                       # a success resets the count
+        pass
+    fail(breaker)
+    fail(breaker)
+    assert breaker.state == CLOSED
+    fail(breaker)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpen) as err:
+        with breaker:
+            pytest.fail("an open breaker must not call the upstream")
+    assert err.value.retry_after == pytest.approx(10)
+
+
+def test_breaker_half_open_probe_closes_it():
+    clock = FakeClock()
+    breaker = CircuitBreaker("test_close", failures=1, reset_after=10, clock=clock)
+    fail(breaker)
+    assert breaker.state == OPEN
+
+    clock.advance(9)
+    with pytest.raises(CircuitOpen) as err:
+        with breaker:
+            pass
+    assert err.value.retry_after == pytest.approx(1)
+
+    clock.advance(1)
+    with breaker:
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpen):                # one probe at a time
+            with breaker:
+                pass
+    assert breaker.state == CLOSED
+
+
+def test_breaker_failed_probe_reopens_it():
+    clock = FakeClock()
+    breaker = CircuitBreaker("test_reopen", failures=1, reset_after=10, clock=clock)
+    fail(breaker)
+    clock.advance(10)
+    fail(breaker)                                       # the probe
+    assert breaker.state == OPEN
+    assert breaker.opened_at == clock.now
+
+
+def test_breaker_ignores_client_errors():
+    breaker = CircuitBreaker("test_4xx", failures=1, reset_after=10, clock=FakeClock())
+    response = requests.Response()
+    response.status_code = 404
+    with pytest.raises(requests.HTTPError):
+        with breaker:
+            raise requests.HTTPError(response=response)
+    assert breaker.state == CLOSED
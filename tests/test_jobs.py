@@ -0,0 +1,278 @@
+"""
+Unit tests for fraud_detection_app/backend/jobs.py: claims, stale-worker
+recovery, cancellation and the byte-bounded results download.
+
+Every job lives under pytest's ``tmp_path``, and a stub ``Scorer`` reads
+each row's probability from a ``p`` column, so neither a model nor the
+model server is needed.  As in test_admission.py, a stand-in ``auth``
+module replaces the one that connects to the database on import.
+
+Run from the repo root:  python -m pytest tests/test_jobs.py
+"""
+import io, json, os, sys, time, types
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "fraud_detection_app" / "backend"))
+sys.modules.setdefault("auth", types.SimpleNamespace(get_current_user=lambda: "tester"))
+
+import jobs  # noqa: E402
+from decision import FRAUD_THRESHOLD  # noqa: E402
+
+OWNER = "alice@example.com"
+
+
+class StubScorer:
+    """Featurized chunks scored by their own ``p`` column."""
+
+    def __init__(self, schema: str):
+        assert schema == "featurized"
+
+    def features(self, chunk):
+        return chunk
+
+    def score(self, X, cancelled) -> list[float]:
+        return X["p"].tolist()
+
+
+@pytest.fixture
+def jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", tmp_path)
+    monkeypatch.setattr(jobs, "Scorer", StubScorer)
+    monkeypatch.setattr(jobs, "CHUNK_ROWS", 4)
+    return tmp_path
+
+
+@pytest.fixture
+def client(jobs_dir):
+    app = FastAPI()
+    app.include_router(jobs.router_jobs)
+    app.dependency_overrides[jobs.get_current_user] = lambda: OWNER
+    return TestClient(app)
+
+
+def featurized_csv(rows: int = 10, trailing_newline: bool = True) -> bytes:
+    df = pd.DataFrame({"tx_hour": [i % 24 for i in range(rows)],
+                       "p": [round(i / rows, 3) for i in range(rows)]})
+    text = df.to_csv(index=False)
+    return (text if trailing_newline else text.rstrip("\n")).encode()
+
+
+def submit(jobs_dir: Path, rows: int = 10, **kwargs) -> Path:
+    status = jobs.create_job(io.BytesIO(featurized_csv(rows, **kwargs)), "day.csv",
+                             OWNER, jobs_dir)
+    return jobs_dir / status["id"]
+
+
+def go_stale(path: Path, **status) -> None:
+    """Make a claimed job look like its worker died ``STALE_SECONDS`` ago."""
+    old = time.time() - jobs.STALE_SECONDS - 60
+    current = jobs.read_status(path)
+    current.update(state=jobs.RUNNING, worker="gone:1", **status)
+    jobs.write_status(path, current)
+    current["updated_at"] = old                  # write_status stamps now
+    (path / "status.json").write_text(json.dumps(current))
+    os.utime(path / "claim", (old, old))
+
+
+# ─── Submission and claims ─────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_create_job_counts_every_row(jobs_dir, trailing_newline):
+    path = submit(jobs_dir, rows=7, trailing_newline=trailing_newline)
+    status = jobs.read_status(path)
+    assert status["state"] == jobs.QUEUED
+    assert status["schema"] == "featurized"
+    assert status["rows_total"] == 7
+
+
+def test_create_job_rejects_unknown_format(jobs_dir):
+    with pytest.raises(jobs.HTTPException) as err:
+        jobs.create_job(io.BytesIO(b"x"), "day.xlsx", OWNER, jobs_dir)
+    assert err.value.status_code == 415
+    assert list(jobs_dir.iterdir()) == []
+
+
+def test_claim_is_exclusive(jobs_dir):
+    path = submit(jobs_dir)
+    assert jobs.claim(path)
+    assert not jobs.claim(path)
+    assert (path / "claim").read_text() == jobs.WORKER_ID
+
+
+def test_next_job_claims_oldest_queued(jobs_dir):
+    first, second = submit(jobs_dir), submit(jobs_dir)
+    assert jobs.next_job(jobs_dir) == first
+    assert jobs.next_job(jobs_dir) == second
+    assert jobs.next_job(jobs_dir) is None
+
+
+def test_next_job_skips_live_claims(jobs_dir):
+    path = submit(jobs_dir)
+    assert jobs.claim(path)
+    jobs.write_status(path, {**jobs.read_status(path), "state": jobs.RUNNING})
+    assert jobs.next_job(jobs_dir) is None
+    assert (path / "claim").exists()
+
+# ─── Processing ────────────────────────────────────────────────────────────────
+
+def test_process_scores_every_chunk(jobs_dir):
+    path = submit(jobs_dir, rows=10)
+    assert jobs.next_job(jobs_dir) == path
+    status = jobs.process(path)
+
+    assert status["state"] == jobs.DONE
+    assert status["attempts"] == 1
+    assert status["rows_done"] == 10
+    assert status["result_bytes"] == (path / "results.csv").stat().st_size
+    out = pd.read_csv(path / "results.csv")
+    assert out["row"].tolist() == list(range(10))
+    expected = ["fraud" if p >= FRAUD_THRESHOLD else "not_fraud"
+                for p in out["fraud_probability"]]
+    assert out["prediction"].tolist() == expected
+    assert "fraud" in expected and "not_fraud" in expected
+
+
+def test_process_records_scorer_failure(jobs_dir, monkeypatch):
+    class Broken(StubScorer):
+        def score(self, X, cancelled):
+            raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(jobs, "Scorer", Broken)
+    path = submit(jobs_dir)
+    jobs.claim(path)
+    status = jobs.process(path)
+    assert status["state"] == jobs.FAILED
+    assert status["error"] == "RuntimeError: model unavailable"
+
+# ─── Stale workers ─────────────────────────────────────────────────────────────
+
+def test_stale_job_is_requeued_and_claimed_again(jobs_dir):
+    path = submit(jobs_dir)
+    jobs.claim(path)
+    go_stale(path, attempts=1, rows_done=4, result_bytes=40)
+
+    assert jobs.next_job(jobs_dir) == path
+    status = jobs.read_status(path)
+    assert status["state"] == jobs.QUEUED
+    assert (status["rows_done"], status["result_bytes"], status["worker"]) == (0, 0, None)
+    assert (path / "claim").read_text() == jobs.WORKER_ID
+    assert jobs.process(path)["attempts"] == 2
+
+
+def test_release_stale_keeps_a_fresh_claim(jobs_dir):
+    path = submit(jobs_dir)
+    jobs.claim(path)
+    jobs.write_status(path, {**jobs.read_status(path), "state": jobs.RUNNING})
+
+    assert not jobs.release_stale(path)
+    assert (path / "claim").read_text() == jobs.WORKER_ID
+    assert sorted(p.name for p in path.glob("claim*")) == ["claim"]
+
+
+def test_release_stale_restores_a_claim_refreshed_in_the_race(jobs_dir, monkeypatch):
+    # the status read is stale, but the claim it renamed was just rewritten
+    path = submit(jobs_dir)
+    jobs.claim(path)
+    go_stale(path, attempts=1)
+    read_status = jobs.read_status
+
+    def refreshed(p):
+        status = read_status(p)
+        for stale in p.glob("claim.*"):
+            os.utime(stale)
+        return status
+
+    monkeypatch.setattr(jobs, "read_status", refreshed)
+    assert not jobs.release_stale(path)
+    assert sorted(p.name for p in path.glob("claim*")) == ["claim"]
+    assert read_status(path)["state"] == jobs.RUNNING
+
+
+def test_only_one_worker_releases_a_stale_job(jobs_dir):
+    path = submit(jobs_dir)
+    jobs.claim(path)
+    go_stale(path, attempts=1)
+
+    assert jobs.release_stale(path)
+    assert not jobs.release_stale(path)           # its rename finds no claim
+    assert list(path.glob("claim*")) == []
+    assert jobs.read_status(path)["state"] == jobs.QUEUED
+
+
+def test_job_fails_after_max_attempts(jobs_dir):
+    path = submit(jobs_dir)
+    jobs.claim(path)
+    go_stale(path, attempts=jobs.MAX_ATTEMPTS)
+
+    assert jobs.next_job(jobs_dir) is None
+    status = jobs.read_status(path)
+    assert status["state"] == jobs.FAILED
+    assert status["error"] == f"worker lost on {jobs.MAX_ATTEMPTS} attempts"
+    assert jobs.next_job(jobs_dir) is None
+
+# ─── API ───────────────────────────────────────────────────────────────────────
+
+def test_submit_and_status_are_per_owner(client, jobs_dir):
+    resp = client.post("/jobs", files={"file": ("day.csv", featurized_csv(5))})
+    assert resp.status_code == 202
+    job = resp.json()
+    assert job["state"] == jobs.QUEUED and "owner" not in job
+
+    assert client.get(f"/jobs/{job['id']}").json()["rows_total"] == 5
+    client.app.dependency_overrides[jobs.get_current_user] = lambda: "mallory"
+    assert client.get(f"/jobs/{job['id']}").status_code == 404
+    assert client.get("/jobs/not-a-job-id").status_code == 404
+
+
+def test_cancel_queued_job(client, jobs_dir):
+    path = submit(jobs_dir)
+    resp = client.post(f"/jobs/{path.name}/cancel")
+    assert resp.json()["state"] == jobs.CANCELLED
+    assert jobs.next_job(jobs_dir) is None
+
+
+def test_cancel_running_job_stops_its_worker(client, jobs_dir):
+    path = submit(jobs_dir)
+    assert jobs.next_job(jobs_dir) == path
+    jobs.write_status(path, {**jobs.read_status(path), "state": jobs.RUNNING})
+
+    assert client.post(f"/jobs/{path.name}/cancel").json()["state"] == "cancelling"
+    assert jobs.process(path)["state"] == jobs.CANCELLED
+    assert client.get(f"/jobs/{path.name}").json()["state"] == jobs.CANCELLED
+
+
+def test_results_stop_at_committed_bytes(client, jobs_dir):
+    path = submit(jobs_dir, rows=10)
+    assert client.get(f"/jobs/{path.name}/results").status_code == 409
+
+    jobs.next_job(jobs_dir)
+    jobs.process(path)
+    complete = (path / "results.csv").read_bytes()
+    with open(path / "results.csv", "ab") as f:   # a chunk still being written
+        f.write(b"10,0.99")
+
+    resp = client.get(f"/jobs/{path.name}/results")
+    assert resp.status_code == 200
+    assert resp.content == complete
+    assert resp.headers["X-Job-State"] == jobs.DONE
+    assert resp.headers["X-Rows-Done"] == "10"
+
+
+def test_results_of_a_running_job_end_on_a_row(client, jobs_dir, monkeypatch):
+    path = submit(jobs_dir, rows=10)
+    jobs.next_job(jobs_dir)
+    jobs.process(path)
+    status = jobs.read_status(path)
+    lines = (path / "results.csv").read_bytes().splitlines(keepends=True)
+    committed = sum(map(len, lines[:5]))             # header + 4 rows, one chunk
+    status.update(state=jobs.RUNNING, rows_done=4, result_bytes=committed)
+    jobs.write_status(path, status)
+
+    resp = client.get(f"/jobs/{path.name}/results")
+    assert resp.content == b"".join(lines[:5])
+    assert len(pd.read_csv(io.BytesIO(resp.content))) == 4
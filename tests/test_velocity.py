@@ -0,0 +1,100 @@
+"""
+Unit tests for airflow/scripts/velocity.py: ``ChunkedVelocity`` over small
+chunks must equal ``velocity_features`` on the whole frame.
+
+The frames are synthetic and time-ordered, with few cards so every chunk
+boundary splits some card's history, and with idle stretches longer than
+``MAX_GAP`` so the tail has to forget cards.  No Redis is involved.
+
+Run from the repo root:  python -m pytest tests/test_velocity.py
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "airflow" / "scripts"))
+
+from velocity import (MAX_GAP, NO_HISTORY, WINDOWS, ChunkedVelocity,  # noqa: E402
+                      velocity_features)
+
+T0 = 1_600_000_000
+
+
+def transactions(n: int, cards: int, spread: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "cc_num": rng.integers(0, cards, n) + 4_000_000_000_000_000,
+        "unix_time": T0 + np.sort(rng.integers(0, spread, n)),
+        "amt": rng.uniform(1, 500, n).round(2),
+        "merch_lat": rng.uniform(25, 48, n),
+        "merch_long": rng.uniform(-124, -67, n),
+    })
+
+
+def chunked(df: pd.DataFrame, size: int, warm: int = 0) -> pd.DataFrame:
+    """Features of ``df[warm:]``, warming on the rows before it."""
+    stream = ChunkedVelocity()
+    for pos in range(0, warm, size):
+        stream.warm(df.iloc[pos:min(pos + size, warm)])
+    return pd.concat([stream.features(df.iloc[pos:pos + size])
+                      for pos in range(warm, len(df), size)])
+
+
+@pytest.mark.parametrize("size", [1, 7, 50, 1000])
+def test_chunks_match_whole_frame(size):
+    # 3 days over 5 cards: many rows per card inside the 1h and 24h windows
+    df = transactions(600, cards=5, spread=3 * 86_400)
+    pd.testing.assert_frame_equal(chunked(df, size), velocity_features(df))
+
+
+def test_gap_longer_than_max_gap_forgets_the_card():
+    # card 1 goes quiet for longer than MAX_GAP while card 2 keeps the clock moving
+    before = transactions(40, cards=2, spread=86_400, seed=1)
+    filler = transactions(40, cards=1, spread=MAX_GAP, seed=2)
+    filler["unix_time"] += 86_400
+    filler["cc_num"] = 99
+    after = transactions(40, cards=2, spread=86_400, seed=3)
+    after["unix_time"] += MAX_GAP + 3 * 86_400
+    df = pd.concat([before, filler, after], ignore_index=True)
+
+    expected = velocity_features(df)
+    pd.testing.assert_frame_equal(chunked(df, 9), expected)
+
+    first = after.groupby("cc_num").head(1).index + len(before) + len(filler)
+    assert (expected.loc[first, "vel_secs_since_last"] == NO_HISTORY).all()
+    assert (expected.loc[first, [f"vel_count_{w}" for w in WINDOWS]] == 0).all().all()
+
+
+def test_gap_of_exactly_max_gap_keeps_the_card():
+    df = pd.DataFrame({
+        "cc_num": [1, 2, 1],
+        "unix_time": [T0, T0 + MAX_GAP // 2, T0 + MAX_GAP],
+        "amt": [10.0, 20.0, 30.0],
+        "merch_lat": [40.0, 41.0, 40.0],
+        "merch_long": [-75.0, -76.0, -75.0],
+    })
+    expected = velocity_features(df)
+    assert expected.loc[2, "vel_secs_since_last"] == MAX_GAP
+    pd.testing.assert_frame_equal(chunked(df, 1), expected)
+
+
+@pytest.mark.parametrize("warm", [1, 123, 599])
+def test_warm_then_features_matches_the_rest_of_the_frame(warm):
+    df = transactions(600, cards=5, spread=3 * 86_400, seed=4)
+    expected = velocity_features(df).iloc[warm:]
+    pd.testing.assert_frame_equal(chunked(df, 25, warm=warm), expected)
+
+
+def test_tail_keeps_only_rows_that_can_still_count():
+    df = transactions(2000, cards=3, spread=40 * 86_400, seed=5)
+    stream = ChunkedVelocity()
+    for pos in range(0, len(df), 100):
+        stream.features(df.iloc[pos:pos + 100])
+    last = df.groupby("cc_num")["unix_time"].max()
+    horizon = last[stream.tail["cc_num"]].to_numpy() - max(WINDOWS.values())
+    assert (stream.tail["unix_time"].to_numpy() > horizon).all()
+    assert len(stream.tail) < len(df) // 10
+    assert list(stream.tail.columns) == list(df.columns)